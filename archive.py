@@ -0,0 +1,101 @@
+# archive.py
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+_extractor_classes = None
+
+
+def make_archive_key(extractor_key, video_id):
+    """Clave con el mismo formato que el --download-archive de yt-dlp ('youtube dQw4w9WgXcQ')."""
+    if not extractor_key or not video_id:
+        return None
+    return f"{extractor_key.lower()} {video_id}"
+
+
+def archive_key_for_url(url):
+    """
+    Calcula la clave del archivo a partir de la URL, sin tocar la red,
+    usando el mismo mecanismo que yt-dlp (InfoExtractor.get_temp_id).
+    """
+    global _extractor_classes
+    if _extractor_classes is None:
+        from yt_dlp.extractor import gen_extractor_classes
+        _extractor_classes = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+    for ie in _extractor_classes:
+        if ie.suitable(url):
+            try:
+                return make_archive_key(ie.ie_key(), ie.get_temp_id(url))
+            except Exception:
+                return None
+    return None
+
+
+class DownloadArchive:
+    """
+    Índice persistente de lo que ya se descargó en una carpeta.
+    Es un log JSON-lines de solo-agregar con un dict en memoria delante (búsqueda O(1)).
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.logger = logging.getLogger(__name__)
+        self._entries = {}  # clave -> {formato: registro}
+        self._offset = 0    # bytes del log ya leídos
+        self._lock = threading.Lock()
+        self._load()
+        self.logger.debug(f"Archivo de descargas cargado: {len(self._entries)} videos")
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1  # una línea sin terminar la está escribiendo otro proceso
+        self._offset += end
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # línea truncada por un corte a mitad de escritura
+            self._entries.setdefault(record['key'], {})[record.get('format', 'none')] = record
+
+    def refresh(self):
+        """Incorpora lo que otros procesos agregaron al log desde la última lectura."""
+        with self._lock:
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key, convert_format='none', verify_file=True):
+        """Devuelve el registro si el video ya se descargó en ese formato (y el archivo sigue ahí)."""
+        if not key:
+            return None
+        with self._lock:
+            record = self._entries.get(key, {}).get(convert_format)
+        if record and verify_file and not os.path.exists(record['path']):
+            return None
+        return record
+
+    def add(self, key, path, convert_format='none', url=None, format_id=None):
+        """Registra una descarga terminada."""
+        if not key:
+            return None
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        record = {
+            'key': key, 'path': str(path), 'size': size, 'format': convert_format,
+            'format_id': format_id, 'url': url, 'time': int(time.time()),
+        }
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._entries.setdefault(key, {})[convert_format] = record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return record
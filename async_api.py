@@ -0,0 +1,132 @@
+# async_api.py
+import asyncio
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from downloader import AnimeDownloader
+
+
+class AsyncAnimeDownloader:
+    """
+    API asyncio sobre AnimeDownloader.
+
+        async with AsyncAnimeDownloader(output_path='~/videos') as downloader:
+            task = asyncio.create_task(downloader.download(url))
+            async for event in downloader.events():
+                ...
+
+    El trabajo bloqueante (yt-dlp y FFmpeg) corre en un executor acotado. Los eventos
+    de progreso llegan por colas asyncio acotadas: si un consumidor se atrasa, el hilo
+    de descarga espera (backpressure) en lugar de acumular eventos sin límite.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, downloader=None, max_workers=None, event_queue_size=None, **downloader_kwargs):
+        self.downloader = downloader or AnimeDownloader(**downloader_kwargs)
+        self.max_workers = max_workers or Config.MAX_CONCURRENT_DOWNLOADS
+        self.event_queue_size = event_queue_size or Config.ASYNC_EVENT_QUEUE_SIZE
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='async-download')
+        self._subscribers = set()
+        self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def download(self, url, convert_format='none'):
+        """
+        Descarga una URL y devuelve True/False como download_episode_safe.
+        Cancelar la tarea asyncio activa el evento de cancelación del trabajo.
+        """
+        loop = self._bind_loop()
+        job_id = next(self._ids)
+        cancel_event = threading.Event()
+
+        def callback(data):
+            self._publish(dict(data, job_id=job_id, url=url))
+
+        self._publish({'status': 'queued', 'job_id': job_id, 'url': url})
+        future = loop.run_in_executor(
+            self._executor, self.downloader.download_episode_safe, url, callback, convert_format, cancel_event
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            # Esperamos a que el hilo suelte archivos y sesiones antes de propagar
+            try:
+                await future
+            except Exception:
+                pass
+            raise
+
+    async def download_many(self, urls, convert_format='none'):
+        """Descarga varias URLs; la concurrencia la limita el executor."""
+        return await asyncio.gather(*(self.download(url, convert_format) for url in urls))
+
+    async def get_video_info(self, url):
+        loop = self._bind_loop()
+        return await loop.run_in_executor(self._executor, self.downloader.get_video_info, url)
+
+    async def events(self):
+        """Itera (async for) los eventos de progreso de todos los trabajos."""
+        self._bind_loop()
+        queue = asyncio.Queue(maxsize=self.event_queue_size)
+        self._subscribers.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown, True)
+
+    # --- Internos ---
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        elif self._loop is not loop:
+            raise RuntimeError("AsyncAnimeDownloader no se puede usar desde varios event loops.")
+        return loop
+
+    def _publish(self, event):
+        """Entrega un evento a cada suscriptor. Desde un hilo del executor bloquea si la cola está llena."""
+        loop = self._loop
+        if loop is None:
+            return
+        in_loop = self._running_in(loop)
+        for queue in list(self._subscribers):
+            try:
+                if in_loop:
+                    if not queue.full():
+                        queue.put_nowait(event)
+                    continue
+                asyncio.run_coroutine_threadsafe(self._put(queue, event), loop).result()
+            except Exception as e:
+                self.logger.debug(f"No se pudo entregar el evento (ignorado): {e}")
+
+    async def _put(self, queue, event):
+        # Si el consumidor deja de iterar, su cola sale de _subscribers y el hilo se libera
+        while queue in self._subscribers:
+            try:
+                await asyncio.wait_for(queue.put(event), timeout=0.5)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    @staticmethod
+    def _running_in(loop):
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+# benchmark.py
+"""
+Benchmarks sin conexión del descargador.
+
+Levanta un servidor HTTP local con medios sintéticos (archivos progresivos, con y
+sin soporte de rangos, y listas HLS/DASH por fragmentos) y un extractor de prueba
+que apunta yt-dlp a ese servidor. Mide velocidad, costo fijo por trabajo, costo del
+hook de progreso, tiempo de remux, escalado con la concurrencia y el arranque de la
+CLI (contra un presupuesto), y guarda los resultados en JSON para comparar ejecuciones.
+
+Uso:
+  python benchmark.py -o resultados.json
+  python benchmark.py --quick --compare base.json --max-regression 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from yt_dlp.extractor.common import InfoExtractor
+
+from config import Config
+
+MB = 1024 ** 2
+
+
+# --- Servidor de medios sintéticos ---
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    """
+    /media/<ruta>    archivo con soporte de rangos (206)
+    /norange/<ruta>  el mismo archivo, siempre completo (200, sin Accept-Ranges)
+    /bench/<id>      manifiesto JSON que lee el extractor de prueba
+    ?rate=N          limita la respuesta a N bytes/s (simula un host remoto)
+    """
+    protocol_version = 'HTTP/1.1'
+    root = None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        rate = int(parse_qs(parsed.query).get('rate', ['0'])[0])
+        prefix, _, rel = parsed.path.lstrip('/').partition('/')
+        if prefix == 'bench':
+            path, ranged = self.root / 'bench' / f"{rel}.json", False
+        elif prefix in ('media', 'norange'):
+            path, ranged = self.root / 'media' / rel, prefix == 'media'
+        else:
+            self.send_error(404)
+            return
+        if not path.is_file() or '..' in rel:
+            self.send_error(404)
+            return
+
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range')
+        if ranged and range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            start = int(first or 0)
+            end = min(int(last), size - 1) if last else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        if ranged:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', 'application/json' if prefix == 'bench' else 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        try:
+            self._send_file(path, start, end - start + 1, rate)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente cortó (sondeo de rangos, cancelación)
+
+    def _send_file(self, path, offset, length, rate):
+        chunk_size = 64 * 1024
+        started = time.monotonic()
+        sent = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while sent < length:
+                chunk = f.read(min(chunk_size, length - sent))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if rate:
+                    ahead = sent / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes cortan conexiones keep-alive a propósito (sondeos, cancelaciones)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MediaServer:
+    """Servidor local en un hilo aparte que sirve el contenido de 'root'."""
+    def __init__(self, root):
+        handler = type('Handler', (_MediaHandler,), {'root': Path(root)})
+        self.httpd = _QuietServer(('127.0.0.1', 0), handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='bench-server', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def url(self, video_id):
+        return f"{self.base_url}/bench/{video_id}"
+
+
+# --- Extractor de prueba ---
+
+class BenchIE(InfoExtractor):
+    """Lee el manifiesto JSON del servidor local y arma el info dict con sus formatos."""
+    IE_NAME = 'bench'
+    _VALID_URL = r'https?://127\.0\.0\.1:\d+/bench/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        manifest = self._download_json(url, video_id)
+        formats = []
+        for fmt in manifest['formats']:
+            fmt = dict(fmt)
+            fmt['url'] = urljoin(url, fmt.pop('path'))
+            if fmt.get('fragment_base_url'):
+                fmt['fragment_base_url'] = urljoin(url, fmt['fragment_base_url'])
+            formats.append(fmt)
+        return {'id': video_id, 'title': manifest.get('title', video_id), 'duration': manifest.get('duration'), 'formats': formats}
+
+
+# --- Medios sintéticos ---
+
+class MediaLibrary:
+    """Genera los archivos y manifiestos que sirve MediaServer."""
+    def __init__(self, root, ffmpeg=None):
+        self.root = Path(root)
+        self.ffmpeg = ffmpeg
+        (self.root / 'media').mkdir(parents=True, exist_ok=True)
+        (self.root / 'bench').mkdir(parents=True, exist_ok=True)
+
+    def random_file(self, name, size):
+        path = self.root / 'media' / name
+        if not path.exists():
+            with open(path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    block = os.urandom(min(MB, remaining))
+                    f.write(block)
+                    remaining -= len(block)
+        return f"/media/{name}"
+
+    def manifest(self, video_id, formats, duration=None):
+        with open(self.root / 'bench' / f"{video_id}.json", 'w', encoding='utf-8') as f:
+            json.dump({'title': video_id, 'duration': duration, 'formats': formats}, f)
+        return video_id
+
+    def progressive(self, video_id, size, ranged=True, rate=None):
+        """Un único archivo 'mp4' (bytes aleatorios: solo importa el transporte)."""
+        path = self.random_file(f"{video_id}.mp4", size)
+        if not ranged:
+            path = path.replace('/media/', '/norange/', 1)
+        if rate:
+            path += f"?rate={int(rate)}"
+        return self.manifest(video_id, [{
+            'format_id': 'progressive', 'path': path, 'ext': 'mp4', 'protocol': 'http',
+            'vcodec': 'h264', 'acodec': 'aac', 'height': 720, 'filesize': size,
+        }])
+
+    def fragments(self, name, count, fragment_size):
+        """Fragmentos para HLS/DASH: reales con FFmpeg o sintéticos si no está."""
+        directory = self.root / 'media' / name
+        directory.mkdir(exist_ok=True)
+        if self.ffmpeg:
+            duration = max(count * 2, 2)
+            subprocess.run([
+                self.ffmpeg, '-y', '-loglevel', 'error',
+                '-f', 'lavfi', '-i', f'testsrc=size=640x360:rate=25:duration={duration}',
+                '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+                '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest',
+                '-f', 'hls', '-hls_time', '2', '-hls_playlist_type', 'vod',
+                '-hls_segment_filename', str(directory / 'seg%03d.ts'), str(directory / 'index.m3u8'),
+            ], check=True)
+            return sorted(p.name for p in directory.glob('seg*.ts'))
+        names = []
+        for i in range(count):
+            names.append(f"seg{i:03d}.ts")
+            self.random_file(f"{name}/{names[-1]}", fragment_size)
+        with open(directory / 'index.m3u8', 'w') as f:
+            f.write('#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:2\n#EXT-X-PLAYLIST-TYPE:VOD\n')
+            for segment in names:
+                f.write(f"#EXTINF:2.0,\n{segment}\n")
+            f.write('#EXT-X-ENDLIST\n')
+        return names
+
+    def hls(self, video_id, count=20, fragment_size=MB):
+        self.fragments(video_id, count, fragment_size)
+        return self.manifest(video_id, [{
+            'format_id': 'hls', 'path': f"/media/{video_id}/index.m3u8", 'ext': 'mp4',
+            'protocol': 'm3u8_native', 'vcodec': 'h264', 'acodec': 'aac', 'height': 720,
+        }])
+
+    def dash(self, video_id, count=20, fragment_size=MB):
+        names = self.fragments(video_id, count, fragment_size)
+        return self.manifest(video_id, [{
+            'format_id': 'dash', 'path': f"/media/{video_id}/index.m3u8", 'ext': 'mp4',
+            'protocol': 'http_dash_segments', 'vcodec': 'h264', 'acodec': 'aac', 'height': 720,
+            'fragment_base_url': f"/media/{video_id}/", 'fragments': [{'path': name} for name in names],
+        }])
+
+    def container(self, name, seconds=20):
+        """Video real .mkv para medir el remux (requiere FFmpeg)."""
+        path = self.root / 'media' / name
+        subprocess.run([
+            self.ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'testsrc=size=1280x720:rate=30:duration={seconds}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest', str(path),
+        ], check=True)
+        return path
+
+
+# --- Benchmarks ---
+
+def _make_downloader(output_path, connections=1, jobs=1, postprocess_workers=0):
+    from downloader import AnimeDownloader
+    from ratelimit import RateLimiter
+    from session_pool import YDLSessionPool
+
+    downloader = AnimeDownloader(
+        output_path=output_path, concurrent_downloads=jobs, per_host_limit=jobs,
+        postprocess_workers=postprocess_workers, segmented_connections=connections,
+        rate_limiter=RateLimiter(),  # sin límites: medimos el motor, no la cortesía con el host
+    )
+    downloader.sessions = YDLSessionPool(extractors=[BenchIE])
+    if downloader.segmented:
+        downloader.segmented.min_segment_size = MB
+    return downloader
+
+
+def _result(value, unit, higher_is_better=True, **extra):
+    return dict(value=round(value, 6), unit=unit, higher_is_better=higher_is_better, **extra)
+
+
+def _timed_batch(downloader, urls):
+    started = time.perf_counter()
+    jobs = downloader.download_batch(urls)
+    elapsed = time.perf_counter() - started
+    failed = [job for job in jobs if job.status != 'finished']
+    if failed:
+        raise RuntimeError(f"{len(failed)} trabajos fallaron: {failed[0].error_message}")
+    return elapsed
+
+
+def bench_throughput(library, server, workdir, size, repeat, connections, ranged, name):
+    timings = []
+    for i in range(repeat):
+        video_id = library.progressive(f"{name}-{i}", size, ranged=ranged)
+        downloader = _make_downloader(workdir / f"{name}-{i}", connections=connections)
+        timings.append(_timed_batch(downloader, [server.url(video_id)]))
+    elapsed = statistics.median(timings)
+    return _result(size / elapsed / MB, 'MB/s', seconds=elapsed, size=size)
+
+
+def bench_fragments(library, server, workdir, kind, repeat, count, fragment_size):
+    timings = []
+    for i in range(repeat):
+        video_id = getattr(library, kind)(f"{kind}-{i}", count, fragment_size)
+        downloader = _make_downloader(workdir / f"{kind}-{i}")
+        timings.append(_timed_batch(downloader, [server.url(video_id)]))
+    elapsed = statistics.median(timings)
+    size = sum(p.stat().st_size for p in (library.root / 'media' / f"{kind}-0").glob('seg*.ts'))
+    return _result(size / elapsed / MB, 'MB/s', seconds=elapsed, fragments=count)
+
+
+def bench_job_overhead(library, server, workdir, count):
+    """Trabajos diminutos en serie: el tiempo es casi todo costo fijo (extracción, sesión, diario)."""
+    urls = [server.url(library.progressive(f"tiny-{i}", 4096)) for i in range(count)]
+    downloader = _make_downloader(workdir / 'overhead')
+    elapsed = _timed_batch(downloader, urls)
+    return _result(elapsed / count * 1000, 'ms/trabajo', higher_is_better=False, jobs=count)
+
+
+def bench_progress_hook(ticks):
+    """Costo de SafeProgressHook por tick, con callback, ranura del agregador y limitador sin límite."""
+    from downloader import SafeProgressHook
+    from progress import ProgressAggregator
+    from ratelimit import RateLimiter
+
+    slot = ProgressAggregator().register(1, 'http://bench')
+    hook = SafeProgressHook(lambda data: None, threading.Event(), RateLimiter(), 'bench', slot)
+    data = {'status': 'downloading', 'total_bytes': ticks * 1024, 'speed': 1e6,
+            'tmpfilename': 'bench.part', 'filename': 'bench.mp4', 'info_dict': {}}
+    started = time.perf_counter()
+    for i in range(ticks):
+        data['downloaded_bytes'] = i * 1024
+        hook(data)
+    elapsed = time.perf_counter() - started
+    return _result(elapsed / ticks * 1e6, 'µs/tick', higher_is_better=False, ticks=ticks)
+
+
+def bench_remux(library, workdir, repeat, seconds):
+    downloader = _make_downloader(workdir / 'remux')
+    source = library.container('remux-source.mkv', seconds)
+    timings = []
+    for i in range(repeat):
+        copy_path = workdir / 'remux' / f"remux-{i}.mkv"
+        shutil.copy(source, copy_path)
+        started = time.perf_counter()
+        if not downloader._ensure_mp4_container(str(copy_path), None, None, seconds):
+            raise RuntimeError("El remux falló")
+        timings.append(time.perf_counter() - started)
+    return _result(statistics.median(timings), 's', higher_is_better=False, media_seconds=seconds,
+                   size=source.stat().st_size)
+
+
+def bench_concurrency(library, server, workdir, files, size, rate, levels):
+    """Varias descargas limitadas por conexión (como hosts remotos) con distinta concurrencia."""
+    urls = [server.url(library.progressive(f"conc-{i}", size, rate=rate)) for i in range(files)]
+    scaling = {}
+    for jobs in levels:
+        downloader = _make_downloader(workdir / f"conc-{jobs}", jobs=jobs)
+        elapsed = _timed_batch(downloader, urls)
+        scaling[str(jobs)] = round(files * size / elapsed / MB, 3)
+    best = max(scaling.values())
+    return _result(best, 'MB/s', scaling=scaling, per_connection=rate / MB, files=files)
+
+
+# Módulos que un comando sin descarga (--help, --version, --list-sites) no debe cargar
+HEAVY_MODULES = ('yt_dlp', 'ffmpeg', 'requests', 'downloader', 'customtkinter')
+
+
+def bench_cli_startup(repeat, budget_ms):
+    """Arranque de 'main.py --help' en un proceso nuevo, contra un presupuesto de tiempo."""
+    main_path = str(Path(__file__).resolve().with_name('main.py'))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, main_path, '--help'], check=True, capture_output=True)
+        timings.append(time.perf_counter() - started)
+    check = subprocess.run(
+        [sys.executable, '-c', f"import sys, main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"],
+        cwd=str(Path(main_path).parent), check=True, capture_output=True, text=True,
+    )
+    loaded = [m for m in check.stdout.strip().split(',') if m]
+    if loaded:
+        raise RuntimeError(f"importar main carga módulos pesados: {', '.join(loaded)}")
+    elapsed_ms = statistics.median(timings) * 1000
+    if budget_ms and elapsed_ms > budget_ms:
+        raise RuntimeError(f"el arranque tardó {elapsed_ms:.0f} ms (presupuesto: {budget_ms:.0f} ms)")
+    return _result(elapsed_ms, 'ms', higher_is_better=False, budget_ms=budget_ms)
+
+
+def _phase_summary():
+    """Tiempos por fase acumulados en las métricas durante toda la corrida."""
+    from metrics import PHASE_SECONDS
+
+    phases = {}
+    for sample in PHASE_SECONDS.to_dict():
+        entry = phases.setdefault(sample['phase'], {'count': 0, 'seconds': 0.0})
+        entry['count'] += sample['count']
+        entry['seconds'] = round(entry['seconds'] + sample['sum'], 6)
+    return phases
+
+
+def run_benchmarks(args):
+    ffmpeg_bin = shutil.which('ffmpeg')
+    size = (8 if args.quick else args.size) * MB
+    repeat = 1 if args.quick else args.repeat
+    fragments = 8 if args.quick else 20
+    workdir = Path(tempfile.mkdtemp(prefix='anime-bench-'))
+    library = MediaLibrary(workdir / 'server', ffmpeg_bin)
+
+    # Medimos el camino real, sin cachés ni archivo de descargas que salteen trabajo
+    Config.INFO_CACHE_ENABLED = False
+    Config.USE_DOWNLOAD_ARCHIVE = False
+    Config.USE_JOB_JOURNAL = False
+
+    benchmarks = [
+        ('cli_startup', lambda: bench_cli_startup(3 if args.quick else 10, args.startup_budget)),
+        ('progressive_ytdlp', lambda: bench_throughput(library, server, workdir, size, repeat, 1, False, 'plain')),
+        ('progressive_segmented', lambda: bench_throughput(
+            library, server, workdir, size, repeat, Config.SEGMENTED_CONNECTIONS, True, 'ranged')),
+        ('hls_native', lambda: bench_fragments(library, server, workdir, 'hls', repeat, fragments, MB // 2)),
+        ('dash_segments', lambda: bench_fragments(library, server, workdir, 'dash', repeat, fragments, MB // 2)),
+        ('job_overhead', lambda: bench_job_overhead(library, server, workdir, 10 if args.quick else 50)),
+        ('progress_hook', lambda: bench_progress_hook(20_000 if args.quick else 200_000)),
+        ('remux', lambda: bench_remux(library, workdir, repeat, 10 if args.quick else 30)),
+        ('concurrency_scaling', lambda: bench_concurrency(
+            library, server, workdir, 8, (2 if args.quick else 4) * MB, 2 * MB, (1, 2, 4, 8))),
+    ]
+    selected = set(args.only.split(',')) if args.only else None
+
+    results = {}
+    try:
+        with MediaServer(library.root) as server:
+            for name, bench in benchmarks:
+                if selected and name not in selected:
+                    continue
+                if name == 'remux' and not ffmpeg_bin:
+                    results[name] = {'skipped': 'FFmpeg no está instalado'}
+                    print(f"⏭️  {name}: omitido (FFmpeg no está instalado)")
+                    continue
+                print(f"⏱️  {name}...", flush=True)
+                try:
+                    results[name] = bench()
+                except Exception as e:
+                    results[name] = {'error': str(e)}
+                    print(f"❌ {name}: {e}")
+                    continue
+                print(f"   {results[name]['value']} {results[name]['unit']}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    import yt_dlp
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'ffmpeg': bool(ffmpeg_bin),
+        'quick': args.quick,
+        'results': results,
+        'phases': _phase_summary(),
+    }
+
+
+def compare(current, baseline, max_regression):
+    """Imprime la diferencia con una corrida anterior. Devuelve los benchmarks que empeoraron de más."""
+    regressions = []
+    print(f"\n{'benchmark':<24}{'antes':>14}{'ahora':>14}{'cambio':>10}")
+    print("-" * 62)
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name, {})
+        if 'value' not in result or not before.get('value'):
+            continue
+        change = (result['value'] - before['value']) / before['value'] * 100
+        worse = -change if result['higher_is_better'] else change
+        mark = '⚠️' if worse > max_regression else ''
+        print(f"{name:<24}{before['value']:>14.3f}{result['value']:>14.3f}{change:>+9.1f}% {mark}")
+        if worse > max_regression:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks sin conexión del descargador')
+    parser.add_argument('-o', '--output', type=str, default='benchmark_results.json',
+                        help='Archivo JSON de resultados (default: benchmark_results.json)')
+    parser.add_argument('--size', type=int, default=64, metavar='MB',
+                        help='Tamaño de los archivos progresivos en MB (default: 64)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por medida; se usa la mediana (default: 3)')
+    parser.add_argument('--quick', action='store_true', help='Tamaños chicos y una repetición (para CI)')
+    parser.add_argument('--only', type=str, metavar='NOMBRES', help='Correr solo estos benchmarks (separados por coma)')
+    parser.add_argument('--compare', type=str, metavar='FILE', help='Comparar con un JSON de una corrida anterior')
+    parser.add_argument('--max-regression', type=float, default=10.0, metavar='PCT',
+                        help='Con --compare, salir con error si algo empeora más de este porcentaje (default: 10)')
+    parser.add_argument('--startup-budget', type=float, default=300, metavar='MS',
+                        help="Tiempo máximo de arranque de 'main.py --help' en ms; 0 lo desactiva (default: 300)")
+    parser.add_argument('--keep', action='store_true', help='No borrar el directorio temporal de trabajo')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n📊 Resultados guardados en {args.output}")
+
+    if any('error' in result for result in report['results'].values()):
+        sys.exit(1)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print(f"\n❌ Regresiones de más del {args.max_regression}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# cache.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+from archive import archive_key_for_url, make_archive_key
+from config import Config
+
+# Parámetros de seguimiento que no cambian el video al que apunta la URL
+_TRACKING_PARAMS = {'si', 'feature', 'pp', 'fbclid', 'gclid', 'ref'}
+
+
+def normalize_url(url):
+    """Normaliza una URL para usarla como clave de caché."""
+    parts = urlparse(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _TRACKING_PARAMS and not k.startswith('utm_')
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunparse((parts.scheme.lower(), parts.netloc.lower(), path, '', urlencode(query), ''))
+
+
+def _url_expiry(info):
+    """Busca la expiración más próxima entre las URLs de los formatos (p.ej. 'expire=' de YouTube)."""
+    expiry = None
+    for fmt in info.get('formats') or []:
+        url = fmt.get('url') or ''
+        for key, value in parse_qsl(urlparse(url).query):
+            if key.lower() in ('expire', 'expires') and value.isdigit():
+                value = int(value)
+                expiry = value if expiry is None else min(expiry, value)
+    return expiry
+
+
+class InfoCache:
+    """
+    Caché de diccionarios de información de yt-dlp.
+    Una LRU acotada en memoria delante de una tabla SQLite en disco, con TTL.
+    """
+    def __init__(self, path=None, ttl=None, memory_items=None):
+        self.path = Path(path or Config.INFO_CACHE_FILE).expanduser()
+        self.ttl = ttl if ttl is not None else Config.INFO_CACHE_TTL
+        self.memory_items = memory_items if memory_items is not None else Config.INFO_CACHE_MEMORY_ITEMS
+        self.logger = logging.getLogger(__name__)
+
+        self._memory = OrderedDict()  # clave -> (expira, info)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            " key TEXT PRIMARY KEY, info TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def id_key(info):
+        """Clave por extractor e ID, la misma del archivo de descargas (p.ej. 'youtube dQw4w9WgXcQ')."""
+        return make_archive_key(info.get('extractor_key'), info.get('id'))
+
+    def get(self, url):
+        """
+        Devuelve el info dict guardado para la URL, o None si no hay o venció.
+        Si la URL exacta no está se busca por extractor e ID: 'youtu.be/X' encuentra
+        lo guardado para 'watch?v=X'.
+        """
+        info = self._lookup(normalize_url(url))
+        if info is None:
+            id_key = archive_key_for_url(url)
+            if id_key:
+                info = self._lookup(id_key)
+        if info is None:
+            return None
+        self.logger.debug(f"Información en caché para: {url}")
+        return json.loads(info)
+
+    def _lookup(self, key):
+        """JSON guardado con 'key' (memoria y luego disco) o None si no hay o venció."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires, info = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    return info
+                del self._memory[key]
+
+            row = self._db.execute("SELECT info, expires FROM info WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            info, expires = row
+            if expires <= now:
+                self._db.execute("DELETE FROM info WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._remember(key, expires, info)
+            return info
+
+    def put(self, url, info):
+        """Guarda un info dict (ya saneado y serializable a JSON)."""
+        now = time.time()
+        expires = now + self.ttl
+        url_expiry = _url_expiry(info)
+        if url_expiry:
+            # Margen para que no caduque a mitad de una descarga
+            expires = min(expires, url_expiry - 300)
+        if expires <= now:
+            return
+
+        data = json.dumps(info)
+        keys = [normalize_url(url)]
+        id_key = self.id_key(info)
+        if id_key:
+            keys.append(id_key)
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO info (key, info, expires) VALUES (?, ?, ?)",
+                [(key, data, expires) for key in keys],
+            )
+            self._db.commit()
+            for key in keys:
+                self._remember(key, expires, data)
+
+    def invalidate(self, url):
+        keys = [key for key in (normalize_url(url), archive_key_for_url(url)) if key]
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+            self._db.executemany("DELETE FROM info WHERE key = ?", [(key,) for key in keys])
+            self._db.commit()
+
+    def purge_expired(self):
+        """Borra del disco las entradas vencidas."""
+        with self._lock:
+            self._db.execute("DELETE FROM info WHERE expires <= ?", (time.time(),))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, key, expires, info):
+        # Se guarda el JSON y no el dict para que nadie mute la entrada cacheada
+        self._memory[key] = (expires, info)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
@@ -0,0 +1,237 @@
+# client.py
+import json
+import logging
+import threading
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from config import Config
+
+# Solo biblioteca estándar: la CLI y la GUI hablan con el servicio sin cargar yt-dlp
+
+
+class DaemonError(Exception):
+    """El servicio no responde o rechazó la petición."""
+
+
+class RemoteJob:
+    """Trabajo del servicio visto desde el cliente (misma forma que scheduler.DownloadJob)."""
+    def __init__(self, client, data):
+        self.client = client
+        self.id = data['job_id']
+        self.url = data.get('url')
+        self.convert_format = data.get('format', 'none')
+        self.status = data.get('status', 'queued')
+        self.filename = data.get('filename')
+        self.error_message = data.get('error_message')
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        try:
+            self.client.cancel(self.id)
+        except DaemonError as e:
+            logging.getLogger(__name__).warning(f"No se pudo cancelar el trabajo {self.id}: {e}")
+
+    def _update(self, data):
+        self.status = data.get('status', self.status)
+        self.filename = data.get('filename') or self.filename
+        self.error_message = data.get('error_message') or self.error_message
+        if data.get('event') == 'done':
+            self._done.set()
+
+    def __repr__(self):
+        return f"<RemoteJob {self.id} {self.status} {self.url}>"
+
+
+class RemoteDownloader:
+    """
+    Cliente de la API del servicio (daemon.py). Ofrece download_episode_safe y
+    download_batch con la misma forma que AnimeDownloader, así la CLI puede delegar
+    en el servicio sin cambiar su lógica de reporte.
+    """
+    def __init__(self, base_url=None, timeout=10):
+        self.base_url = (base_url or Config.DAEMON_URL).rstrip('/')
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+
+    # --- API ---
+
+    def is_available(self):
+        try:
+            self._request('GET', '/health', timeout=0.5)
+            return True
+        except DaemonError:
+            return False
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def submit(self, urls, convert_format='none'):
+        """Encola una o varias URLs. Devuelve la lista de RemoteJob."""
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        data = self._request('POST', '/jobs', {'urls': urls, 'format': convert_format})
+        return [RemoteJob(self, job) for job in data['jobs']]
+
+    def jobs(self):
+        return self._request('GET', '/jobs')['jobs']
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def cancel(self, job_id):
+        return self._request('POST', f'/jobs/{job_id}/cancel', {})
+
+    def events(self, job_id=None):
+        """Itera los eventos del servicio (de un trabajo, o de todos). Incluye los latidos."""
+        return self._iter_events(self._open_events(job_id))
+
+    # --- Misma forma que AnimeDownloader ---
+
+    def download_episode_safe(self, url, progress_callback=None, convert_format='none', cancel_event=None, progress_slot=None):
+        """Encola la URL en el servicio y sigue sus eventos hasta que termina. Devuelve True si terminó bien."""
+        job = self.submit(url, convert_format)[0]
+        self._follow(job, progress_callback, cancel_event, progress_slot)
+        return job.status == 'finished'
+
+    def download_batch(self, urls, progress_callback=None, convert_format='none'):
+        """Encola el lote entero y espera a que terminen todos. Devuelve la lista de RemoteJob."""
+        response = self._open_events()  # suscritos antes de encolar: no se pierde ningún 'done'
+        jobs = {job.id: job for job in self.submit(urls, convert_format)}
+        pending = set(jobs)
+        try:
+            for event in self._iter_events(response):
+                job = jobs.get(event.get('job_id'))
+                if not job:
+                    continue
+                if event.get('event') == 'done':
+                    job._update(event)
+                    pending.discard(job.id)
+                    if not pending:
+                        break
+                elif event.get('status') and not event.get('event') and progress_callback:
+                    progress_callback(event)
+        except KeyboardInterrupt:
+            for job_id in pending:
+                jobs[job_id].cancel()
+            raise
+        finally:
+            response.close()
+        return list(jobs.values())
+
+    def _follow(self, job, progress_callback=None, cancel_event=None, progress_slot=None):
+        """Reenvía los eventos de un trabajo al callback hasta su evento 'done'."""
+        cancelled = False
+        last_status = None
+        try:
+            for event in self.events(job.id):
+                if cancel_event is not None and cancel_event.is_set() and not cancelled:
+                    job.cancel()  # los latidos aseguran que esto se revise aunque no haya progreso
+                    cancelled = True
+                status = event.get('status')
+                if event.get('event') == 'done':
+                    job._update(event)
+                    if progress_callback and status != last_status:
+                        # Estado final que no llegó como evento de progreso (p.ej. error antes de descargar)
+                        progress_callback({k: event[k] for k in ('job_id', 'url', 'status', 'filename', 'error_message') if event.get(k)})
+                    break
+                if not status or event.get('event'):
+                    continue
+                last_status = status
+                if progress_slot is not None:
+                    if status == 'downloading':
+                        progress_slot.update(event.get('downloaded_bytes', 0), event.get('total_bytes'), event.get('filename'))
+                    elif status != 'finished':
+                        progress_slot.set_status(status, event.get('percentage'), event.get('filename'), event.get('error_message'))
+                if progress_callback:
+                    progress_callback(event)
+        except KeyboardInterrupt:
+            job.cancel()
+            raise
+        except DaemonError as e:
+            job._update({'event': 'done', 'status': 'error', 'error_message': str(e)})
+            if progress_callback:
+                progress_callback({'job_id': job.id, 'url': job.url, 'status': 'error', 'error_message': str(e)})
+        if progress_slot is not None:
+            progress_slot.set_status(job.status, filename=job.filename, error_message=job.error_message)
+        return job
+
+    # --- HTTP ---
+
+    def _request(self, method, path, payload=None, timeout=None):
+        data = None if payload is None else json.dumps(payload).encode('utf-8')
+        request = Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            with urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read() or b'{}')
+        except HTTPError as e:
+            raise DaemonError(self._error_message(e)) from e
+        except (URLError, OSError, ValueError) as e:
+            raise DaemonError(f"El servicio no responde en {self.base_url}: {e}") from e
+
+    def _open_events(self, job_id=None):
+        path = '/events' if job_id is None else f'/events?job={job_id}'
+        try:
+            # Sin eventos llega un latido cada DAEMON_HEARTBEAT segundos: varios seguidos perdidos = servicio caído
+            return urlopen(self.base_url + path, timeout=max(self.timeout, Config.DAEMON_HEARTBEAT * 5))
+        except HTTPError as e:
+            raise DaemonError(self._error_message(e)) from e
+        except (URLError, OSError) as e:
+            raise DaemonError(f"El servicio no responde en {self.base_url}: {e}") from e
+
+    def _iter_events(self, response):
+        try:
+            for line in response:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        except (OSError, ValueError) as e:
+            raise DaemonError(f"Se perdió la conexión con el servicio: {e}") from e
+        finally:
+            response.close()
+
+    @staticmethod
+    def _error_message(error):
+        try:
+            return json.loads(error.read()).get('error') or str(error)
+        except (OSError, ValueError, AttributeError):
+            return str(error)
+
+
+class RemoteScheduler:
+    """
+    Sustituto de DownloadScheduler para la GUI cuando hay un servicio corriendo:
+    submit() devuelve un RemoteJob y un hilo sigue sus eventos, que llegan al
+    callback y a la ranura del ProgressAggregator igual que con un trabajo local.
+    """
+    def __init__(self, client=None, aggregator=None):
+        self.client = client or RemoteDownloader()
+        self.aggregator = aggregator
+        self._followers = []  # (RemoteJob, hilo que lo sigue)
+
+    def submit(self, url, convert_format='none', progress_callback=None):
+        job = self.client.submit(url, convert_format)[0]
+        slot = self.aggregator.register(job.id, url) if self.aggregator else None
+        thread = threading.Thread(target=self.client._follow, args=(job, progress_callback, None, slot),
+                                  name=f"remote-job-{job.id}", daemon=True)
+        thread.start()
+        self._followers = [(j, t) for j, t in self._followers if t.is_alive()] + [(job, thread)]
+        return job
+
+    def shutdown(self, wait=True, cancel=False):
+        """Deja de seguir los trabajos. Siguen corriendo en el servicio salvo con cancel=True."""
+        if cancel:
+            for job, _ in self._followers:
+                if not job.done:
+                    job.cancel()
+        if wait:
+            for _, thread in self._followers:
+                thread.join()
@@ -9,8 +9,88 @@ class Config:
     DEFAULT_QUALITY = '720p'                        # Calidad por defecto para descargas
     MAX_RETRIES = 5                                 # Número máximo de reintentos
     USE_RATE_LIMITING = True                        # Usar limitación de tasa (útil para JKAnime)
+    RATE_LIMIT_GLOBAL_BYTES = None                  # Bytes/s para todo el proceso (None = sin límite)
+    RATE_LIMIT_HOST_BYTES = None                    # Bytes/s por host (None = sin límite)
+    RATE_LIMIT_GLOBAL_REQUESTS = 10                 # Peticiones/s para todo el proceso
+    RATE_LIMIT_HOST_REQUESTS = 2                    # Peticiones/s por host
+    MAX_CONCURRENT_DOWNLOADS = 3                    # Descargas simultáneas en modo lote
+    MAX_DOWNLOADS_PER_HOST = 2                      # Descargas simultáneas contra un mismo host
+    MAX_CONCURRENT_POSTPROCESS = max(1, (os.cpu_count() or 2) // 2)  # Conversiones FFmpeg simultáneas
+    EXECUTION_BACKEND = 'thread'                    # 'thread' o 'process' (cada descarga simultánea en su propio proceso)
+    PLAYLIST_MAX_PENDING = 16                       # Entradas de playlist expandidas por adelantado
+    SEGMENTED_CONNECTIONS = 4                       # Conexiones por archivo en la descarga segmentada (1 = desactivada)
+    SEGMENTED_MIN_SEGMENT_SIZE = 4 * 1024**2        # Tamaño mínimo de un segmento (bytes)
+    STREAMING_REMUX = False                         # Con -f mp4, remuxar mientras se descarga (experimental: sin archivos intermedios)
+    STREAMING_MOVFLAGS = 'frag_keyframe+empty_moov+default_base_moof'  # MP4 fragmentado: el .streampart es legible
+    DISK_SPACE_MARGIN = 512 * 1024**2               # Espacio libre que nunca se reserva para descargas
+    DISK_SPACE_UNKNOWN_SIZE = 1024**3               # Reserva por trabajo cuando la extracción no informa el tamaño
+    RETRY_MAX_ATTEMPTS = 3                          # Reintentos por trabajo ante fallos transitorios (0 = ninguno)
+    RETRY_BASE_DELAY = 2.0                          # Segundos del primer backoff (se duplica en cada intento, con jitter)
+    RETRY_MAX_DELAY = 300.0                         # Tope del backoff
+    RETRY_THROTTLED_DELAY = 30.0                    # Backoff inicial tras un 429 / rate limit
+    BREAKER_FAILURE_THRESHOLD = 5                   # Fallos transitorios seguidos que ponen un host en pausa
+    BREAKER_RESET_TIMEOUT = 60.0                    # Pausa inicial del host (se duplica si la prueba vuelve a fallar)
+    BREAKER_MAX_RESET_TIMEOUT = 900.0               # Pausa máxima de un host
+    SESSION_POOL_MAX_IDLE = 4                       # Sesiones de yt-dlp libres guardadas por perfil
+    HTTP_MAX_CONNECTIONS_PER_HOST = 16              # Conexiones keep-alive abiertas a la vez por host (las demás esperan)
+    HTTP_CONDITIONAL_CACHE_ITEMS = 128              # Respuestas con ETag/Last-Modified guardadas para revalidar con un 304
+    HTTP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+    ASYNC_EVENT_QUEUE_SIZE = 64                     # Eventos en cola por suscriptor de la API asyncio
+    PROGRESS_PUBLISH_INTERVAL = 0.25                # Segundos entre instantáneas del agregador de progreso
+    PROGRESS_SPEED_WINDOW = 3.0                     # Constante de tiempo (s) de la velocidad suavizada (EWMA)
+    RENDITION_PRESET = 'veryfast'                   # Preset de libx264 para las versiones de menor resolución (480p...)
+    RENDITION_CRF = 23                              # Calidad (CRF) de esas versiones
+    RENDITION_AUDIO_BITRATE = '128k'                # Audio AAC de esas versiones
+
+    # --- Configuración de caché ---
+    CACHE_DIR = str(Path.home() / ".cache" / "anime_downloader")
+    INFO_CACHE_ENABLED = True                       # Reutilizar la información extraída por yt-dlp
+    INFO_CACHE_FILE = str(Path(CACHE_DIR) / "info_cache.sqlite3")
+    INFO_CACHE_TTL = 6 * 3600                       # Segundos (se acorta si las URLs caducan antes)
+    INFO_CACHE_MEMORY_ITEMS = 256                   # Entradas en la LRU en memoria
+    SITES_CACHE_FILE = str(Path(CACHE_DIR) / "sites.json")  # Tabla de sitios soportados (--list-sites)
+
+    # --- Archivo de descargas (evita repetir videos ya bajados) ---
+    USE_DOWNLOAD_ARCHIVE = True
+    ARCHIVE_FILENAME = ".download_archive.jsonl"    # Se guarda dentro de la carpeta de descarga
+
+    # --- Diario de trabajos (reanudar lotes interrumpidos) ---
+    USE_JOB_JOURNAL = True
+    JOURNAL_FILENAME = ".jobs_journal.jsonl"        # Se guarda dentro de la carpeta de descarga
+
+    # --- Métricas (tiempos por fase, bytes, fallos) ---
+    METRICS_PORT = None                             # Puerto local para /metrics (None = desactivado)
+    METRICS_JSON_FILE = None                        # Volcado periódico a JSON (None = desactivado)
+    METRICS_JSON_INTERVAL = 60                      # Segundos entre volcados
+
+    # --- Modo servicio (--daemon) y clientes remotos ---
+    DAEMON_HOST = '127.0.0.1'                       # Solo local: la API no tiene autenticación
+    DAEMON_PORT = 8790
+    DAEMON_URL = f"http://{DAEMON_HOST}:{DAEMON_PORT}"
+    DAEMON_MAX_FINISHED_JOBS = 200                  # Trabajos terminados que el servicio recuerda
+    DAEMON_HEARTBEAT = 1.0                          # Segundos sin eventos antes de mandar un latido
+    DAEMON_EVENT_QUEUE_SIZE = 256                   # Eventos en cola por cliente conectado a /events
+    GUI_USE_DAEMON = True                           # La GUI usa el servicio si está corriendo
+
+    # --- Cola de trabajos compartida entre máquinas (--worker) ---
+    WORK_QUEUE = None                               # Ruta del .sqlite3 (p.ej. en un volumen compartido) o 'sqlite:///ruta'
+    WORK_QUEUE_LEASE = 120.0                        # Segundos que un worker retiene un trabajo sin latir
+    WORK_QUEUE_HEARTBEAT = 30.0                     # Segundos entre renovaciones del lease
+    WORK_QUEUE_MAX_ATTEMPTS = 4                     # Intentos por trabajo entre todos los workers (incluye leases vencidos)
+    WORK_QUEUE_POLL_INTERVAL = 5.0                  # Segundos entre consultas cuando la cola está vacía
+
+    # --- Perfilado por fase (--profile) ---
+    PROFILE_DIR = None                              # Carpeta de reportes (None = desactivado, sin costo)
+    PROFILE_SAMPLE = 1.0                            # Fracción de fases que se perfilan con cProfile
+    PROFILE_STACK_INTERVAL = 0.01                   # Segundos entre muestras de pilas (combined.folded)
+    PROFILE_TRACEMALLOC_FRAMES = 1                  # Marcos guardados por asignación (más = más detalle y más costo)
+    PROFILE_REPORT_INTERVAL = 300                   # Reescribir los reportes cada N segundos (0 = solo al terminar)
+    PROFILE_TOP_FUNCTIONS = 30                      # Líneas por tabla en los reportes
 
     # --- Configuración para Logging ---
     LOG_LEVEL = logging.INFO                        # Nivel de logging (INFO, DEBUG, WARNING, ERROR)
     LOG_FILE = "downloader.log"                     # Archivo de log
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    LOG_JSON = False                                # Archivo de log en JSON lines (job_id, url, fase, tiempos)
+    LOG_MAX_BYTES = 10 * 1024**2                    # Tamaño a partir del cual rota el archivo de log
+    LOG_BACKUP_COUNT = 3                            # Archivos rotados que se conservan
@@ -0,0 +1,306 @@
+# daemon.py
+import json
+import logging
+import queue
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import Config
+from outputs import normalize_format
+from progress import ProgressAggregator
+from scheduler import DownloadScheduler
+from utils import validate_url
+
+API_VERSION = 1
+
+
+class _APIHandler(BaseHTTPRequestHandler):
+    """
+    API JSON local del servicio:
+
+        GET    /health                 estado del servicio
+        GET    /jobs                   lista de trabajos
+        POST   /jobs                   {"url": ..., "format": "mp4,mp3"} o {"urls": [...]}
+        GET    /jobs/<id>              un trabajo
+        POST   /jobs/<id>/cancel       cancela (también DELETE /jobs/<id>)
+        GET    /events[?job=<id>]      eventos de progreso en JSON lines (streaming)
+        POST   /shutdown               detiene el servicio
+    """
+    server_version = 'AnimeDownloaderDaemon/1'
+    daemon = None
+
+    def do_GET(self):
+        path, query = self._route()
+        if path == '/health':
+            self._json(200, self.daemon.health())
+        elif path == '/jobs':
+            self._json(200, {'jobs': self.daemon.list_jobs()})
+        elif match := re.fullmatch(r'/jobs/(\d+)', path):
+            job = self.daemon.get_job(int(match.group(1)))
+            self._json(200, job) if job else self._json(404, {'error': 'Trabajo inexistente'})
+        elif path == '/events':
+            job_id = query.get('job', [None])[0]
+            self._stream_events(int(job_id) if job_id and job_id.isdigit() else None)
+        else:
+            self._json(404, {'error': 'Ruta inexistente'})
+
+    def do_POST(self):
+        path, _ = self._route()
+        # Solo JSON: un formulario o un fetch "simple" de una página web no puede mandar
+        # este Content-Type sin preflight, así que el navegador no puede usar la API a escondidas
+        if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+            self._json(415, {'error': 'Se espera Content-Type: application/json'})
+            return
+        if path == '/jobs':
+            try:
+                body = self._read_json()
+            except ValueError:
+                self._json(400, {'error': 'JSON inválido'})
+                return
+            urls = body.get('urls') or [body.get('url')]
+            try:
+                convert_format = normalize_format(body.get('format', 'none'))
+            except (ValueError, AttributeError) as e:
+                self._json(400, {'error': f"Formato inválido: {e}"})
+                return
+            invalid = [url for url in urls if not url or not validate_url(url)]
+            if invalid:
+                self._json(400, {'error': f"URL inválida: {invalid[0]}"})
+                return
+            self._json(201, {'jobs': [self.daemon.submit(url, convert_format) for url in urls]})
+        elif match := re.fullmatch(r'/jobs/(\d+)/cancel', path):
+            self._cancel(int(match.group(1)))
+        elif path == '/shutdown':
+            self._json(202, {'status': 'stopping'})
+            # No daemon: el intérprete no sale hasta que el planificador terminó de detenerse
+            threading.Thread(target=self.daemon.stop, name='daemon-stop').start()
+        else:
+            self._json(404, {'error': 'Ruta inexistente'})
+
+    def do_DELETE(self):
+        path, _ = self._route()
+        if match := re.fullmatch(r'/jobs/(\d+)', path):
+            self._cancel(int(match.group(1)))
+        else:
+            self._json(404, {'error': 'Ruta inexistente'})
+
+    def _cancel(self, job_id):
+        job = self.daemon.cancel(job_id)
+        self._json(200, job) if job else self._json(404, {'error': 'Trabajo inexistente'})
+
+    def _stream_events(self, job_id):
+        if job_id is not None and not self.daemon.get_job(job_id):
+            self._json(404, {'error': 'Trabajo inexistente'})
+            return
+        subscription = self.daemon.subscribe(job_id)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()  # HTTP/1.0: el cuerpo termina cuando se cierra la conexión
+            while True:
+                try:
+                    event = subscription.get(timeout=Config.DAEMON_HEARTBEAT)
+                except queue.Empty:
+                    event = {'event': 'heartbeat'}  # mantiene viva la conexión y deja al cliente revisar su cancelación
+                self.wfile.write(json.dumps(event, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+                self.wfile.flush()
+                if job_id is not None and event.get('event') == 'done' and event.get('job_id') == job_id:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente se desconectó
+        finally:
+            self.daemon.unsubscribe(subscription)
+
+    def _route(self):
+        parsed = urlparse(self.path)
+        return parsed.path.rstrip('/') or '/', parse_qs(parsed.query)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict):
+            raise ValueError("Se espera un objeto JSON")
+        return body
+
+    def _json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(f"{self.address_string()} {format % args}")
+
+
+class _Subscription:
+    """Cola acotada de eventos de un cliente. Si se atrasa, se descartan los más viejos."""
+    def __init__(self, job_id, maxsize):
+        self.job_id = job_id
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        if self.job_id is not None and event.get('job_id') != self.job_id:
+            return
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        return self._queue.get(timeout=timeout)
+
+
+class DownloadDaemon:
+    """
+    Servicio de larga vida: un AnimeDownloader con sesiones precalentadas y una única
+    cola de trabajos compartida por todos los clientes (CLI, GUI, scripts), que así
+    comparten también los límites de concurrencia y de tasa. Se maneja por una API
+    HTTP local (ver _APIHandler y client.RemoteDownloader).
+    """
+    def __init__(self, downloader, host=None, port=None, max_finished_jobs=None):
+        self.downloader = downloader
+        self.logger = logging.getLogger(__name__)
+        self.max_finished_jobs = max_finished_jobs or Config.DAEMON_MAX_FINISHED_JOBS
+        self.aggregator = ProgressAggregator()
+        self.scheduler = DownloadScheduler(
+            downloader.executor, downloader.concurrent_downloads, downloader.per_host_limit, keep_jobs=False,
+            postprocess_workers=downloader.postprocess_workers, journal=downloader.journal, aggregator=self.aggregator
+        )
+        self._jobs = OrderedDict()  # job_id -> DownloadJob (los terminados se recortan)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        handler = type('Handler', (_APIHandler,), {'daemon': self})
+        self.httpd = ThreadingHTTPServer((host or Config.DAEMON_HOST, port or Config.DAEMON_PORT), handler)
+        self.httpd.daemon_threads = True
+        self._stopped = threading.Event()
+        self._finished = threading.Event()  # el planificador ya se detuvo (trabajos cancelados, diario cerrado)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        """Precalienta sesiones y atiende la API hasta que se llame a stop()."""
+        self.downloader.warm_sessions('none')
+        self.downloader.warm_sessions('mp3', 1)
+        self.logger.info(f"Servicio escuchando en {self.url}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+        # httpd.shutdown() devuelve el control enseguida: no volver hasta que stop() haya
+        # detenido el planificador, o los trabajos en curso quedarían huérfanos al salir
+        if self._stopped.is_set():
+            self._finished.wait()
+
+    def stop(self, cancel=True):
+        """Detiene la API y el planificador. Los trabajos cancelados quedan en el diario para --resume."""
+        if self._stopped.is_set():
+            self._finished.wait()
+            return
+        self._stopped.set()
+        try:
+            self.httpd.shutdown()
+            self.scheduler.shutdown(wait=True, cancel=cancel)
+        finally:
+            self._finished.set()
+        self.logger.info("Servicio detenido")
+
+    # --- Trabajos ---
+
+    def submit(self, url, convert_format='none'):
+        job = self.scheduler.submit(url, convert_format, self._on_event)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_finished()
+        job.add_done_callback(self._on_done)
+        self._publish({'event': 'submitted', **self._job_dict(job)})
+        return self._job_dict(job)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if not job:
+            return None
+        job.cancel()
+        return self._job_dict(job)
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return self._job_dict(job) if job else None
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [self._job_dict(job) for job in jobs]
+
+    def health(self):
+        active = self.scheduler.active_jobs
+        return {
+            'status': 'ok', 'api': API_VERSION, 'output_path': str(self.downloader.output_path),
+            'active': len(active), 'jobs': len(self._jobs), 'total': self.aggregator.snapshot()['total'],
+            'hosts': self.scheduler.breakers.snapshot(),
+        }
+
+    def _job_dict(self, job):
+        data = {
+            'job_id': job.id, 'url': job.url, 'format': job.convert_format, 'status': job.status,
+            'filename': job.filename, 'error_message': job.error_message,
+        }
+        if job.progress_slot is not None and not job.done:
+            data['progress'] = job.progress_slot.as_dict()
+        return data
+
+    def _trim_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    # --- Eventos ---
+
+    def subscribe(self, job_id=None):
+        subscription = _Subscription(job_id, Config.DAEMON_EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+            job = self._jobs.get(job_id) if job_id is not None else None
+        if job and job.done:
+            subscription.put(self._done_event(job))  # terminó antes de suscribirse
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _on_event(self, data):
+        if data.get('status') == 'downloading':
+            # Velocidad suavizada y ETA del agregador en lugar de los valores crudos del hook
+            with self._lock:
+                job = self._jobs.get(data.get('job_id'))
+            if job and job.progress_slot is not None:
+                data = dict(data, **{k: v for k, v in job.progress_slot.as_dict().items() if k in ('speed', 'eta')})
+        self._publish(data)
+
+    def _on_done(self, job):
+        self._publish(self._done_event(job))
+
+    def _done_event(self, job):
+        return {'event': 'done', **self._job_dict(job)}
+
+    def _publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
@@ -0,0 +1,152 @@
+# diskspace.py
+import logging
+import os
+import threading
+from pathlib import Path
+
+from config import Config
+from outputs import estimated_output_size, parse_outputs
+from utils import check_disk_space, format_bytes
+
+
+class InsufficientSpaceError(Exception):
+    """No queda espacio libre (sin reservar) para el trabajo."""
+
+
+def expected_size(info):
+    """
+    Tamaño esperado de la descarga según la extracción ('filesize', 'filesize_approx'
+    o bitrate * duración). None si algún formato elegido no lo informa.
+    """
+    if not info:
+        return None
+    duration = info.get('duration')
+    total = 0
+    for fmt in info.get('requested_formats') or [info]:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and duration:
+            size = fmt['tbr'] * 1000 / 8 * duration
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+
+def space_needed(info, convert_format='none', unknown_size=None):
+    """
+    Bytes a reservar para un trabajo: la descarga más el pico de copias temporales.
+    La mezcla de video y audio y el re-empaquetado escriben un archivo nuevo
+    completo antes de borrar el anterior; la conversión a MP3 escribe solo el audio.
+    Con varias salidas ('mp4,mp3,480p') se escriben todas a la vez junto a la descarga.
+    """
+    size = expected_size(info) or (Config.DISK_SPACE_UNKNOWN_SIZE if unknown_size is None else unknown_size)
+    info = info or {}
+    merge_extra = size if len(info.get('requested_formats') or ()) > 1 else 0
+    convert_extra = sum(estimated_output_size(name, size, info) for name in parse_outputs(convert_format))
+    return size + max(merge_extra, convert_extra)
+
+
+class SpaceReservation:
+    """Bytes apartados para un trabajo. 'written' descuenta lo que ya ocupa en disco."""
+    __slots__ = ('manager', 'device', 'size', 'written')
+
+    def __init__(self, manager, device, size):
+        self.manager = manager
+        self.device = device
+        self.size = size
+        self.written = 0
+
+    @property
+    def outstanding(self):
+        return max(0, self.size - self.written)
+
+    def release(self):
+        self.manager._release(self)
+
+
+class SpaceManager:
+    """
+    Reparte el espacio libre de cada sistema de archivos entre los trabajos activos.
+    Una reserva solo se concede si el espacio libre menos lo ya reservado (y aún no
+    escrito) por otros trabajos y el margen alcanza, así varias descargas grandes
+    simultáneas no pueden pasar todas el chequeo y después llenar el disco.
+    """
+    def __init__(self, margin=None):
+        self.margin = Config.DISK_SPACE_MARGIN if margin is None else margin
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._reservations = set()
+
+    def reserve(self, path, size):
+        """Reserva 'size' bytes en el disco de 'path'. Lanza InsufficientSpaceError si no alcanza."""
+        path = _existing_parent(path)
+        device = os.stat(path).st_dev
+        with self._lock:
+            try:
+                free = check_disk_space(path)
+            except OSError as e:
+                self.logger.warning(f"No se pudo verificar el espacio en disco: {e}")
+                free = None
+            if free is not None:
+                pending = sum(r.outstanding for r in self._reservations if r.device == device)
+                available = free - pending - self.margin
+                if size > available:
+                    raise InsufficientSpaceError(
+                        f"Espacio en disco insuficiente: se necesitan {format_bytes(size)} "
+                        f"y quedan {format_bytes(max(0, available))} sin reservar."
+                    )
+            reservation = SpaceReservation(self, device, size)
+            self._reservations.add(reservation)
+        self.logger.debug(f"Reservados {format_bytes(size)} en {path}")
+        return reservation
+
+    def reserved(self):
+        """Bytes reservados y todavía no escritos, en todos los discos."""
+        with self._lock:
+            return sum(r.outstanding for r in self._reservations)
+
+    def _release(self, reservation):
+        with self._lock:
+            self._reservations.discard(reservation)
+
+
+def _existing_parent(path):
+    path = Path(path)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def preallocate(path, size):
+    """
+    Crea el archivo con su tamaño final. Devuelve True si sus bloques quedaron
+    realmente reservados en disco (el espacio libre ya lo descuenta).
+    """
+    with open(path, 'wb') as f:
+        if size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return True
+            except OSError:
+                pass  # p.ej. sistemas de archivos sin soporte: queda un archivo disperso
+        f.truncate(size)
+    return False
+
+
+def is_allocated(path, size):
+    """True si 'path' ya ocupa en disco sus 'size' bytes (preasignado, no disperso)."""
+    blocks = getattr(os.stat(path), 'st_blocks', None)
+    return blocks is not None and blocks * 512 >= size
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def get_space_manager():
+    """Gestor compartido por todo el proceso: las reservas de todos los descargadores se suman."""
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = SpaceManager()
+        return _default_manager
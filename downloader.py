@@ -1,20 +1,43 @@
 # downloader.py
+import copy
 import time
 import logging
+from collections import Counter
 from pathlib import Path
 import yt_dlp
 import ffmpeg
 import os
+import requests
+from urllib.parse import urlparse
 
+from archive import DownloadArchive, archive_key_for_url, make_archive_key
+from cache import InfoCache
 from config import Config
-from utils import clean_filename, check_disk_space, format_bytes
+from diskspace import InsufficientSpaceError, get_space_manager, space_needed
+from journal import JobJournal
+from metrics import PostprocessorTimer, record_transfer, time_phase
+from ffmpeg_runner import FFmpegCancelled, probe_duration, run_ffmpeg
+from outputs import MP3_BITRATE, build_outputs, download_mode, is_multi_output, parse_outputs, plan_outputs
+from playlist import FLAT_PLAYLIST_OPTS, iter_playlist_entries
+from ratelimit import get_rate_limiter
+from scheduler import DownloadScheduler
+from segmented import SegmentedDownloader, SegmentedNotSupported
+from session_pool import YDLSessionPool
+from streaming import StreamingDownloadError, StreamingNotSupported, StreamingRemuxer, stream_formats
+from utils import clean_filename, format_bytes
 
 class SafeProgressHook:
-    """Hook de progreso que ahora también maneja la cancelación."""
-    def __init__(self, callback=None, cancel_event=None):
+    """Hook de progreso que ahora también maneja la cancelación y el límite de tasa."""
+    def __init__(self, callback=None, cancel_event=None, rate_limiter=None, host=None, progress_slot=None):
         self.callback = callback
         self.cancel_event = cancel_event # <-- Evento para saber si cancelar
+        self.rate_limiter = rate_limiter
+        self.host = host
         self.last_update = 0
+        self._last_bytes = {}  # archivo -> bytes ya contados
+        self.bytes_received = 0  # bytes recibidos en esta descarga (para las métricas)
+        self.reservation = None  # reserva de espacio del trabajo: lo escrito deja de contar como pendiente
+        self.progress_slot = progress_slot  # ranura del ProgressAggregator (se actualiza en cada tick)
 
     def __call__(self, data):
         # --- LÓGICA DE CANCELACIÓN ---
@@ -23,6 +46,19 @@ class SafeProgressHook:
             # Si es así, lanzamos una excepción para detener a yt-dlp.
             raise Exception("Descarga cancelada por el usuario.")
         # -----------------------------
+
+        if data.get('status') == 'downloading':
+            received = self._count_bytes(data)
+            # Dormir aquí frena el bucle de lectura de yt-dlp: así se aplica el límite compartido
+            if self.rate_limiter and received > 0:
+                self.rate_limiter.consume_bytes(self.host, received, self.cancel_event)
+
+        if self.progress_slot is not None and data.get('status') == 'downloading':
+            self.progress_slot.update(
+                data.get('downloaded_bytes') or 0,
+                data.get('total_bytes') or data.get('total_bytes_estimate'),
+                data.get('filename'),
+            )
             
         if not self.callback:
             return
@@ -40,14 +76,15 @@ class SafeProgressHook:
             if status == 'downloading':
                 info_dict = data.get('info_dict', {})
                 downloaded = data.get('downloaded_bytes', 0)
-                total = data.get('total_bytes') or data.get('total_bytes_estimate', 0)
+                total = data.get('total_bytes') or data.get('total_bytes_estimate') or 0
                 speed = data.get('speed', 0)
                 percentage = (downloaded / total) * 100 if total > 0 else 0
                 
                 progress_data = {
                     'status': 'downloading', 'percentage': percentage,
                     'downloaded_bytes': int(downloaded), 'total_bytes': int(total),
-                    'speed': int(speed), 'filename': info_dict.get('filename', ''),
+                    'speed': int(speed or 0), 'filename': info_dict.get('filename', ''),
+                    'tmpfilename': data.get('tmpfilename', ''),
                 }
             elif status == 'finished':
                 progress_data = {
@@ -67,72 +104,365 @@ class SafeProgressHook:
                 raise e
 
 
+    def _count_bytes(self, data):
+        """Bytes nuevos desde el tick anterior del mismo archivo."""
+        key = data.get('tmpfilename') or data.get('filename')
+        downloaded = data.get('downloaded_bytes') or 0
+        previous = self._last_bytes.get(key, 0)
+        self._last_bytes[key] = downloaded
+        received = max(0, downloaded - previous)
+        self.add_received(received)
+        return received
+
+    def add_received(self, count, written=True):
+        """Bytes recibidos. written=False si quien escribe ya los descuenta de la reserva."""
+        self.bytes_received += count
+        if written and self.reservation is not None:
+            self.reservation.written += count
+
+
 class AnimeDownloader:
-    # ... (el __init__ y otros métodos se mantienen igual) ...
-    def __init__(self, output_path=None, quality='720p', max_retries=3):
+    # Opciones de la sesión usada solo para extraer información (sin descargar)
+    _INFO_OPTS = {'quiet': True, 'no_warnings': True, 'extract_flat': False, 'socket_timeout': 30}
+
+    def __init__(self, output_path=None, quality='720p', max_retries=3, concurrent_downloads=None, per_host_limit=None,
+                 postprocess_workers=None, segmented_connections=None, rate_limiter=None, backend=None,
+                 profile_dir=None):
         self.output_path = Path(output_path or Config.DOWNLOAD_PATH).expanduser().resolve()
         self.quality = quality
         self.max_retries = max_retries
+        self.concurrent_downloads = concurrent_downloads or Config.MAX_CONCURRENT_DOWNLOADS
+        self.per_host_limit = per_host_limit or Config.MAX_DOWNLOADS_PER_HOST
+        self.postprocess_workers = Config.MAX_CONCURRENT_POSTPROCESS if postprocess_workers is None else postprocess_workers
+        # 'process': cada descarga simultánea corre en su propio proceso (ver workers.py)
+        self.backend = backend or Config.EXECUTION_BACKEND
+        if self.backend == 'process':
+            self.postprocess_workers = 0  # cada proceso convierte lo que descarga
+        self._process_pool = None
         self.logger = logging.getLogger(__name__)
+        # Perfilado por fase (ver profiling.py): solo se importa si se pidió
+        if profile_dir or Config.PROFILE_DIR:
+            import profiling
+            profiling.start(profile_dir or Config.PROFILE_DIR)
+        self.info_cache = InfoCache() if Config.INFO_CACHE_ENABLED else None
+        self.sessions = YDLSessionPool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.space = get_space_manager()
+        self._reservations = {}  # archivo descargado -> reserva, hasta terminar el post-procesado
+        # Motor segmentado propio para archivos progresivos (1 conexión = desactivado)
+        connections = Config.SEGMENTED_CONNECTIONS if segmented_connections is None else segmented_connections
+        self.segmented = SegmentedDownloader(connections, max_retries=max_retries, rate_limiter=self.rate_limiter) if connections > 1 else None
+        # Remux a MP4 en streaming (descarga -> tubería -> FFmpeg) para el formato 'mp4'
+        self.streaming = StreamingRemuxer(max_retries=max_retries, rate_limiter=self.rate_limiter) if Config.STREAMING_REMUX else None
         self.output_path.mkdir(parents=True, exist_ok=True)
+        self.archive = self._open_archive()
+        self._journal = None
         self.logger.info(f"Downloader inicializado - Calidad: {quality}")
 
-    # Este método ahora acepta el 'cancel_event'
-    def _get_ydl_config(self, progress_callback=None, convert_format='none', cancel_event=None):
+    def _get_ydl_config(self, convert_format='none'):
+        """Opciones de yt-dlp para un perfil. Los hooks por trabajo se enganchan en la sesión."""
         config = {
             'outtmpl': str(self.output_path / '%(title)s.%(ext)s'),
             'quiet': True, 'noprogress': True, 'no_warnings': True,
-            'ignoreerrors': True, 'retries': self.max_retries, 'socket_timeout': 30,
-            # Pasamos el evento de cancelación a nuestro hook
-            'progress_hooks': [SafeProgressHook(progress_callback, cancel_event)] if progress_callback else [],
+            # Sin ignoreerrors: el error real de yt-dlp llega al trabajo y decide si se reintenta
+            'ignoreerrors': False, 'retries': self.max_retries, 'socket_timeout': 30,
+            # Reanudar los .part que dejó una ejecución interrumpida
+            'continuedl': True, 'nopart': False,
         }
-        if convert_format == 'mp3':
+        if download_mode(convert_format) == 'mp3':
+            # La conversión a MP3 la hace la etapa de post-procesado (postprocess_episode)
             config['format'] = 'bestaudio/best'
-            config['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}]
         else:
             config['format'] = f'bestvideo[ext=mp4][height<={self.quality[:-1]}]+bestaudio[ext=m4a]/best[ext=mp4]/best'
             config['merge_output_format'] = 'mp4'
         return config
 
+    def _session_profile(self, convert_format='none'):
+        """Clave del perfil de sesión: todo lo que baja video ('none', 'mp4', 'mp4,mp3'...) comparte opciones."""
+        return (str(self.output_path), self.quality, download_mode(convert_format))
+
+    def _ydl_session(self, convert_format='none', progress_hook=None, postprocessor_hook=None):
+        return self.sessions.session(self._session_profile(convert_format), self._get_ydl_config(convert_format),
+                                     progress_hook, postprocessor_hook)
+
+    def warm_sessions(self, convert_format='none', count=None):
+        """Precalienta sesiones de yt-dlp para el perfil (por defecto, una por descarga simultánea)."""
+        if self.backend == 'process':
+            self.executor.warm(convert_format, count)  # una sesión en cada proceso
+            return
+        self.sessions.warm(self._session_profile(convert_format), self._get_ydl_config(convert_format), count or self.concurrent_downloads)
+
+    @property
+    def executor(self):
+        """Lo que ejecuta los trabajos de un DownloadScheduler: este objeto (hilos) o el pool de procesos."""
+        if self.backend != 'process':
+            return self
+        if self._process_pool is None:
+            from workers import ProcessPool
+            self._process_pool = ProcessPool(self, self.concurrent_downloads)
+        return self._process_pool
+
     # Este método ahora acepta y pasa el 'cancel_event'
-    def download_episode_safe(self, url, progress_callback=None, convert_format='none', cancel_event=None):
-        self.logger.info(f"Iniciando descarga de: {url} | Formato: {convert_format.upper()}")
-        
-        if not self._check_available_space():
-            if progress_callback: progress_callback({'status': 'error', 'error_message': 'Espacio en disco insuficiente.'})
+    def download_episode_safe(self, url, progress_callback=None, convert_format='none', cancel_event=None, progress_slot=None):
+        """Descarga y post-procesa una URL en el hilo actual. Devuelve True si terminó bien."""
+        if self.check_archive(url, progress_callback, convert_format):
+            return True
+        fetched = self.fetch_episode(url, progress_callback, convert_format, cancel_event, progress_slot)
+        if not fetched:
             return False
+        source_path, info = fetched
+        return self.postprocess_episode(source_path, progress_callback, convert_format, cancel_event, info) is not None
+
+    def check_archive(self, url, progress_callback=None, convert_format='none', key=None):
+        """
+        Consulta el archivo de descargas antes de cualquier extracción de red.
+        Si el video ya está, emite 'finished' (con 'skipped') y devuelve su ruta.
+        """
+        if not self.archive:
+            return None
+        # Con varias salidas, el trabajo se omite solo si ya están todas
+        key = key or archive_key_for_url(url)
+        records = [self.archive.lookup(key, name) for name in parse_outputs(convert_format)]
+        if not all(records):
+            return None
+        record = records[0]
+        self.logger.info(f"Ya descargado, se omite: {url} -> {record['path']}")
+        if progress_callback: progress_callback({'status': 'finished', 'filename': record['path'], 'skipped': True})
+        return record['path']
+
+    def fetch_episode(self, url, progress_callback=None, convert_format='none', cancel_event=None, progress_slot=None):
+        """
+        Etapa de red: extrae y descarga (incluida la mezcla de yt-dlp) sin convertir.
+        Devuelve (ruta_descargada, info) o None si falló o se canceló.
+        """
+        self.logger.info(f"Iniciando descarga de: {url} | Formato: {convert_format.upper()}")
 
-        # Pasamos el evento de cancelación a la configuración de yt-dlp
-        ydl_opts = self._get_ydl_config(progress_callback, convert_format, cancel_event)
+        # El hook del trabajo (progreso + cancelación) se engancha a una sesión reutilizada
+        host = urlparse(url).netloc
+        hook = SafeProgressHook(progress_callback, cancel_event, self.rate_limiter, host, progress_slot)
+        pp_timer = PostprocessorTimer(host)  # mide la mezcla de yt-dlp como fase aparte
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+            raw_info = self._extract_info(url)
+            with time_phase('download', host) as timer:
+                if not self.rate_limiter.acquire_request(url, cancel_event):
+                    raise Exception("Descarga cancelada por el usuario.")
+                with self._ydl_session(convert_format, hook, pp_timer) as ydl:
+                    # Elegir el formato sin descargar da el tamaño esperado: se reserva el
+                    # espacio antes de transferir nada y se falla aquí si no alcanza
+                    selected = ydl.process_ie_result(copy.deepcopy(raw_info), download=False) if raw_info else None
+                    hook.reservation = self.space.reserve(self.output_path, space_needed(selected, convert_format))
+                    fetched = None
+                    if selected and self.streaming and convert_format == 'mp4':
+                        fetched = self._fetch_streaming(ydl, selected, hook, progress_callback, cancel_event)
+                    if not fetched and selected and self.segmented:
+                        fetched = self._fetch_segmented(ydl, selected, hook, progress_callback, cancel_event)
+                    if fetched:
+                        filename, info = fetched
+                    elif raw_info:
+                        # Reutilizamos la extracción (posiblemente cacheada) y solo procesamos/descargamos
+                        info = ydl.process_ie_result(copy.deepcopy(raw_info), download=True)
+                    else:
+                        info = ydl.extract_info(url, download=True)
+                    if not fetched:
+                        filename = ydl.prepare_filename(info) if info else None
 
-            if not info: raise Exception("yt-dlp no devolvió información.")
-            
-            filename = ydl.prepare_filename(info)
-            if convert_format == 'mp3': filename = Path(filename).with_suffix('.mp3')
-            
-            final_filepath = str(filename)
-            if convert_format == 'mp4':
-                final_filepath = self._ensure_mp4_container(final_filepath, progress_callback, cancel_event)
-                if not final_filepath: return False
-
-            if progress_callback: progress_callback({'status': 'finished', 'filename': final_filepath})
-            return True
+                if not info: raise Exception("yt-dlp no devolvió información.")
+                timer.excluded = pp_timer.total
+                elapsed = timer.elapsed
+            record_transfer(host, hook.bytes_received, elapsed)
+            self.logger.info(f"Descargado {Path(filename).name} ({format_bytes(hook.bytes_received)} en {elapsed:.1f} s)",
+                             extra={'bytes': hook.bytes_received, 'elapsed': elapsed})
+            self._reservations[str(filename)] = hook.reservation
+            return str(filename), info
 
         except Exception as e:
-            if "cancelada por el usuario" in str(e):
+            if hook.reservation:
+                hook.reservation.release()
+            if isinstance(e, InsufficientSpaceError):
+                self.logger.error(str(e))
+                if progress_callback: progress_callback({'status': 'error', 'error_message': str(e)})
+            elif "cancelada por el usuario" in str(e):
                 self.logger.info("La descarga fue cancelada por el usuario.")
                 if progress_callback: progress_callback({'status': 'cancelled'})
             else:
                 self.logger.error(f"Fallo la descarga de {url} con error: {e}")
                 if progress_callback: progress_callback({'status': 'error', 'error_message': str(e)})
-            return False
+            return None
+
+    def _fetch_streaming(self, ydl, info, hook, progress_callback, cancel_event):
+        """
+        Si las entradas elegidas se pueden leer de una tubería, las descarga pasándolas
+        directo al muxer de FFmpeg: solo se escribe el MP4 final, sin mezclar ni
+        re-empaquetar después. Devuelve (ruta, info) o None para seguir por el camino normal.
+        """
+        formats = stream_formats(info)
+        if not formats:
+            return None
+        filename = str(Path(ydl.prepare_filename(info)).with_suffix('.mp4'))
+        if os.path.exists(filename):
+            return filename, info
+        received = hook.bytes_received
+        try:
+            self.streaming.remux(formats, filename, progress_callback, cancel_event, on_bytes=hook.add_received)
+        except StreamingNotSupported as e:
+            self.logger.info(f"{e}; se usa la descarga normal")
+            return None
+        except (StreamingDownloadError, requests.RequestException):
+            # Corte de red: el .streampart se conserva y el reintento del trabajo lo retoma
+            # (un 404/403 no deja .streampart y falla igual que con la descarga normal)
+            raise
+        except Exception as e:
+            if "cancelada por el usuario" in str(e):
+                raise
+            self.logger.warning(f"Remux en streaming fallido, se usa la descarga normal: {e}")
+            hook.add_received(received - hook.bytes_received)  # lo bajado se descartó
+            return None
+        return filename, info
+
+    def _fetch_segmented(self, ydl, info, hook, progress_callback, cancel_event):
+        """
+        Si el formato elegido ('info' ya procesado) es un único archivo HTTP progresivo,
+        lo baja con el motor segmentado (varias conexiones por rangos). Devuelve
+        (ruta, info) o None para que siga la descarga normal de yt-dlp.
+        """
+        if not info or info.get('requested_formats') or info.get('protocol') not in ('http', 'https') or not info.get('url'):
+            return None
+        filename = ydl.prepare_filename(info)
+        if os.path.exists(filename):
+            return filename, info
+        try:
+            self.segmented.download(
+                info['url'], filename, headers=info.get('http_headers'), expected_size=info.get('filesize'),
+                progress_callback=progress_callback, cancel_event=cancel_event,
+                on_bytes=lambda count: hook.add_received(count, written=False), reservation=hook.reservation
+            )
+        except SegmentedNotSupported as e:
+            self.logger.debug(f"Descarga segmentada no disponible, se usa yt-dlp: {e}")
+            return None
+        return filename, info
+
+    def postprocess_episode(self, source_path, progress_callback=None, convert_format='none', cancel_event=None, info=None):
+        """
+        Etapa de CPU/disco: convierte lo descargado al formato pedido y lo registra en el archivo.
+        Devuelve la ruta final o None si falló o se canceló. Emite el evento 'finished'.
+        """
+        info = info or {}
+        duration = info.get('duration')
+        final_filepath = str(source_path)
+        reservation = self._reservations.pop(final_filepath, None)
+        outputs = None
+        try:
+            if is_multi_output(convert_format):
+                outputs = self._render_outputs(final_filepath, convert_format, progress_callback, cancel_event, info)
+                final_filepath = next(iter(outputs.values())) if outputs else None
+            elif convert_format == 'mp3':
+                final_filepath = self._convert_to_mp3(final_filepath, progress_callback, cancel_event, duration)
+            elif convert_format == 'mp4':
+                final_filepath = self._ensure_mp4_container(final_filepath, progress_callback, cancel_event, duration)
+        finally:
+            if reservation:
+                reservation.release()
+        if not final_filepath: return None
+
+        if self.archive:
+            # Cada salida se registra por separado: un pedido posterior de solo 'mp3' también la encuentra
+            for name, path in (outputs or {convert_format: final_filepath}).items():
+                self.archive.add(
+                    make_archive_key(info.get('extractor_key'), info.get('id')), path,
+                    name, url=info.get('webpage_url'), format_id=info.get('format_id')
+                )
+        if progress_callback:
+            event = {'status': 'finished', 'filename': final_filepath}
+            if outputs:
+                event['outputs'] = list(dict.fromkeys(outputs.values()))
+            progress_callback(event)
+        return final_filepath
 
-    # Modificamos el método de conversión para que también sea cancelable
-    def _ensure_mp4_container(self, input_path, progress_callback, cancel_event):
+    def download_batch(self, urls, progress_callback=None, convert_format='none'):
+        """
+        Descarga varias URLs en paralelo con un DownloadScheduler.
+        Bloquea hasta que terminan todas y devuelve la lista de DownloadJob.
+        """
+        # Una sola URL (-u) no necesita una sesión por descarga simultánea
+        try:
+            count = min(len(urls), self.concurrent_downloads)
+        except TypeError:
+            count = self.concurrent_downloads  # iterable perezoso: sin tope conocido
+        if count:
+            self.warm_sessions(convert_format, count)
+        with DownloadScheduler(self.executor, self.concurrent_downloads, self.per_host_limit,
+                               postprocess_workers=self.postprocess_workers, journal=self.journal) as scheduler:
+            jobs = scheduler.submit_many(urls, convert_format, progress_callback)
+            try:
+                scheduler.join()
+            except KeyboardInterrupt:
+                scheduler.cancel_all()
+                raise
+        return jobs
+
+    def resume_jobs(self, progress_callback=None):
+        """
+        Reanuda los trabajos que quedaron sin terminar en el diario (corte, cierre de la GUI...).
+        yt-dlp continúa los .part existentes en lugar de empezar de cero.
+        Devuelve la lista de DownloadJob.
+        """
+        pending = self.journal.unfinished() if self.journal else []
+        if not pending:
+            return []
+        self.logger.info(f"Reanudando {len(pending)} trabajos del diario")
+        with DownloadScheduler(self.executor, self.concurrent_downloads, self.per_host_limit,
+                               postprocess_workers=self.postprocess_workers, journal=self.journal) as scheduler:
+            jobs = [
+                scheduler.submit(record['url'], record.get('format', 'none'), progress_callback, journal_id=record['id'])
+                for record in pending
+            ]
+            try:
+                scheduler.join()
+            except KeyboardInterrupt:
+                scheduler.cancel_all()
+                raise
+        return jobs
+
+    def download_playlist(self, url, progress_callback=None, convert_format='none', start=1, end=None, entry_filter=None):
+        """
+        Expande una playlist/serie de forma perezosa y descarga sus entradas en paralelo.
+        Como mucho Config.PLAYLIST_MAX_PENDING entradas esperan en cola a la vez, así que
+        la memoria y el tiempo hasta el primer byte no crecen con el tamaño de la lista.
+        Devuelve un dict con el conteo de trabajos por estado.
+        """
+        summary = Counter()
+
+        self.warm_sessions(convert_format)
+        scheduler = DownloadScheduler(self.executor, self.concurrent_downloads, self.per_host_limit,
+                                      max_pending=Config.PLAYLIST_MAX_PENDING, keep_jobs=False,
+                                      postprocess_workers=self.postprocess_workers, journal=self.journal)
+        submitted = []
+        try:
+            with self.sessions.session('playlist', FLAT_PLAYLIST_OPTS) as ydl:
+                for entry in iter_playlist_entries(ydl, url, start, end, entry_filter):
+                    if self.check_archive(entry['url'], progress_callback, convert_format, entry.get('archive_key')):
+                        summary['archived'] += 1
+                        continue
+                    job = scheduler.submit(entry['url'], convert_format, progress_callback)
+                    submitted.append(job)
+                    # Solo se retienen los trabajos sin terminar
+                    for done in [j for j in submitted if j.done]:
+                        summary[done.status] += 1
+                        submitted.remove(done)
+            scheduler.join()
+        except KeyboardInterrupt:
+            scheduler.cancel_all()
+            raise
+        finally:
+            scheduler.shutdown(wait=True)
+        for job in submitted:
+            summary[job.status] += 1
+        self.logger.info(f"Playlist terminada: {dict(summary)}")
+        return dict(summary)
+
+    # FFmpeg corre como subproceso gestionado: informa su progreso y se puede cancelar
+    def _ensure_mp4_container(self, input_path, progress_callback, cancel_event, duration=None):
         input_path = Path(input_path)
         if input_path.suffix == '.mp4': return str(input_path)
 
@@ -140,44 +470,148 @@ class AnimeDownloader:
         if progress_callback: progress_callback({'status': 'converting', 'filename': str(output_path)})
         
         try:
-            # Aquí no podemos cancelar FFmpeg fácilmente, pero revisamos antes de empezar
-            if cancel_event and cancel_event.is_set(): raise Exception("Conversión cancelada por el usuario.")
+            if cancel_event and cancel_event.is_set(): raise FFmpegCancelled()
             
-            ffmpeg.input(str(input_path)).output(str(output_path), vcodec='copy', acodec='copy').run(overwrite_output=True, quiet=True)
+            stream = ffmpeg.input(str(input_path)).output(str(output_path), vcodec='copy', acodec='copy')
+            with time_phase('remux'):
+                run_ffmpeg(
+                    stream, duration or probe_duration(input_path), progress_callback, cancel_event,
+                    output_files=[str(output_path)], filename=str(output_path)
+                )
             os.remove(input_path)
             return str(output_path)
+        except FFmpegCancelled:
+            self.logger.info("La conversión fue cancelada por el usuario.")
+            if progress_callback: progress_callback({'status': 'cancelled'})
+            return None
         except Exception as e:
-            if "cancelada por el usuario" not in str(e):
-                self.logger.error(f"Error de FFmpeg: {e}")
-                if progress_callback: progress_callback({'status': 'error', 'error_message': 'Fallo al re-empaquetar a MP4'})
-            # No necesitamos hacer nada más si se canceló
+            self.logger.error(f"Error de FFmpeg: {e}")
+            if progress_callback: progress_callback({'status': 'error', 'error_message': 'Fallo al re-empaquetar a MP4'})
             return None
     
+    def _convert_to_mp3(self, input_path, progress_callback, cancel_event, duration=None):
+        input_path = Path(input_path)
+        if input_path.suffix == '.mp3': return str(input_path)
+
+        output_path = input_path.with_suffix('.mp3')
+        if progress_callback: progress_callback({'status': 'converting', 'filename': str(output_path)})
+
+        try:
+            if cancel_event and cancel_event.is_set(): raise FFmpegCancelled()
+
+            stream = ffmpeg.input(str(input_path)).output(str(output_path), vn=None, acodec='libmp3lame', audio_bitrate=MP3_BITRATE)
+            with time_phase('audio_extract'):
+                run_ffmpeg(
+                    stream, duration or probe_duration(input_path), progress_callback, cancel_event,
+                    output_files=[str(output_path)], filename=str(output_path)
+                )
+            os.remove(input_path)
+            return str(output_path)
+        except FFmpegCancelled:
+            self.logger.info("La conversión fue cancelada por el usuario.")
+            if progress_callback: progress_callback({'status': 'cancelled'})
+            return None
+        except Exception as e:
+            self.logger.error(f"Error de FFmpeg: {e}")
+            if progress_callback: progress_callback({'status': 'error', 'error_message': 'Fallo al convertir a MP3'})
+            return None
+
+    def _render_outputs(self, input_path, convert_format, progress_callback, cancel_event, info):
+        """
+        Genera todas las salidas pedidas ('mp4,mp3,480p') desde una sola descarga y en una
+        sola invocación de FFmpeg. Devuelve {salida: ruta} (la primera es la principal) o None.
+        """
+        input_path = Path(input_path)
+        targets = plan_outputs(input_path, convert_format)
+        pending = {name: path for name, path in targets.items() if path != input_path}
+        primary = str(next(iter(targets.values())))
+        if progress_callback: progress_callback({'status': 'converting', 'filename': primary})
+
+        try:
+            if cancel_event and cancel_event.is_set(): raise FFmpegCancelled()
+
+            if pending:
+                stream = build_outputs(input_path, pending, info.get('height'))
+                with time_phase('outputs'):
+                    run_ffmpeg(
+                        stream, info.get('duration') or probe_duration(input_path), progress_callback, cancel_event,
+                        output_files=[str(path) for path in pending.values()], filename=primary
+                    )
+            # La descarga se conserva solo si es una de las salidas ('none', o 'mp4' si ya lo era)
+            if input_path not in targets.values():
+                os.remove(input_path)
+            return {name: str(path) for name, path in targets.items()}
+        except FFmpegCancelled:
+            self.logger.info("La conversión fue cancelada por el usuario.")
+            if progress_callback: progress_callback({'status': 'cancelled'})
+            return None
+        except Exception as e:
+            self.logger.error(f"Error de FFmpeg: {e}")
+            if progress_callback: progress_callback({'status': 'error', 'error_message': 'Fallo al generar las salidas'})
+            return None
+
     # ... (El resto de métodos: get_video_info, set_output_path, etc., se mantienen igual) ...
+    def _extract_info(self, url):
+        """
+        Extrae (sin procesar ni descargar) la información de un video, pasando por la caché.
+        Devuelve None para playlists y resultados que no se pueden cachear.
+        """
+        if self.info_cache:
+            info = self.info_cache.get(url)
+            if info:
+                return info
+
+        self.rate_limiter.acquire_request(url)
+        with time_phase('extract', urlparse(url).netloc), self.sessions.session('info', self._INFO_OPTS) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            if not info or info.get('_type', 'video') != 'video' or info.get('is_live'):
+                return None
+            ydl.post_extract(info)
+        # Fragmentos generados por funciones (directos) no sobreviven a JSON
+        if any(callable(f.get('fragments')) for f in info.get('formats') or []):
+            return None
+
+        info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+        if self.info_cache:
+            try:
+                self.info_cache.put(url, info)
+            except Exception as e:
+                self.logger.warning(f"No se pudo guardar en caché la información de {url}: {e}")
+        return info
+
     def get_video_info(self, url):
         try:
-            opts = {'quiet': True, 'no_warnings': True, 'extract_flat': False}
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info:
-                    return {'title': clean_filename(info.get('title', 'Unknown')), 'duration': info.get('duration', 0), 'uploader': info.get('uploader', 'Unknown'), 'thumbnail': info.get('thumbnail')}
+            info = self._extract_info(url)
+            if not info:
+                with self.sessions.session('info', self._INFO_OPTS) as ydl:
+                    info = ydl.extract_info(url, download=False)
+            if info:
+                return {'title': clean_filename(info.get('title', 'Unknown')), 'duration': info.get('duration', 0), 'uploader': info.get('uploader', 'Unknown'), 'thumbnail': info.get('thumbnail') or (info.get('thumbnails') or [{}])[-1].get('url')}
         except Exception as e:
             self.logger.error(f"Error obteniendo información del video: {e}")
             return None
 
+    @property
+    def journal(self):
+        """Diario de trabajos de la carpeta de descarga (se abre la primera vez que se usa)."""
+        if self._journal is None and Config.USE_JOB_JOURNAL:
+            self._journal = JobJournal(self.output_path / Config.JOURNAL_FILENAME)
+        return self._journal
+
+    def _open_archive(self):
+        if not Config.USE_DOWNLOAD_ARCHIVE:
+            return None
+        return DownloadArchive(self.output_path / Config.ARCHIVE_FILENAME)
+
     def set_output_path(self, path):
         self.output_path = Path(path).expanduser().resolve()
         self.output_path.mkdir(parents=True, exist_ok=True)
+        self.sessions.clear()  # Las sesiones viejas apuntan a la ruta anterior
+        if self._process_pool:
+            self._process_pool.close()  # los procesos también
+            self._process_pool = None
+        self.archive = self._open_archive()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
         self.logger.info(f"Ruta de descarga actualizada a: {self.output_path}")
-
-    def _check_available_space(self, min_space_gb=1):
-        try:
-            available = check_disk_space(self.output_path)
-            if available < (min_space_gb * 1024**3):
-                self.logger.error(f"Espacio insuficiente en disco. Disponible: {format_bytes(available)}")
-                return False
-            self.logger.info(f"Espacio disponible: {format_bytes(available)}")
-            return True
-        except Exception as e:
-            self.logger.warning(f"No se pudo verificar el espacio en disco: {e}")
-            return True
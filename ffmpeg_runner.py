@@ -0,0 +1,132 @@
+# ffmpeg_runner.py
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+
+import ffmpeg
+
+
+class FFmpegCancelled(Exception):
+    """FFmpeg se detuvo porque se activó el evento de cancelación."""
+    def __init__(self, message="Conversión cancelada por el usuario."):
+        super().__init__(message)
+
+
+class FFmpegError(Exception):
+    """FFmpeg terminó con error. El mensaje incluye el final de su stderr."""
+
+
+def probe_duration(path):
+    """Duración en segundos de un archivo multimedia (None si no se puede obtener)."""
+    try:
+        return float(ffmpeg.probe(str(path))['format']['duration'])
+    except Exception as e:
+        logging.debug(f"No se pudo obtener la duración de {path}: {e}")
+        return None
+
+
+def _parse_speed(value):
+    # FFmpeg informa la velocidad como '1.53x' o 'N/A'
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def run_ffmpeg(stream, duration=None, progress_callback=None, cancel_event=None,
+               output_files=(), filename='', poll_interval=0.25, cmd='ffmpeg', on_start=None, pass_fds=()):
+    """
+    Ejecuta un grafo de ffmpeg-python como subproceso gestionado.
+
+    Lee la salida de '-progress pipe:1' y emite eventos 'converting' con el porcentaje
+    (si se conoce la duración) y la velocidad relativa a tiempo real. Si se activa
+    'cancel_event' mata el proceso al instante y borra 'output_files'.
+
+    Con 'on_start' la entrada estándar queda como tubería: on_start(process) se llama
+    al arrancar para que quien llama alimente 'pipe:0' (y los 'pass_fds' heredados).
+    """
+    args = stream.compile(cmd=cmd, overwrite_output=True)
+    args = [args[0], '-hide_banner', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1'] + args[1:]
+
+    stdin = subprocess.PIPE if on_start else subprocess.DEVNULL
+    process = subprocess.Popen(args, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, pass_fds=pass_fds)
+    state = {'out_time': 0.0, 'speed': None, 'changed': False}
+    stderr_tail = deque(maxlen=20)
+
+    def read_progress():
+        for raw in process.stdout:
+            key, _, value = raw.decode('utf-8', 'replace').strip().partition('=')
+            if key == 'out_time_us' and value.isdigit():
+                state['out_time'] = int(value) / 1_000_000
+            elif key == 'speed':
+                state['speed'] = _parse_speed(value)
+            elif key == 'progress':
+                state['changed'] = True
+
+    def read_stderr():
+        for raw in process.stderr:
+            stderr_tail.append(raw.decode('utf-8', 'replace').rstrip())
+
+    readers = [threading.Thread(target=read_progress, daemon=True), threading.Thread(target=read_stderr, daemon=True)]
+    for reader in readers:
+        reader.start()
+
+    try:
+        if on_start:
+            on_start(process)
+        while process.poll() is None:
+            if cancel_event and cancel_event.is_set():
+                _kill(process)
+                _remove(output_files)
+                raise FFmpegCancelled()
+            if state['changed'] and progress_callback:
+                state['changed'] = False
+                progress_callback(_progress_event(state, duration, filename))
+            time.sleep(poll_interval)
+    except BaseException:
+        # Incluye KeyboardInterrupt: nunca dejar un FFmpeg huérfano
+        _kill(process)
+        raise
+    finally:
+        for reader in readers:
+            reader.join(timeout=1)
+
+    if process.returncode != 0:
+        _remove(output_files)
+        detail = ' | '.join(stderr_tail) or f"código de salida {process.returncode}"
+        raise FFmpegError(f"FFmpeg falló: {detail}")
+
+    if progress_callback:
+        state['out_time'] = duration or state['out_time']
+        progress_callback(_progress_event(state, duration, filename))
+
+
+def _progress_event(state, duration, filename):
+    event = {'status': 'converting', 'filename': filename, 'speed_factor': state['speed']}
+    if duration:
+        event['percentage'] = min(100.0, state['out_time'] / duration * 100)
+    return event
+
+
+def _kill(process):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"No se pudo borrar el archivo parcial {path}: {e}")
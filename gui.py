@@ -1,10 +1,10 @@
 # gui.py
 import customtkinter as ctk
-import threading
 from tkinter import StringVar, filedialog
 from pathlib import Path
 
-from downloader import AnimeDownloader
+from config import Config
+from progress import ProgressAggregator
 from utils import format_bytes, setup_logging
 import config_manager
 
@@ -20,9 +20,21 @@ class AnimeDownloaderGUI(ctk.CTk):
         self.font_bold = (config_manager.get_font_family(), 16, "bold")
         self.grid_columnconfigure(0, weight=1)
 
-        self.downloader = AnimeDownloader()
-        self.download_path_var = StringVar(value=self.downloader.output_path)
-        self.cancel_event = threading.Event()
+        self.progress = ProgressAggregator()
+        # Si hay un servicio corriendo (main.py --daemon) la GUI le delega las descargas
+        # y comparte su cola; si no, descarga en este proceso
+        self.remote = self._connect_daemon()
+        if self.remote:
+            from client import RemoteScheduler
+            self.downloader = None
+            self.download_path_var = StringVar(value=self.remote.health()['output_path'])
+            self.scheduler = RemoteScheduler(self.remote, aggregator=self.progress)
+        else:
+            from downloader import AnimeDownloader
+            self.downloader = AnimeDownloader()
+            self.download_path_var = StringVar(value=self.downloader.output_path)
+            self.scheduler = self._new_scheduler()
+        self.current_job = None
 
         # --- Widgets ---
         self.title_label = ctk.CTkLabel(self, text="Descargador y Convertidor de Videos", font=self.font_bold)
@@ -42,6 +54,10 @@ class AnimeDownloaderGUI(ctk.CTk):
         self.path_entry.grid(row=0, column=1, padx=(0, 10), pady=5, sticky="ew")
         self.browse_button = ctk.CTkButton(self.path_frame, text="Examinar", command=self.browse_path, font=("Arial", 12), width=100)
         self.browse_button.grid(row=0, column=2, padx=(0, 10), pady=5)
+        if self.remote:
+            # El destino lo fija el servicio
+            self.path_entry.configure(state="disabled")
+            self.browse_button.configure(state="disabled")
 
 
         # Opciones de conversión...
@@ -75,13 +91,15 @@ class AnimeDownloaderGUI(ctk.CTk):
         self.status_label = ctk.CTkLabel(self, text="Bienvenido. Elige una opción y pega una URL.", font=self.font_main, wraplength=650)
         self.status_label.grid(row=6, column=0, padx=20, pady=(0, 20))
 
+        # El progreso de descarga se dibuja a ritmo fijo desde las instantáneas del agregador
+        self.after(int(self.progress.interval * 1000), self._poll_progress)
+
     def start_download(self):
         url = self.url_var.get()
         if not url:
             self.status_label.configure(text="Error: Por favor, ingresa una URL.")
             return
 
-        self.cancel_event.clear()
         self.download_button.configure(state="disabled")
         self.cancel_button.configure(state="normal")
         self.progress_bar.set(0)
@@ -89,18 +107,40 @@ class AnimeDownloaderGUI(ctk.CTk):
         
         convert_to = self.conversion_var.get()
         
-        download_thread = threading.Thread(
-            target=self.downloader.download_episode_safe,
-            args=(url, self.update_progress, convert_to, self.cancel_event),
-            daemon=True  # <-- CAMBIO 1: Hacemos el hilo un "daemon"
-        )
-        download_thread.start()
+        # El trabajo queda anotado en el diario: si se cierra la ventana a mitad,
+        # 'python main.py --resume' lo retoma donde quedó el .part
+        self.progress.prune()
+        self.current_job = self.scheduler.submit(url, convert_to, self.update_progress)
 
     def cancel_and_exit(self):
         """Activa el evento de cancelación y cierra la aplicación."""
-        # <-- CAMBIO 2: La función ahora simplemente destruye la ventana
-        self.cancel_event.set() # Avisa al hilo (buena práctica)
-        self.destroy()        # Cierra la ventana y, como el hilo es daemon, todo termina.
+        if self.current_job:
+            self.current_job.cancel() # Avisa al worker (buena práctica)
+        self.destroy()        # Cierra la ventana y, como los workers son daemon, todo termina.
+
+    def _connect_daemon(self):
+        if not Config.GUI_USE_DAEMON:
+            return None
+        from client import DaemonError, RemoteDownloader
+        client = RemoteDownloader()
+        try:
+            return client if client.is_available() and client.health() else None
+        except DaemonError:
+            return None
+
+    def _new_scheduler(self):
+        from scheduler import DownloadScheduler
+        # Un solo worker y sin etapa aparte de conversión: la GUI descarga de a una
+        return DownloadScheduler(self.downloader.executor, max_workers=1, postprocess_workers=0,
+                                 journal=self.downloader.journal, aggregator=self.progress)
+
+    def _poll_progress(self):
+        job = self.current_job
+        if job and not job.done:
+            for data in self.progress.snapshot()['jobs']:
+                if data['job_id'] == job.id and data['status'] == 'downloading':
+                    self._update_gui_callback(data)
+        self.after(int(self.progress.interval * 1000), self._poll_progress)
 
     def _update_gui_callback(self, data):
         status = data.get('status')
@@ -111,12 +151,34 @@ class AnimeDownloaderGUI(ctk.CTk):
             downloaded_str = format_bytes(data.get('downloaded_bytes', 0))
             total_str = format_bytes(data.get('total_bytes', 0))
             speed_str = f"{format_bytes(data.get('speed', 0))}/s"
-            self.status_label.configure(text=f"{percentage:.1f}% de {total_str}  •  {speed_str}")
+            eta = data.get('eta')
+            eta_str = f"  •  quedan {int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else ""
+            self.status_label.configure(text=f"{percentage:.1f}% de {total_str}  •  {speed_str}{eta_str}")
 
         elif status == 'converting':
-            self.status_label.configure(text=f"Convirtiendo...")
-            self.progress_bar.configure(mode='indeterminate')
-            self.progress_bar.start()
+            percentage = data.get('percentage')
+            if percentage is None:
+                # Sin duración conocida no hay porcentaje: barra indeterminada
+                if self.progress_bar.cget('mode') != 'indeterminate':
+                    self.progress_bar.configure(mode='indeterminate')
+                    self.progress_bar.start()
+                self.status_label.configure(text="Convirtiendo...")
+            else:
+                if self.progress_bar.cget('mode') != 'determinate':
+                    self.progress_bar.stop()
+                    self.progress_bar.configure(mode='determinate')
+                self.progress_bar.set(percentage / 100)
+                speed = data.get('speed_factor')
+                speed_str = f"  •  {speed:.1f}x" if speed else ""
+                self.status_label.configure(text=f"Convirtiendo... {percentage:.1f}%{speed_str}")
+
+        elif status == 'retrying':
+            # El trabajo sigue vivo: los botones quedan como están hasta el estado final
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate')
+            self.status_label.configure(
+                text=f"Reintento {data.get('attempt')} en {data.get('delay', 0):.0f} s: {data.get('error_message', 'Desconocido')}"
+            )
 
         elif status == 'finished' or status == 'error' or status == 'cancelled':
             self.progress_bar.stop()
@@ -140,8 +202,14 @@ class AnimeDownloaderGUI(ctk.CTk):
         if selected_path:
             self.download_path_var.set(selected_path)
             self.downloader.set_output_path(selected_path)
+            # El diario es por carpeta: el planificador nuevo usa el de la ruta elegida
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = self._new_scheduler()
 
     def update_progress(self, data):
+        # Los ticks de descarga los pinta _poll_progress; aquí solo pasan los cambios de estado
+        if data.get('status') == 'downloading':
+            return
         self.after(0, self._update_gui_callback, data)
 
     def run(self):
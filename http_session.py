@@ -0,0 +1,107 @@
+# http_session.py
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+
+class HTTPSessionPool:
+    """
+    Una requests.Session por host, con keep-alive y un máximo de conexiones
+    simultáneas por host (las peticiones de más esperan una conexión libre).
+    Se usa igual que una Session: pool.get(url, ...), pool.request('HEAD', url, ...).
+    Reutilizar la sesión evita un handshake TLS por cada página o rango.
+
+    fetch(url) además recuerda el ETag/Last-Modified de las últimas respuestas y
+    revalida con If-None-Match / If-Modified-Since: un 304 reutiliza el cuerpo guardado.
+    """
+    def __init__(self, max_connections_per_host=None, headers=None, conditional_items=None):
+        self.max_connections_per_host = max_connections_per_host or Config.HTTP_MAX_CONNECTIONS_PER_HOST
+        self.headers = dict(headers or {'User-Agent': Config.HTTP_USER_AGENT})
+        self.conditional_items = Config.HTTP_CONDITIONAL_CACHE_ITEMS if conditional_items is None else conditional_items
+        self.logger = logging.getLogger(__name__)
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._validated = OrderedDict()  # url -> {'content', 'etag', 'last_modified'}
+
+    def session_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = self._make_session()
+            return session
+
+    def _make_session(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections_per_host, pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.session_for(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def fetch(self, url, headers=None, timeout=30):
+        """
+        Cuerpo (bytes) de un GET a 'url'. Si una respuesta anterior traía ETag o
+        Last-Modified, la petición es condicional y un 304 devuelve el cuerpo guardado.
+        Los errores HTTP se lanzan como requests.HTTPError.
+        """
+        with self._lock:
+            cached = self._validated.get(url)
+            if cached:
+                self._validated.move_to_end(url)
+        request_headers = dict(headers or {})
+        if cached and cached['etag']:
+            request_headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            request_headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.get(url, headers=request_headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            self.logger.debug(f"Sin cambios (304): {url}")
+            return cached['content']
+        response.raise_for_status()
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        with self._lock:
+            if (etag or last_modified) and self.conditional_items:
+                self._validated[url] = {'content': response.content, 'etag': etag, 'last_modified': last_modified}
+                self._validated.move_to_end(url)
+                while len(self._validated) > self.conditional_items:
+                    self._validated.popitem(last=False)
+            else:
+                self._validated.pop(url, None)
+        return response.content
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+            self._validated.clear()
+        for session in sessions:
+            session.close()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_http_pool():
+    """Sesiones HTTP compartidas por todo el proceso (descarga segmentada, streaming y páginas con fetch)."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = HTTPSessionPool()
+        return _default_pool
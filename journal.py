@@ -0,0 +1,152 @@
+# journal.py
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: ahí os.replace falla mientras otro proceso tenga el diario abierto
+
+# Estados de un trabajo en el diario. 'done' y 'failed' son finales; un trabajo
+# cancelado conserva su último estado para poder reanudarlo.
+STATES = ('queued', 'extracting', 'downloading', 'postprocessing', 'done', 'failed')
+FINAL_STATES = ('done', 'failed')
+
+
+class JobJournal:
+    """
+    Diario write-ahead de los estados de los trabajos (JSON-lines, solo-agregar).
+    Los cambios de estado se sincronizan a disco (fsync) antes de seguir; el avance
+    de bytes de los archivos .part se anota sin fsync y con un intervalo mínimo.
+    Al abrirlo se compacta y se descartan los trabajos ya terminados, salvo que otro
+    proceso (servicio, worker, otra ejecución en la misma carpeta) lo tenga abierto:
+    cada diario abierto mantiene un lock compartido sobre '<diario>.lock' y la
+    compactación necesita el exclusivo. Si reemplazara el archivo, lo que el otro
+    proceso agregue después iría a parar al archivo viejo, ya borrado.
+    """
+    def __init__(self, path, progress_interval=5.0):
+        self.path = Path(path)
+        self.progress_interval = progress_interval
+        self.logger = logging.getLogger(__name__)
+        self._jobs = {}  # id -> último registro combinado
+        self._last_progress = {}
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_file = self._load_locked()
+        try:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        except OSError:
+            self._lock_file.close()
+            raise
+
+    # --- API pública ---
+
+    def new_job(self, url, convert_format='none'):
+        """Registra un trabajo nuevo en estado 'queued' y devuelve su ID persistente."""
+        job_id = uuid.uuid4().hex
+        self._write({'id': job_id, 'state': 'queued', 'url': url, 'format': convert_format}, sync=True)
+        return job_id
+
+    def update(self, job_id, state, **fields):
+        """Cambio de estado (durable)."""
+        if state not in STATES:
+            raise ValueError(f"Estado de trabajo desconocido: {state}")
+        self._write(dict(fields, id=job_id, state=state), sync=True)
+
+    def progress(self, job_id, part_path, downloaded_bytes):
+        """Anota el avance de un .part (no durable, como mucho cada progress_interval segundos)."""
+        now = time.monotonic()
+        if now - self._last_progress.get(job_id, 0) < self.progress_interval:
+            return
+        self._last_progress[job_id] = now
+        self._write({'id': job_id, 'part': str(part_path), 'bytes': int(downloaded_bytes)}, sync=False)
+
+    def unfinished(self):
+        """Trabajos que no llegaron a 'done' ni 'failed', en orden de alta."""
+        with self._lock:
+            # Sin compactar (diario en uso) puede haber avances sueltos de trabajos ya compactados
+            return [dict(job) for job in self._jobs.values() if job.get('state') not in FINAL_STATES and job.get('url')]
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                self._lock_file.close()  # libera el lock compartido
+
+    # --- Internos ---
+
+    def _write(self, record, sync):
+        record['time'] = round(time.time(), 3)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._apply(record)
+            if record.get('state') in FINAL_STATES:
+                self._last_progress.pop(record['id'], None)
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def _apply(self, record):
+        job = self._jobs.setdefault(record['id'], {})
+        job.update(record)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    continue  # línea truncada por un corte a mitad de escritura
+
+    def _load_locked(self):
+        """Carga (y si nadie más lo usa, compacta) el diario; devuelve el archivo de lock tomado en modo compartido."""
+        lock_file = open(self.path.with_name(self.path.name + '.lock'), 'a')
+        try:
+            if fcntl is None:
+                self._load()
+                self._compact()
+                return lock_file
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Otro proceso escribe en este diario: se lee tal cual, sin reemplazarlo
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                self._load()
+                self.logger.debug(f"Diario en uso por otro proceso, no se compacta: {self.path}")
+                return lock_file
+            self._load()
+            self._compact()
+            # El diario se abre para agregar recién con el lock compartido tomado: si otro
+            # proceso compacta entre medio, se agrega a su archivo y no a uno reemplazado
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            return lock_file
+        except BaseException:
+            lock_file.close()
+            raise
+
+    def _compact(self):
+        """Reescribe el diario solo con los trabajos pendientes (reemplazo atómico)."""
+        pending = [job for job in self._jobs.values() if job.get('state') not in FINAL_STATES and job.get('url')]
+        self._jobs = {job['id']: job for job in pending}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for job in pending:
+                f.write(json.dumps(job, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Windows: otro proceso lo tiene abierto; se compactará en otra apertura
+            os.remove(tmp_path)
+            self.logger.debug(f"No se pudo compactar el diario (en uso): {e}")
+        if pending:
+            self.logger.info(f"Diario de trabajos: {len(pending)} trabajos sin terminar")
@@ -5,19 +5,37 @@ Permite descargar episodios de anime desde múltiples sitios incluyendo JKAnime
 """
 
 import argparse
+import importlib.util
 import sys
 import os
 from pathlib import Path
 
-try:
-    from downloader_extended import ExtendedAnimeDownloader as AnimeDownloader
-    EXTENDED_MODE = True
-except ImportError:
+from config import Config
+from utils import setup_logging, validate_url, clean_filename, parse_bytes
+
+# El modo se detecta sin importar nada: yt-dlp y ffmpeg se cargan recién cuando
+# un comando los necesita (--help, --version y --list-sites arrancan al instante)
+EXTENDED_MODE = importlib.util.find_spec('downloader_extended') is not None
+
+def load_downloader():
+    """Importa la clase de descargador del modo actual (y vuelve al estándar si el extendido no carga)."""
+    global EXTENDED_MODE
+    if EXTENDED_MODE:
+        try:
+            from downloader_extended import ExtendedAnimeDownloader
+            return ExtendedAnimeDownloader
+        except ImportError:
+            EXTENDED_MODE = False
     from downloader import AnimeDownloader
-    EXTENDED_MODE = False
+    return AnimeDownloader
 
-from config import Config
-from utils import setup_logging, validate_url, clean_filename
+def output_format(value):
+    """Tipo de argparse para -f: valida y normaliza la lista de salidas."""
+    from outputs import normalize_format
+    try:
+        return normalize_format(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 def main():
     """Función principal del programa"""
@@ -32,6 +50,24 @@ Ejemplos de uso:
   # JKAnime
   python main.py -u "https://jkanime.net/dandadan-2nd-season/12/" -q 720p
   
+  # Video en MP4, audio en MP3 y una versión en 480p desde una sola descarga
+  python main.py -u "https://www.youtube.com/watch?v=VIDEO_ID" -f mp4,mp3,480p
+  
+  # Lote de URLs (una por línea; '-' lee de stdin)
+  python main.py --batch temporada.txt -j 4 --per-host 2
+  cat urls.txt | python main.py --batch -
+  
+  # Playlist o temporada completa (expansión perezosa)
+  python main.py -u "https://www.youtube.com/playlist?list=ID" --playlist --playlist-start 5 --playlist-end 20
+  
+  # Reanudar los trabajos que quedaron a medias en la carpeta de descarga
+  python main.py --resume -o ~/descargas
+  
+  # Servicio en segundo plano y clientes que le delegan las descargas
+  python main.py --daemon -o ~/descargas -j 4
+  python main.py -u "https://www.youtube.com/watch?v=VIDEO_ID" --remote
+  python main.py --list-jobs
+  
   # Interfaz gráfica
   python main.py --gui
   
@@ -61,6 +97,204 @@ Ejemplos de uso:
         help=f'Directorio de descarga (default: {Config.DOWNLOAD_PATH})'
     )
     
+    parser.add_argument(
+        '-f', '--format',
+        type=output_format,
+        default='none',
+        metavar='FORMATS',
+        help='Salidas separadas por comas: none (el original), mp4, mp3 o una altura como 480p; '
+             'todas salen de una sola descarga (default: none)'
+    )
+    
+    parser.add_argument(
+        '--batch',
+        type=str,
+        metavar='FILE',
+        help="Archivo con una URL por línea para descargar en paralelo ('-' para stdin)"
+    )
+    
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=Config.MAX_CONCURRENT_DOWNLOADS,
+        help=f'Descargas simultáneas en modo lote (default: {Config.MAX_CONCURRENT_DOWNLOADS})'
+    )
+    
+    parser.add_argument(
+        '--per-host',
+        type=int,
+        default=Config.MAX_DOWNLOADS_PER_HOST,
+        help=f'Descargas simultáneas por host en modo lote (default: {Config.MAX_DOWNLOADS_PER_HOST})'
+    )
+    
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=Config.SEGMENTED_CONNECTIONS,
+        metavar='N',
+        help=f'Conexiones por archivo para descargas HTTP progresivas; 1 la desactiva (default: {Config.SEGMENTED_CONNECTIONS})'
+    )
+    
+    parser.add_argument(
+        '--limit-rate',
+        type=str,
+        metavar='RATE',
+        help='Ancho de banda máximo para todas las descargas juntas (ej. 2M, 500K)'
+    )
+    
+    parser.add_argument(
+        '--host-limit-rate',
+        type=str,
+        metavar='RATE',
+        help='Ancho de banda máximo por host (ej. 1M)'
+    )
+    
+    parser.add_argument(
+        '--pp-jobs',
+        type=int,
+        default=Config.MAX_CONCURRENT_POSTPROCESS,
+        help=f'Conversiones FFmpeg simultáneas en lote/playlist; 0 las hace en el mismo worker (default: {Config.MAX_CONCURRENT_POSTPROCESS})'
+    )
+    
+    parser.add_argument(
+        '--processes',
+        action='store_true',
+        default=Config.EXECUTION_BACKEND == 'process',
+        help='Ejecutar cada descarga simultánea en su propio proceso (usa varios núcleos en lotes grandes)'
+    )
+    
+    parser.add_argument(
+        '--playlist',
+        action='store_true',
+        help='Tratar la URL como playlist/serie y descargar sus entradas en paralelo'
+    )
+    
+    parser.add_argument(
+        '--playlist-start',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Primera entrada de la playlist a descargar (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--playlist-end',
+        type=int,
+        metavar='N',
+        help='Última entrada de la playlist a descargar (default: todas)'
+    )
+    
+    parser.add_argument(
+        '--match-title',
+        type=str,
+        metavar='REGEX',
+        help='Solo descargar entradas cuyo título coincida con la expresión'
+    )
+    
+    parser.add_argument(
+        '--reject-title',
+        type=str,
+        metavar='REGEX',
+        help='Saltar entradas cuyo título coincida con la expresión'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Reanudar los trabajos sin terminar del diario de la carpeta de descarga'
+    )
+    
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=Config.METRICS_PORT,
+        metavar='PORT',
+        help='Servir métricas en formato Prometheus en http://127.0.0.1:PORT/metrics'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        type=str,
+        default=Config.METRICS_JSON_FILE,
+        metavar='FILE',
+        help=f'Volcar las métricas a un archivo JSON cada {Config.METRICS_JSON_INTERVAL} s y al salir'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='profiles',
+        default=Config.PROFILE_DIR,
+        metavar='DIR',
+        help='Perfilar CPU y memoria de cada fase (extract, download, post-proceso) y dejar los reportes en DIR (default: profiles)'
+    )
+    
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Correr como servicio: una cola compartida manejada por una API HTTP local'
+    )
+    
+    parser.add_argument(
+        '--daemon-port',
+        type=int,
+        default=Config.DAEMON_PORT,
+        metavar='PORT',
+        help=f'Puerto de la API del servicio (default: {Config.DAEMON_PORT})'
+    )
+    
+    parser.add_argument(
+        '--remote',
+        nargs='?',
+        const=Config.DAEMON_URL,
+        metavar='URL',
+        help=f'Delegar la descarga (o el lote) al servicio (default: {Config.DAEMON_URL})'
+    )
+    
+    parser.add_argument(
+        '--list-jobs',
+        action='store_true',
+        help='Listar los trabajos del servicio'
+    )
+    
+    parser.add_argument(
+        '--cancel-job',
+        type=int,
+        metavar='ID',
+        help='Cancelar un trabajo del servicio'
+    )
+    
+    parser.add_argument(
+        '--queue',
+        default=Config.WORK_QUEUE,
+        metavar='QUEUE',
+        help='Cola de trabajos compartida entre máquinas (ruta .sqlite3 en un volumen compartido)'
+    )
+    
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Atender la cola compartida (--queue) hasta Ctrl+C; con -j trabajos simultáneos'
+    )
+    
+    parser.add_argument(
+        '--enqueue',
+        action='store_true',
+        help='Agregar la URL (-u) o el lote (--batch) a la cola compartida en lugar de descargar'
+    )
+    
+    parser.add_argument(
+        '--queue-status',
+        action='store_true',
+        help='Mostrar el estado de la cola compartida'
+    )
+    
+    parser.add_argument(
+        '--exit-when-empty',
+        action='store_true',
+        help='Con --worker, terminar cuando la cola no tenga trabajos pendientes'
+    )
+    
     parser.add_argument(
         '--gui',
         action='store_true',
@@ -85,6 +319,13 @@ Ejemplos de uso:
         help='Mostrar información detallada'
     )
     
+    parser.add_argument(
+        '--log-json',
+        action='store_true',
+        default=Config.LOG_JSON,
+        help='Escribir el archivo de log en JSON lines (job_id, url, fase, tiempos)'
+    )
+    
     parser.add_argument(
         '--version',
         action='version',
@@ -94,7 +335,19 @@ Ejemplos de uso:
     args = parser.parse_args()
     
     # Configurar logging
-    setup_logging(verbose=args.verbose)
+    setup_logging(verbose=args.verbose, json_format=args.log_json)
+    
+    # Límites de tasa compartidos por todas las descargas del proceso
+    if args.limit_rate or args.host_limit_rate:
+        apply_rate_limits(args)
+    
+    # Métricas por fase (tiempos, bytes, fallos) exportables
+    if args.metrics_port or args.metrics_json:
+        start_metrics(args)
+    
+    # Perfilado opt-in por fase (sin --profile no cuesta nada)
+    if args.profile:
+        start_profiler(args)
     
     # Mostrar modo
     mode_text = "🚀 MODO EXTENDIDO" if EXTENDED_MODE else "📺 MODO ESTÁNDAR"
@@ -105,6 +358,24 @@ Ejemplos de uso:
         list_supported_sites()
         return
     
+    # Servicio en segundo plano con API HTTP local
+    if args.daemon:
+        run_daemon(args)
+        return
+    
+    # Consultas al servicio
+    if args.list_jobs or args.cancel_job is not None:
+        run_daemon_command(args)
+        return
+    
+    # Cola compartida entre máquinas
+    if args.worker:
+        run_worker(args)
+        return
+    if args.enqueue or args.queue_status:
+        run_queue_command(args)
+        return
+    
     # Si se especifica GUI, lanzar interfaz gráfica
     if args.gui:
         try:
@@ -117,6 +388,16 @@ Ejemplos de uso:
             sys.exit(1)
         return
     
+    # Reanudar trabajos interrumpidos
+    if args.resume:
+        run_resume(args)
+        return
+    
+    # Modo lote: alimenta el planificador con muchas URLs
+    if args.batch:
+        run_batch(args)
+        return
+    
     # Validar argumentos requeridos para CLI
     if not args.url:
         print("Error: Se requiere una URL para descargar.")
@@ -128,6 +409,16 @@ Ejemplos de uso:
         print(f"Error: URL inválida: {args.url}")
         sys.exit(1)
     
+    # Modo playlist: expansión perezosa hacia el planificador
+    if args.playlist:
+        run_playlist(args)
+        return
+    
+    # La descarga la hace el servicio; aquí solo se sigue su progreso
+    if args.remote and not args.info:
+        run_remote(args)
+        return
+    
     # Crear directorio de descarga si no existe
     output_path = Path(args.output).expanduser().resolve()
     output_path.mkdir(parents=True, exist_ok=True)
@@ -138,6 +429,7 @@ Ejemplos de uso:
     print("-" * 50)
     
     # Inicializar downloader con parámetros correctos según el tipo
+    AnimeDownloader = load_downloader()
     if EXTENDED_MODE:
         # ExtendedAnimeDownloader solo acepta estos parámetros
         downloader = AnimeDownloader(
@@ -146,13 +438,7 @@ Ejemplos de uso:
             max_retries=Config.MAX_RETRIES
         )
     else:
-        # AnimeDownloader estándar acepta concurrent_downloads
-        downloader = AnimeDownloader(
-            output_path=str(output_path),
-            quality=args.quality,
-            max_retries=Config.MAX_RETRIES,
-            concurrent_downloads=1
-        )
+        downloader = _build_downloader(args, output_path)
     
     # Verificar qué tipo de sitio es (solo en modo extendido)
     if EXTENDED_MODE and hasattr(downloader, 'can_handle_url'):
@@ -188,7 +474,12 @@ Ejemplos de uso:
         
         # Realizar descarga
         print("🚀 Iniciando descarga...")
-        success = downloader.download_episode(args.url)
+        if EXTENDED_MODE:
+            success = downloader.download_episode(args.url)
+        else:
+            # Un trabajo del planificador: reintentos con espera, corte por host y diario para --resume
+            jobs = downloader.download_batch([args.url], progress_callback=report_job_event, convert_format=args.format)
+            success = jobs[0].status == 'finished'
         
         if success:
             print("✅ Descarga completada exitosamente!")
@@ -207,42 +498,369 @@ Ejemplos de uso:
             traceback.print_exc()
         sys.exit(1)
 
+def apply_rate_limits(args):
+    """Aplica --limit-rate / --host-limit-rate al limitador compartido."""
+    from ratelimit import get_rate_limiter
+    
+    limits = {}
+    for option, key in (('limit_rate', 'global_bytes'), ('host_limit_rate', 'host_bytes')):
+        value = getattr(args, option)
+        if value:
+            rate = parse_bytes(value)
+            if not rate:
+                print(f"Error: Límite de tasa inválido: {value}")
+                sys.exit(1)
+            limits[key] = rate
+    get_rate_limiter().set_limits(**limits)
+
+def start_metrics(args):
+    """Arranca el endpoint /metrics y/o el volcado periódico a JSON."""
+    from metrics import start_json_dump, start_metrics_server
+    
+    if args.metrics_port:
+        try:
+            start_metrics_server(args.metrics_port)
+        except OSError as e:
+            print(f"Error: No se pudo abrir el puerto de métricas {args.metrics_port}: {e}")
+            sys.exit(1)
+        print(f"📊 Métricas en http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.metrics_json:
+        start_json_dump(args.metrics_json, Config.METRICS_JSON_INTERVAL)
+
+def start_profiler(args):
+    """Activa el perfilado por fase; los procesos de descarga y la GUI lo heredan por Config."""
+    import profiling
+    
+    Config.PROFILE_DIR = args.profile
+    profiling.start(args.profile)
+    print(f"🔬 Perfilado por fase en {Path(args.profile).expanduser().resolve()} (reportes al terminar)")
+
+def _build_downloader(args, output_path):
+    """Downloader estándar con las opciones de concurrencia de la línea de comandos."""
+    from downloader import AnimeDownloader
+    
+    return AnimeDownloader(
+        output_path=str(output_path),
+        quality=args.quality,
+        max_retries=Config.MAX_RETRIES,
+        concurrent_downloads=args.jobs,
+        per_host_limit=args.per_host,
+        postprocess_workers=args.pp_jobs,
+        segmented_connections=args.connections,
+        backend='process' if args.processes else 'thread'
+    )
+
+def report_job_event(data):
+    """Muestra los eventos relevantes de un trabajo del planificador (una línea por evento)."""
+    status = data.get('status')
+    if status == 'error':
+        print(f"❌ [{data['job_id']}] {data['url']}: {data.get('error_message', 'Desconocido')}")
+    elif status == 'retrying':
+        print(f"🔁 [{data['job_id']}] {data['url']}: reintento {data['attempt']} en {data['delay']:.0f} s")
+    elif status == 'cancelled':
+        print(f"🛑 [{data['job_id']}] {data['url']}: cancelada")
+    elif status == 'finished' and data.get('filename'):
+        print(f"✅ [{data['job_id']}] {Path(data['filename']).name}")
+
+def read_batch_urls(source):
+    """Lee URLs de un archivo (o de stdin si es '-'), ignorando vacías y comentarios."""
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    try:
+        urls = []
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not validate_url(line):
+                print(f"⚠️  URL inválida ignorada: {line}")
+                continue
+            urls.append(line)
+        return urls
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_batch(args):
+    """Descarga en paralelo todas las URLs del lote y resume el resultado."""
+    try:
+        urls = read_batch_urls(args.batch)
+    except OSError as e:
+        print(f"Error: No se pudo leer el lote: {e}")
+        sys.exit(1)
+    
+    if not urls:
+        print("Error: El lote no contiene URLs válidas.")
+        sys.exit(1)
+    
+    if args.remote:
+        # El servicio decide destino, calidad y concurrencia
+        downloader = connect_daemon(args.remote)
+        print(f"📦 Lote: {len(urls)} URLs")
+        print(f"🛰️  Servicio: {downloader.base_url}")
+        print(f"📂 Destino: {downloader.health()['output_path']}")
+        print("-" * 50)
+    else:
+        output_path = Path(args.output).expanduser().resolve()
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        print(f"📦 Lote: {len(urls)} URLs")
+        print(f"🎥 Calidad: {args.quality}")
+        print(f"📂 Destino: {output_path}")
+        print(f"⚙️  Simultáneas: {args.jobs} (máx. {args.per_host} por host){' en procesos' if args.processes else ''}")
+        print("-" * 50)
+        
+        downloader = _build_downloader(args, output_path)
+    
+    try:
+        jobs = downloader.download_batch(urls, progress_callback=report_job_event, convert_format=args.format)
+    except KeyboardInterrupt:
+        print("\n🛑 Lote cancelado por el usuario.")
+        sys.exit(0)
+    
+    ok = sum(1 for job in jobs if job.status == 'finished')
+    print("-" * 50)
+    print(f"✅ {ok}/{len(jobs)} descargas completadas")
+    if ok < len(jobs):
+        sys.exit(1)
+
+def run_resume(args):
+    """Reanuda los trabajos sin terminar del diario de la carpeta de descarga."""
+    output_path = Path(args.output).expanduser().resolve()
+    downloader = _build_downloader(args, output_path)
+    
+    print(f"♻️  Reanudando trabajos en: {output_path}")
+    print("-" * 50)
+    try:
+        jobs = downloader.resume_jobs(progress_callback=report_job_event)
+    except KeyboardInterrupt:
+        print("\n🛑 Reanudación cancelada por el usuario.")
+        sys.exit(0)
+    
+    if not jobs:
+        print("No hay trabajos pendientes.")
+        return
+    ok = sum(1 for job in jobs if job.status == 'finished')
+    print("-" * 50)
+    print(f"✅ {ok}/{len(jobs)} descargas completadas")
+    if ok < len(jobs):
+        sys.exit(1)
+
+def run_playlist(args):
+    """Descarga las entradas de una playlist/serie a medida que se van expandiendo."""
+    from playlist import PlaylistFilter
+    
+    output_path = Path(args.output).expanduser().resolve()
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    print(f"📜 Playlist: {args.url}")
+    print(f"🔢 Entradas: {args.playlist_start} - {args.playlist_end or 'fin'}")
+    print(f"📂 Destino: {output_path}")
+    print(f"⚙️  Simultáneas: {args.jobs} (máx. {args.per_host} por host)")
+    print("-" * 50)
+    
+    downloader = _build_downloader(args, output_path)
+    entry_filter = PlaylistFilter(match_title=args.match_title, reject_title=args.reject_title)
+    
+    try:
+        summary = downloader.download_playlist(
+            args.url, progress_callback=report_job_event, convert_format=args.format,
+            start=args.playlist_start, end=args.playlist_end, entry_filter=entry_filter
+        )
+    except KeyboardInterrupt:
+        print("\n🛑 Playlist cancelada por el usuario.")
+        sys.exit(0)
+    
+    total = sum(summary.values())
+    done = summary.get('finished', 0) + summary.get('archived', 0)
+    print("-" * 50)
+    print(f"✅ {done}/{total} descargas completadas ({summary.get('archived', 0)} ya estaban descargadas)")
+    if done < total:
+        sys.exit(1)
+
+def connect_daemon(url):
+    """Cliente del servicio; termina con error si no está corriendo."""
+    from client import RemoteDownloader
+    
+    client = RemoteDownloader(url)
+    if not client.is_available():
+        print(f"Error: No hay un servicio escuchando en {client.base_url} (inícialo con --daemon)")
+        sys.exit(1)
+    return client
+
+def run_daemon(args):
+    """Corre el servicio hasta Ctrl+C o POST /shutdown."""
+    from daemon import DownloadDaemon
+    
+    output_path = Path(args.output).expanduser().resolve()
+    downloader = _build_downloader(args, output_path)
+    try:
+        daemon = DownloadDaemon(downloader, port=args.daemon_port)
+    except OSError as e:
+        print(f"Error: No se pudo abrir el puerto {args.daemon_port}: {e}")
+        sys.exit(1)
+    
+    print(f"🛰️  Servicio en {daemon.url}")
+    print(f"📂 Destino: {output_path}")
+    print(f"⚙️  Simultáneas: {args.jobs} (máx. {args.per_host} por host)")
+    print("-" * 50)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo el servicio (los trabajos a medias se retoman con --resume)...")
+        daemon.stop()
+
+def run_daemon_command(args):
+    """--list-jobs / --cancel-job contra el servicio."""
+    from client import DaemonError
+    
+    client = connect_daemon(args.remote or Config.DAEMON_URL)
+    icons = {'queued': '⏳', 'running': '⬇️ ', 'postprocessing': '⚙️ ', 'finished': '✅', 'error': '❌', 'cancelled': '🛑'}
+    try:
+        if args.cancel_job is not None:
+            job = client.cancel(args.cancel_job)
+            print(f"🛑 Cancelación pedida para [{job['job_id']}] {job['url']}")
+            return
+        jobs = client.jobs()
+    except DaemonError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    if not jobs:
+        print("No hay trabajos en el servicio.")
+        return
+    for job in jobs:
+        detail = job.get('error_message') or (Path(job['filename']).name if job.get('filename') else job['url'])
+        progress = job.get('progress') or {}
+        percentage = f" {progress['percentage']:.1f}%" if progress.get('percentage') is not None and job['status'] == 'running' else ''
+        print(f"{icons.get(job['status'], '•')} [{job['job_id']}] {job['status']}{percentage}: {detail}")
+
+def open_queue(args):
+    """Abre la cola de --queue o termina con un mensaje claro."""
+    import sqlite3
+    from workqueue import open_work_queue
+    
+    try:
+        return open_work_queue(args.queue)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"Error: No se pudo abrir la cola de trabajos: {e}")
+        sys.exit(1)
+
+def run_worker(args):
+    """Reclama y descarga trabajos de la cola compartida hasta Ctrl+C (o hasta vaciarla)."""
+    import signal
+    from workqueue import QueueWorker
+    
+    work_queue = open_queue(args)
+    output_path = Path(args.output).expanduser().resolve()
+    downloader = _build_downloader(args, output_path)
+    
+    worker = QueueWorker(work_queue, downloader, progress_callback=report_job_event)
+    # SIGTERM (systemd, contenedores) para igual que Ctrl+C: lo pendiente vuelve a la cola
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    
+    print(f"🧰 Worker {worker.worker_id}")
+    print(f"🗃️  Cola: {work_queue.path}")
+    print(f"📂 Destino: {output_path}")
+    print(f"⚙️  Simultáneas: {args.jobs} (máx. {args.per_host} por host)")
+    print("-" * 50)
+    try:
+        summary = worker.run(exit_when_empty=args.exit_when_empty)
+    except KeyboardInterrupt:
+        print("\n🛑 Worker detenido (los trabajos a medias vuelven a la cola).")
+        sys.exit(0)
+    
+    print("-" * 50)
+    print(f"✅ {summary.get('finished', 0)} completadas, ❌ {summary.get('error', 0)} fallidas, 🔁 {summary.get('retrying', 0)} devueltas a la cola")
+
+def run_queue_command(args):
+    """--enqueue / --queue-status contra la cola compartida."""
+    work_queue = open_queue(args)
+    if args.enqueue:
+        if args.batch:
+            try:
+                urls = read_batch_urls(args.batch)
+            except OSError as e:
+                print(f"Error: No se pudo leer el lote: {e}")
+                sys.exit(1)
+        elif args.url and validate_url(args.url):
+            urls = [args.url]
+        else:
+            print("Error: --enqueue necesita una URL válida (-u) o un lote (--batch).")
+            sys.exit(1)
+        ids = work_queue.enqueue(urls, args.format)
+        print(f"📥 {len(ids)} trabajos agregados a {work_queue.path}")
+        return
+    
+    icons = {'queued': '⏳', 'leased': '⬇️ ', 'done': '✅', 'failed': '❌'}
+    counts = work_queue.counts()
+    print(f"🗃️  Cola: {work_queue.path}")
+    print("  ".join(f"{icons[state]} {state}: {counts.get(state, 0)}" for state in icons))
+    for job in work_queue.jobs(state='failed', limit=10):
+        print(f"❌ [{job['id']}] {job['url']} ({job['attempts']} intentos): {job['error']}")
+
+def run_remote(args):
+    """Encola la URL en el servicio y muestra su progreso hasta que termina."""
+    downloader = connect_daemon(args.remote)
+    
+    print(f"📥 URL: {args.url}")
+    print(f"🛰️  Servicio: {downloader.base_url}")
+    print(f"📂 Destino: {downloader.health()['output_path']}")
+    print("-" * 50)
+    
+    def report(data):
+        status = data.get('status')
+        if status == 'downloading' and data.get('percentage') is not None:
+            print(f"\r⬇️  {data['percentage']:.1f}%", end='', flush=True)
+        elif status == 'converting':
+            print("\r⚙️  Convirtiendo...   ", end='', flush=True)
+        elif status == 'error':
+            print(f"\n❌ {data.get('error_message', 'Desconocido')}")
+    
+    print("🚀 Iniciando descarga...")
+    try:
+        success = downloader.download_episode_safe(args.url, report, args.format)
+    except KeyboardInterrupt:
+        # Ctrl+C cancela el trabajo en el servicio, no solo el seguimiento
+        print("\n🛑 Descarga cancelada por el usuario.")
+        sys.exit(0)
+    print()
+    if success:
+        print("✅ Descarga completada exitosamente!")
+    else:
+        print("❌ Error en la descarga. Revisa los logs del servicio para más detalles.")
+        sys.exit(1)
+
 def list_supported_sites():
     """Lista todos los sitios web soportados"""
+    from sites import get_site_table
+    
     print("🌐 SITIOS WEB SOPORTADOS:\n")
     
+    try:
+        # Tabla precalculada: en modo extendido se arma una vez y queda en caché
+        table = get_site_table(EXTENDED_MODE)
+    except Exception as e:
+        print(f"❌ Error listando sitios: {e}")
+        return
+    
     if EXTENDED_MODE:
-        try:
-            # Crear downloader con parámetros correctos
-            downloader = AnimeDownloader()
-            supported = downloader.list_supported_sites()
-            
-            print("🎌 SITIOS DE ANIME ESPECÍFICOS:")
-            if supported['custom_extractors']:
-                for site in supported['custom_extractors']:
-                    if site == 'jkanime':
-                        print("  ✅ JKAnime (jkanime.net)")
-                        print("      - Ejemplo: https://jkanime.net/dandadan-2nd-season/12/")
-                    else:
-                        print(f"  ✅ {site}")
-            else:
-                print("  ❌ Ningún extractor personalizado disponible")
-            
-            print("\n📺 SITIOS ESTÁNDAR (via yt-dlp):")
-            for site in supported['standard']:
-                print(f"  ✅ {site}")
-                
-        except Exception as e:
-            print(f"❌ Error listando sitios: {e}")
+        print("🎌 SITIOS DE ANIME ESPECÍFICOS:")
+        if table['custom_extractors']:
+            for site in table['custom_extractors']:
+                if site == 'jkanime':
+                    print("  ✅ JKAnime (jkanime.net)")
+                    print("      - Ejemplo: https://jkanime.net/dandadan-2nd-season/12/")
+                else:
+                    print(f"  ✅ {site}")
+        else:
+            print("  ❌ Ningún extractor personalizado disponible")
+        
+        print("\n📺 SITIOS ESTÁNDAR (via yt-dlp):")
+        for site in table['standard']:
+            print(f"  ✅ {site}")
     else:
         print("📺 SITIOS ESTÁNDAR (via yt-dlp):")
-        standard_sites = [
-            'youtube.com', 'youtu.be', 'vimeo.com',
-            'dailymotion.com', 'twitch.tv', 'facebook.com',
-            'twitter.com', 'instagram.com', 'tiktok.com'
-        ]
-        
-        for site in standard_sites:
+        for site in table['standard']:
             print(f"  ✅ {site}")
         
         print("\n⚠️  Para soporte de sitios de anime específicos:")
@@ -250,17 +868,7 @@ def list_supported_sites():
         print("   - extractors/jkanime.py")
         print("   - downloader_extended.py")
     
-    # Mostrar número de extractores de manera segura
-    if EXTENDED_MODE:
-        try:
-            downloader = AnimeDownloader()
-            num_extractors = len(getattr(downloader, 'custom_extractors', {}))
-            print(f"\n💡 Total de extractores personalizados: {num_extractors}")
-        except:
-            print(f"\n💡 Total de extractores personalizados: 0")
-    else:
-        print(f"\n💡 Total de extractores personalizados: 0")
-    
+    print(f"\n💡 Total de extractores personalizados: {table['custom_count']}")
     print("💡 Para más sitios, revisa: https://github.com/yt-dlp/yt-dlp/blob/master/supportedsites.md")
 
 if __name__ == "__main__":
@@ -0,0 +1,353 @@
+# metrics.py
+import atexit
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import current_log_context, log_context
+
+# Límites (segundos) de los histogramas de duración: de extracciones rápidas a remux de varios GB
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Límites (bytes/s) del histograma de velocidad por trabajo
+THROUGHPUT_BUCKETS = (64e3, 256e3, 1e6, 2.5e6, 5e6, 10e6, 25e6, 50e6, 100e6)
+
+
+def _label_key(label_names, labels):
+    return tuple(str(labels.get(name, '')) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=None):
+    pairs = list(zip(label_names, key)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (f'{name}="{value}"'.replace('\\', '\\\\').replace('\n', '\\n') for name, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+    """Contador monotónico con etiquetas."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+    def to_dict(self):
+        with self._lock:
+            return [dict(zip(self.label_names, key), value=value) for key, value in self._values.items()]
+
+    def take(self):
+        """Valores acumulados desde la última llamada (quedan en cero)."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus (buckets + suma + cuenta)."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # clave -> [cuentas por bucket..., suma, cuenta]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, data in self._values.items():
+                for bound, count in zip(self.buckets, data):
+                    samples.append((f"{self.name}_bucket", key, [('le', repr(float(bound)))], count))
+                samples.append((f"{self.name}_bucket", key, [('le', '+Inf')], data[-1]))
+                samples.append((f"{self.name}_sum", key, None, data[-2]))
+                samples.append((f"{self.name}_count", key, None, data[-1]))
+        return samples
+
+    def to_dict(self):
+        with self._lock:
+            return [
+                dict(zip(self.label_names, key), count=data[-1], sum=data[-2],
+                     buckets=dict(zip(map(str, self.buckets), data[:len(self.buckets)])))
+                for key, data in self._values.items()
+            ]
+
+    def take(self):
+        """Valores acumulados desde la última llamada (quedan en cero)."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, data in values.items():
+                current = self._values.get(key)
+                self._values[key] = list(data) if current is None else [a + b for a, b in zip(current, data)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def _get_or_create(self, cls, name, help_text, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **kwargs)
+            return metric
+
+    def render_prometheus(self):
+        """Texto en el formato de exposición de Prometheus."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.label_names, key, extra)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {'time': time.time(), 'metrics': {m.name: {'type': m.kind, 'samples': m.to_dict()} for m in metrics}}
+
+    def take(self):
+        """
+        Lo acumulado por todas las métricas desde la última llamada, para sumarlo
+        en el registro de otro proceso con merge() (ver workers.py).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.take() for metric in metrics}
+
+    def merge(self, values):
+        for name, metric_values in values.items():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is not None and metric_values:
+                metric.merge(metric_values)
+
+
+REGISTRY = MetricsRegistry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    'anime_downloader_phase_seconds', 'Duración de cada fase de un trabajo', ('phase', 'host'))
+PHASE_FAILURES = REGISTRY.counter(
+    'anime_downloader_failures_total', 'Fallos por fase y motivo', ('phase', 'reason'))
+CANCELLATIONS = REGISTRY.counter(
+    'anime_downloader_cancellations_total', 'Trabajos cancelados por fase', ('phase',))
+RETRIES = REGISTRY.counter(
+    'anime_downloader_retries_total', 'Reintentos por componente', ('component', 'host'))
+BYTES = REGISTRY.counter(
+    'anime_downloader_bytes_total', 'Bytes descargados por host', ('host',))
+JOBS = REGISTRY.counter(
+    'anime_downloader_jobs_total', 'Trabajos terminados por estado', ('status',))
+THROUGHPUT = REGISTRY.histogram(
+    'anime_downloader_throughput_bytes_per_second', 'Velocidad media de cada descarga', ('host',),
+    buckets=THROUGHPUT_BUCKETS)
+
+
+def failure_reason(error):
+    """Motivo corto y de baja cardinalidad para etiquetar un fallo."""
+    text = str(error).lower()
+    if 'cancelada por el usuario' in text:
+        return 'cancelled'
+    if 'http error 429' in text or 'too many requests' in text:
+        return 'http_429'
+    if 'http error 4' in text:
+        return 'http_4xx'
+    if 'http error 5' in text:
+        return 'http_5xx'
+    if 'timed out' in text or 'timeout' in text:
+        return 'timeout'
+    if 'connection' in text or 'network is unreachable' in text:
+        return 'connection'
+    if 'ffmpeg' in text:
+        return 'ffmpeg'
+    if 'espacio' in text or 'no space' in text:
+        return 'disk'
+    return type(error).__name__.lower()
+
+
+class PhaseTimer:
+    """Cronómetro de una fase. 'excluded' descuenta tiempo medido aparte (p.ej. la mezcla de yt-dlp)."""
+    __slots__ = ('phase', 'host', 'start', 'excluded')
+
+    def __init__(self, phase, host=''):
+        self.phase = phase
+        self.host = host
+        self.start = time.perf_counter()
+        self.excluded = 0.0
+
+    @property
+    def elapsed(self):
+        return max(0.0, time.perf_counter() - self.start - self.excluded)
+
+
+@contextmanager
+def time_phase(phase, host=''):
+    """
+    Mide una fase y cuenta sus fallos/cancelaciones si el bloque lanza una excepción.
+    Los logs emitidos dentro llevan el campo 'phase', y si hay un trabajo en el
+    contexto de log su duración queda en sus 'timings'.
+    """
+    timer = PhaseTimer(phase, host)
+    try:
+        # Con --profile la fase corre bajo cProfile/tracemalloc (ver profiling.py); si nadie
+        # importó profiling no puede haber perfilador activo y no se paga ni el import
+        profiling = sys.modules.get('profiling')
+        with log_context(phase=phase), (profiling.phase(phase) if profiling else nullcontext()):
+            yield timer
+    except BaseException as e:
+        reason = failure_reason(e)
+        if reason == 'cancelled':
+            CANCELLATIONS.inc(phase=phase)
+        else:
+            PHASE_FAILURES.inc(phase=phase, reason=reason)
+        raise
+    finally:
+        elapsed = timer.elapsed
+        PHASE_SECONDS.observe(elapsed, phase=phase, host=host)
+        _add_job_timing(phase, elapsed)
+
+
+def _add_job_timing(phase, elapsed):
+    timings = current_log_context().get('timings')
+    if timings is not None:
+        timings[phase] = round(timings.get(phase, 0) + elapsed, 3)
+
+
+class PostprocessorTimer:
+    """
+    Hook de post-procesadores de yt-dlp: mide cada uno (la mezcla de video y audio
+    es 'Merger') como su propia fase y acumula el total para descontarlo de la descarga.
+    """
+    PHASES = {'Merger': 'merge', 'FFmpegMerger': 'merge'}
+
+    def __init__(self, host=''):
+        self.host = host
+        self.total = 0.0
+        self._started = {}
+
+    def __call__(self, data):
+        name = data.get('postprocessor') or ''
+        status = data.get('status')
+        if status == 'started':
+            self._started[name] = time.perf_counter()
+        elif status == 'finished' and name in self._started:
+            elapsed = time.perf_counter() - self._started.pop(name)
+            self.total += elapsed
+            phase = self.PHASES.get(name, name.lower())
+            PHASE_SECONDS.observe(elapsed, phase=phase, host=self.host)
+            _add_job_timing(phase, elapsed)
+
+
+def record_transfer(host, size, seconds):
+    """Bytes y velocidad media de una descarga completa."""
+    if not size:
+        return
+    BYTES.inc(size, host=host)
+    if seconds > 0:
+        THROUGHPUT.observe(size / seconds, host=host)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body, content_type = self.registry.render_prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body, content_type = json.dumps(self.registry.to_dict()).encode('utf-8'), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"metrics: {format % args}")
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Sirve /metrics (Prometheus) y /metrics.json en un hilo aparte. Devuelve el servidor."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logging.info(f"Métricas disponibles en http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def start_json_dump(path, interval=60.0):
+    """
+    Escribe periódicamente las métricas en un archivo JSON (y una última vez al salir).
+    Devuelve un Event para detener el volcado.
+    """
+    stop = threading.Event()
+
+    def dump():
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(REGISTRY.to_dict(), f, indent=2)
+        except OSError as e:
+            logging.warning(f"No se pudieron volcar las métricas a {path}: {e}")
+
+    def loop():
+        while not stop.wait(interval):
+            dump()
+
+    def final_dump():
+        if not stop.is_set():
+            stop.set()
+            dump()
+
+    threading.Thread(target=loop, name='metrics-dump', daemon=True).start()
+    atexit.register(final_dump)
+    return stop
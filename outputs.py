@@ -0,0 +1,108 @@
+# outputs.py
+import re
+from pathlib import Path
+
+from config import Config
+
+# Salidas que acepta un trabajo, solas o combinadas con comas ('mp4,mp3,480p'):
+#   none  -> el archivo descargado tal cual
+#   mp4   -> re-empaquetado a MP4 sin recodificar
+#   mp3   -> solo audio
+#   480p  -> versión de menor resolución (H.264/AAC en MP4)
+SINGLE_FORMATS = ('none', 'mp4', 'mp3')
+_RENDITION = re.compile(r'^(\d{3,4})p$')
+MP3_BITRATE = '192k'
+
+
+def parse_outputs(convert_format):
+    """'mp4,mp3,480p' -> ['mp4', 'mp3', '480p']. Lanza ValueError si alguna salida no existe."""
+    names = []
+    for name in (convert_format or 'none').lower().replace(' ', '').split(','):
+        if not name:
+            continue
+        if name not in SINGLE_FORMATS and not _RENDITION.match(name):
+            raise ValueError(f"Salida desconocida: {name} (válidas: none, mp4, mp3 o una altura como 480p)")
+        if name not in names:
+            names.append(name)
+    return names or ['none']
+
+
+def normalize_format(convert_format):
+    """Forma canónica del formato (la que se guarda en el diario y el archivo)."""
+    return ','.join(parse_outputs(convert_format))
+
+
+def is_multi_output(convert_format):
+    """True si el trabajo pide algo más que uno de los formatos simples de siempre."""
+    outputs = parse_outputs(convert_format)
+    return len(outputs) > 1 or outputs[0] not in SINGLE_FORMATS
+
+
+def download_mode(convert_format):
+    """'mp3' si solo se pide audio (se baja bestaudio); 'video' en cualquier otro caso."""
+    return 'mp3' if parse_outputs(convert_format) == ['mp3'] else 'video'
+
+
+def rendition_height(name):
+    match = _RENDITION.match(name)
+    return int(match.group(1)) if match else None
+
+
+def output_path(source, name):
+    """Ruta de una salida a partir del archivo descargado."""
+    source = Path(source)
+    if name == 'none':
+        return source
+    if name in ('mp4', 'mp3'):
+        return source.with_suffix(f'.{name}')
+    return source.with_name(f"{source.stem}.{name}.mp4")
+
+
+def plan_outputs(source, convert_format):
+    """Salida -> ruta, en el orden pedido (la primera es la principal del trabajo)."""
+    return {name: output_path(source, name) for name in parse_outputs(convert_format)}
+
+
+def build_outputs(source, targets, source_height=None):
+    """
+    Grafo de ffmpeg-python que genera todas las 'targets' (salida -> ruta) en una sola
+    invocación: la entrada se lee y se decodifica una vez y cada salida tiene su propio
+    codificador, que FFmpeg reparte entre los núcleos.
+    """
+    import ffmpeg
+
+    source = ffmpeg.input(str(source))
+    streams = []
+    for name, path in targets.items():
+        if name in ('none', 'mp4'):
+            streams.append(ffmpeg.output(source['v?'], source['a?'], str(path), c='copy'))
+        elif name == 'mp3':
+            streams.append(ffmpeg.output(source['a'], str(path), acodec='libmp3lame', audio_bitrate=MP3_BITRATE))
+        else:
+            height = rendition_height(name)
+            video = source['v']
+            # Nunca se agranda; sin la altura de la fuente lo decide FFmpeg con min(ih, altura)
+            if not source_height:
+                video = video.filter('scale', -2, f'min(ih,{height})')
+            elif source_height > height:
+                video = video.filter('scale', -2, height)
+            streams.append(ffmpeg.output(
+                video, source['a?'], str(path), vcodec='libx264', preset=Config.RENDITION_PRESET,
+                crf=Config.RENDITION_CRF, acodec='aac', audio_bitrate=Config.RENDITION_AUDIO_BITRATE,
+                movflags='+faststart',
+            ))
+    return ffmpeg.merge_outputs(*streams)
+
+
+def estimated_output_size(name, size, info):
+    """Bytes que ocupará una salida generada desde una descarga de 'size' bytes."""
+    info = info or {}
+    if name == 'none' or (name in ('mp4', 'mp3') and info.get('ext') == name):
+        return 0
+    if name == 'mp3':
+        # 192 kbps = 24 KB/s
+        return int(info['duration'] * 24000) if info.get('duration') else size
+    height = rendition_height(name)
+    if height and info.get('height'):
+        return int(size * min(1.0, (height / info['height']) ** 2))
+    return size
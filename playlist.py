@@ -0,0 +1,89 @@
+# playlist.py
+import logging
+import re
+from itertools import islice
+
+from archive import make_archive_key
+
+# Opciones para expandir listas sin resolver cada entrada (extracción plana y perezosa)
+FLAT_PLAYLIST_OPTS = {
+    'quiet': True, 'no_warnings': True, 'socket_timeout': 30,
+    'extract_flat': 'in_playlist', 'lazy_playlist': True, 'ignoreerrors': True,
+}
+
+
+class PlaylistFilter:
+    """Reglas para saltar entradas de una playlist sin tener que extraerlas."""
+    def __init__(self, match_title=None, reject_title=None, min_duration=None, max_duration=None, skip=None):
+        self.match_title = re.compile(match_title, re.IGNORECASE) if match_title else None
+        self.reject_title = re.compile(reject_title, re.IGNORECASE) if reject_title else None
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.skip = skip  # callable(entry) -> True para saltarla
+
+    def reason_to_skip(self, entry):
+        """Devuelve el motivo para saltar la entrada, o None si se debe descargar."""
+        title = entry.get('title') or ''
+        if self.match_title and not self.match_title.search(title):
+            return 'el título no coincide'
+        if self.reject_title and self.reject_title.search(title):
+            return 'título rechazado'
+        duration = entry.get('duration')
+        if duration is not None:
+            if self.min_duration is not None and duration < self.min_duration:
+                return 'demasiado corto'
+            if self.max_duration is not None and duration > self.max_duration:
+                return 'demasiado largo'
+        if self.skip and self.skip(entry):
+            return 'regla personalizada'
+        return None
+
+
+def _entry_url(entry):
+    return entry.get('url') or entry.get('webpage_url')
+
+
+def _walk_entries(info, depth=0):
+    """Recorre las entradas (incluidas sub-playlists, p.ej. temporadas) sin materializarlas."""
+    for entry in info.get('entries') or ():
+        if not entry:
+            continue  # entradas no disponibles
+        if entry.get('_type') == 'playlist' and depth < 3:
+            yield from _walk_entries(entry, depth + 1)
+        else:
+            yield entry
+
+
+def iter_playlist_entries(ydl, url, start=1, end=None, entry_filter=None):
+    """
+    Genera las entradas de una playlist o serie de forma perezosa.
+    'ydl' debe estar creado con FLAT_PLAYLIST_OPTS. Cada entrada se devuelve como
+    un dict pequeño (url, id, title, duration, index); no se guarda el árbol completo.
+    start/end son 1-indexados e inclusivos, como en yt-dlp.
+    """
+    logger = logging.getLogger(__name__)
+    info = ydl.extract_info(url, download=False, process=False)
+    if not info:
+        return
+    if info.get('_type', 'video') not in ('playlist', 'multi_video'):
+        # No es una playlist: una sola entrada
+        yield {'url': info.get('webpage_url') or url, 'id': info.get('id'), 'title': info.get('title'),
+               'duration': info.get('duration'), 'index': 1}
+        return
+
+    start = max(1, start or 1)
+    stop = end if end else None
+    entries = islice(_walk_entries(info), start - 1, stop)
+
+    for index, entry in enumerate(entries, start):
+        entry_url = _entry_url(entry)
+        if not entry_url:
+            continue
+        item = {'url': entry_url, 'id': entry.get('id'), 'title': entry.get('title'),
+                'duration': entry.get('duration'), 'index': index,
+                'archive_key': make_archive_key(entry.get('ie_key'), entry.get('id'))}
+        reason = entry_filter.reason_to_skip(item) if entry_filter else None
+        if reason:
+            logger.info(f"Saltando entrada {index} ({item['title'] or entry_url}): {reason}")
+            continue
+        yield item
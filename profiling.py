@@ -0,0 +1,282 @@
+# profiling.py
+import atexit
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from config import Config
+from utils import format_bytes
+
+# Sin perfilador activo, phase() devuelve siempre este contexto vacío (costo: una llamada)
+_NULL_PHASE = nullcontext()
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Hojas de pila de un hilo que solo está esperando (no aportan al flame graph)
+_IDLE_FRAMES = {('threading.py', 'wait'), ('queue.py', 'get'), ('selectors.py', 'select'),
+                ('threading.py', '_wait_for_tstate_lock'), ('connection.py', 'poll'), ('socketserver.py', 'serve_forever')}
+
+
+def origin(filename):
+    """De quién es el código de 'filename': propio, yt-dlp, ffmpeg, logging, red u otros."""
+    path = filename.replace('\\', '/')
+    if '/yt_dlp/' in path:
+        return 'yt-dlp'
+    if '/ffmpeg/' in path or path.endswith('/ffmpeg_runner.py'):
+        return 'ffmpeg'
+    if '/logging/' in path:
+        return 'logging'
+    if any(part in path for part in ('/requests/', '/urllib3/', '/http/', '/ssl.py', '/socket.py')):
+        return 'red'
+    if path.startswith(_APP_DIR):
+        return 'propio'
+    return 'otros'
+
+
+class PhaseProfiler:
+    """
+    Perfilado opt-in de las fases de los trabajos (extract, download, remux...).
+
+    - CPU: cada fase corre bajo cProfile con el reloj de CPU del hilo, así la espera de
+      red o de FFmpeg (otro proceso) no cuenta y lo que queda es el costo en Python,
+      repartido por origen: código propio (hooks, logging, nombres de archivo), yt-dlp, etc.
+    - Memoria: tracemalloc mide lo que deja asignado cada fase y, entre reportes, qué
+      líneas acumulan memoria (fugas en sesiones largas de la GUI o del servicio).
+    - Pilas: un hilo muestrea las pilas de todos los hilos y las escribe en formato
+      "collapsed" (combined.folded) para flamegraph.pl o speedscope.
+
+    Solo se perfila la fase más externa de cada hilo (las anidadas cuentan en ella).
+    Los reportes se escriben en 'output_dir' al parar, al salir y cada report_interval s.
+    """
+    def __init__(self, output_dir, sample=None, stack_interval=None, tracemalloc_frames=None, report_interval=None):
+        self.output_dir = Path(output_dir).expanduser()
+        self.sample = Config.PROFILE_SAMPLE if sample is None else sample
+        self.stack_interval = stack_interval or Config.PROFILE_STACK_INTERVAL
+        self.tracemalloc_frames = tracemalloc_frames or Config.PROFILE_TRACEMALLOC_FRAMES
+        self.report_interval = Config.PROFILE_REPORT_INTERVAL if report_interval is None else report_interval
+        self.logger = logging.getLogger(__name__)
+        self._phases = {}         # fase -> {'count', 'profiled', 'memory', 'stats'}
+        self._threads = {}        # ident del hilo -> fase en curso
+        self._stacks = Counter()  # pila colapsada -> muestras
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._sampler = None
+        self._started_tracemalloc = False
+        self._baseline = None
+        self._previous = None
+
+    def start(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            self._started_tracemalloc = True
+        self._baseline = self._previous = tracemalloc.take_snapshot()
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+        self.logger.info(f"Perfilado por fase activado: reportes en {self.output_dir}")
+
+    def stop(self):
+        """Detiene el muestreo y escribe los reportes finales."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._sampler:
+            self._sampler.join(timeout=5)
+        self.write_reports()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name):
+        ident = threading.get_ident()
+        if ident in self._threads:
+            yield  # fase anidada: su costo queda en la de afuera
+            return
+        import cProfile
+
+        profile = None
+        if random.random() < self.sample:
+            profile = cProfile.Profile(time.thread_time)
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None  # Python 3.12+: un solo cProfile activo a la vez en el proceso
+        self._threads[ident] = name
+        memory_before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            memory = tracemalloc.get_traced_memory()[0] - memory_before
+            self._threads.pop(ident, None)
+            self._record(name, profile, memory)
+
+    def write_reports(self):
+        """Un .prof y un .txt por fase, summary.txt, memory.txt y combined.folded."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        summary = []
+        # Con el lock tomado: una fase que termina no puede sumar a las estadísticas mientras se leen
+        with self._lock:
+            stacks = list(self._stacks.items())
+            for name, data in sorted(self._phases.items()):
+                line = f"{name:<15} {data['count']:>6} veces  memoria {_format_size(data['memory'], signed=True)}"
+                if data['stats'] is not None:
+                    data['stats'].dump_stats(str(self.output_dir / f"{name}.prof"))
+                    report, cpu = self._phase_report(name, data)
+                    (self.output_dir / f"{name}.txt").write_text(report, encoding='utf-8')
+                    line += f"  CPU {cpu:.2f} s ({data['profiled']} perfiladas)"
+                summary.append(line)
+        (self.output_dir / 'summary.txt').write_text(
+            "Fases perfiladas (CPU del hilo del trabajo; la espera de red y de FFmpeg no cuenta)\n\n"
+            + '\n'.join(summary) + '\n', encoding='utf-8')
+        with open(self.output_dir / 'combined.folded', 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks):
+                f.write(f"{stack} {count}\n")
+        if tracemalloc.is_tracing():
+            (self.output_dir / 'memory.txt').write_text(self._memory_report(), encoding='utf-8')
+
+    # --- Internos ---
+
+    def _record(self, name, profile, memory):
+        import pstats
+
+        with self._lock:
+            data = self._phases.setdefault(name, {'count': 0, 'profiled': 0, 'memory': 0, 'stats': None})
+            data['count'] += 1
+            data['memory'] += memory
+            if profile is None:
+                return
+            try:
+                if data['stats'] is None:
+                    data['stats'] = pstats.Stats(profile)
+                else:
+                    data['stats'].add(profile)
+                data['profiled'] += 1
+            except TypeError:
+                pass  # la fase no ejecutó nada perfilable
+
+    def _phase_report(self, name, data):
+        """Texto del reporte de una fase y su CPU total."""
+        import io
+
+        stats = data['stats']
+        by_origin = Counter()
+        own = []
+        for (filename, line, function), (_, calls, own_time, _, callers) in stats.stats.items():
+            if filename == '~':
+                # Las funciones nativas (read, sleep, compresión...) se cargan a quien las llamó
+                for caller, edge in callers.items():
+                    by_origin[origin(caller[0])] += edge[2]
+                continue
+            category = origin(filename)
+            by_origin[category] += own_time
+            if category == 'propio':
+                own.append((own_time, calls, f"{os.path.basename(filename)}:{line}({function})"))
+        cpu = sum(by_origin.values())
+
+        out = io.StringIO()
+        out.write(f"Fase: {name}\n")
+        out.write(f"Veces: {data['count']} (perfiladas: {data['profiled']})   CPU: {cpu:.3f} s   "
+                  f"Memoria retenida: {_format_size(data['memory'], signed=True)} (aprox. con trabajos simultáneos)\n\n")
+        out.write("CPU por origen:\n")
+        for category, seconds in by_origin.most_common():
+            out.write(f"  {category:<8} {seconds:9.3f} s  {seconds / cpu * 100 if cpu else 0:5.1f}%\n")
+        out.write("\nCódigo propio con más CPU (hooks, logging, nombres de archivo...):\n")
+        for own_time, calls, label in sorted(own, reverse=True)[:15]:
+            out.write(f"  {own_time:9.4f} s  {calls:>8} llamadas  {label}\n")
+        out.write("\n")
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(Config.PROFILE_TOP_FUNCTIONS)
+        return out.getvalue(), cpu
+
+    def _memory_report(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Memoria rastreada: {_format_size(current)} (pico {_format_size(peak)})", ""]
+        for title, reference in (("Crecimiento desde el inicio del perfilado (posibles fugas)", self._baseline),
+                                 ("Crecimiento desde el reporte anterior", self._previous)):
+            lines.append(f"{title}:")
+            growth = [stat for stat in snapshot.compare_to(reference, 'lineno') if stat.size_diff > 0]
+            lines.extend(f"  {stat}" for stat in growth[:Config.PROFILE_TOP_FUNCTIONS])
+            lines.append("")
+        self._previous = snapshot
+        return '\n'.join(lines)
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        last_report = time.monotonic()
+        while not self._stopping.wait(self.stack_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                phase = self._threads.get(ident)
+                code = frame.f_code
+                if phase is None and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                root = phase or f"[{re.sub(r'[-_]?[0-9]+$', '', names.get(ident, 'hilo'))}]"
+                samples.append(';'.join([root] + stack[::-1]))
+            with self._lock:
+                self._stacks.update(samples)
+            if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                try:
+                    self.write_reports()
+                except Exception as e:
+                    self.logger.warning(f"No se pudieron escribir los reportes de perfilado: {e}")
+
+
+def _format_size(size, signed=False):
+    if not signed:
+        return format_bytes(size)
+    return ('+' if size >= 0 else '-') + format_bytes(abs(size))
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def start(output_dir=None, **kwargs):
+    """Activa el perfilado del proceso (una sola vez) y devuelve el PhaseProfiler."""
+    global _active
+    with _active_lock:
+        if _active is None:
+            _active = PhaseProfiler(output_dir or Config.PROFILE_DIR, **kwargs)
+            _active.start()
+            atexit.register(stop)
+        return _active
+
+
+def stop():
+    """Detiene el perfilado y escribe los reportes."""
+    global _active
+    with _active_lock:
+        profiler, _active = _active, None
+    if profiler:
+        profiler.stop()
+
+
+def get_profiler():
+    return _active
+
+
+def phase(name):
+    """Contexto que perfila la fase si el perfilado está activo (si no, no hace nada)."""
+    profiler = _active
+    return profiler.phase(name) if profiler is not None else _NULL_PHASE
@@ -0,0 +1,169 @@
+# progress.py
+import logging
+import math
+import threading
+import time
+
+from config import Config
+
+
+class ProgressSlot:
+    """
+    Estado de progreso de un trabajo. Los hooks lo actualizan en el sitio en cada
+    tick (sin crear diccionarios); el agregador lo lee al armar cada instantánea.
+    """
+    __slots__ = ('job_id', 'url', 'filename', 'status', 'downloaded', 'total', 'speed', 'percentage',
+                 'error_message', '_window', '_last_bytes', '_last_time', '_base', '_file_bytes', '_file_total')
+
+    def __init__(self, job_id, url, window):
+        self.job_id = job_id
+        self.url = url
+        self.filename = ''
+        self.status = 'queued'
+        self.downloaded = 0
+        self.total = 0
+        self.speed = 0.0      # bytes/s suavizados (EWMA)
+        self.percentage = None
+        self.error_message = None
+        self._window = window
+        self._last_bytes = 0
+        self._last_time = None
+        self._base = 0        # bytes de archivos anteriores del mismo trabajo (video + audio)
+        self._file_bytes = 0
+        self._file_total = 0
+
+    def update(self, downloaded, total, filename=None):
+        """Tick de descarga: bytes acumulados del archivo actual y su tamaño total."""
+        now = time.monotonic()
+        total = total or 0
+        if downloaded < self._file_bytes:
+            # Empezó otro archivo del mismo trabajo (p.ej. la pista de audio)
+            self._base += max(self._file_total, self._file_bytes)
+        self._file_bytes, self._file_total = downloaded, total
+        downloaded += self._base
+        total += self._base
+        self.status = 'downloading'
+        self.downloaded = downloaded
+        self.total = max(total, downloaded)
+        if filename:
+            self.filename = filename
+
+        if self._last_time is None:
+            self._last_time, self._last_bytes = now, downloaded
+            return
+        elapsed = now - self._last_time
+        if elapsed < 0.2:
+            return  # acumulamos: las muestras muy seguidas solo meten ruido
+        instant = (downloaded - self._last_bytes) / elapsed
+        # EWMA con constante de tiempo fija, independiente de la frecuencia de los ticks
+        alpha = 1 - math.exp(-elapsed / self._window)
+        self.speed = instant if not self.speed else self.speed + alpha * (instant - self.speed)
+        self._last_time, self._last_bytes = now, downloaded
+
+    def set_status(self, status, percentage=None, filename=None, error_message=None):
+        self.status = status
+        if percentage is not None:
+            self.percentage = percentage
+        if filename:
+            self.filename = filename
+        if error_message:
+            self.error_message = error_message
+        if status in ('finished', 'error', 'cancelled', 'converting'):
+            self.speed = 0.0
+
+    @property
+    def eta(self):
+        if self.status != 'downloading' or self.speed <= 0 or not self.total:
+            return None
+        return max(0.0, (self.total - self.downloaded) / self.speed)
+
+    def as_dict(self):
+        percentage = self.percentage
+        if self.status == 'downloading':
+            percentage = self.downloaded / self.total * 100 if self.total else 0.0
+        return {
+            'job_id': self.job_id, 'url': self.url, 'filename': self.filename, 'status': self.status,
+            'downloaded_bytes': self.downloaded, 'total_bytes': self.total, 'speed': self.speed,
+            'eta': self.eta, 'percentage': percentage, 'error_message': self.error_message,
+        }
+
+
+class ProgressAggregator:
+    """
+    Junta el progreso de muchos trabajos y publica instantáneas a frecuencia fija,
+    con velocidad/ETA suavizadas y un total agregado. Pensado para que la GUI
+    (o cualquier consumidor) reciba un único evento por cuadro en lugar de uno por tick.
+    """
+    ACTIVE = ('queued', 'retrying', 'downloading', 'converting')
+
+    def __init__(self, interval=None, speed_window=None):
+        self.interval = interval or Config.PROGRESS_PUBLISH_INTERVAL
+        self.speed_window = speed_window or Config.PROGRESS_SPEED_WINDOW
+        self.logger = logging.getLogger(__name__)
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def register(self, job_id, url=''):
+        slot = ProgressSlot(job_id, url, self.speed_window)
+        with self._lock:
+            self._slots[job_id] = slot
+        return slot
+
+    def remove(self, job_id):
+        with self._lock:
+            self._slots.pop(job_id, None)
+
+    def prune(self):
+        """Olvida los trabajos ya terminados."""
+        with self._lock:
+            for job_id in [j for j, s in self._slots.items() if s.status not in self.ACTIVE]:
+                del self._slots[job_id]
+
+    def snapshot(self):
+        """Instantánea de todos los trabajos más el total de los que siguen activos."""
+        with self._lock:
+            slots = list(self._slots.values())
+        jobs = [slot.as_dict() for slot in slots]
+        active = [slot for slot in slots if slot.status in self.ACTIVE]
+        downloaded = sum(slot.downloaded for slot in active)
+        total = sum(slot.total for slot in active)
+        speed = sum(slot.speed for slot in active)
+        return {
+            'jobs': jobs,
+            'total': {
+                'active': len(active), 'downloaded_bytes': downloaded, 'total_bytes': total, 'speed': speed,
+                'percentage': downloaded / total * 100 if total else None,
+                'eta': (total - downloaded) / speed if speed > 0 and total else None,
+            },
+        }
+
+    def subscribe(self, callback):
+        """callback(snapshot) se llama desde el hilo publicador cada 'interval' segundos."""
+        self._subscribers.append(callback)
+        self.start()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._publish_loop, name='progress-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+
+    def _publish_loop(self):
+        while not self._stop.wait(self.interval):
+            if not self._slots:
+                continue
+            snapshot = self.snapshot()
+            for callback in list(self._subscribers):
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    self.logger.debug(f"Error en suscriptor de progreso (ignorado): {e}")
@@ -0,0 +1,152 @@
+# ratelimit.py
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from config import Config
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens thread-safe. 'rate' tokens por segundo con ráfagas de hasta
+    'capacity'. rate=None o 0 significa sin límite.
+
+    consume() reserva los tokens aunque deje la cubeta en negativo y espera a que
+    se recupere; así un consumo grande no se cuela delante de los que ya esperan.
+    """
+    def __init__(self, rate=None, capacity=None):
+        self._lock = threading.Lock()
+        self.rate = None
+        self.capacity = 0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.set_rate(rate, capacity)
+
+    def set_rate(self, rate, capacity=None):
+        """Cambia la tasa en caliente."""
+        with self._lock:
+            self._refill()
+            was_limited = self.rate is not None
+            self.rate = rate or None
+            self.capacity = capacity or (rate or 0)  # por defecto, un segundo de ráfaga
+            if not self.rate:
+                self._tokens = 0.0
+            elif was_limited:
+                self._tokens = min(self._tokens, self.capacity)
+            else:
+                self._tokens = float(self.capacity)  # arranca llena
+
+    def consume(self, amount=1, cancel_event=None):
+        """Bloquea hasta poder gastar 'amount' tokens. Devuelve False si se canceló mientras esperaba."""
+        with self._lock:
+            if not self.rate:
+                return True
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        return _sleep(wait, cancel_event)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+def _sleep(seconds, cancel_event=None):
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        if cancel_event is not None:
+            if cancel_event.wait(min(remaining, 0.25)):
+                return False
+        else:
+            time.sleep(min(remaining, 0.25))
+
+
+class RateLimiter:
+    """
+    Limitador compartido de bytes/s y peticiones/s, global y por host.
+    Todas las descargas y extracciones de un proceso tiran de las mismas cubetas.
+    """
+    def __init__(self, global_bytes=None, global_requests=None, host_bytes=None, host_requests=None):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._global_bytes = TokenBucket(global_bytes)
+        self._global_requests = TokenBucket(global_requests)
+        self._host_bytes_rate = host_bytes
+        self._host_requests_rate = host_requests
+        self._host_bytes = {}
+        self._host_requests = {}
+
+    @classmethod
+    def from_config(cls):
+        if not Config.USE_RATE_LIMITING:
+            return cls()
+        return cls(
+            Config.RATE_LIMIT_GLOBAL_BYTES, Config.RATE_LIMIT_GLOBAL_REQUESTS,
+            Config.RATE_LIMIT_HOST_BYTES, Config.RATE_LIMIT_HOST_REQUESTS,
+        )
+
+    def set_limits(self, global_bytes=False, global_requests=False, host_bytes=False, host_requests=False):
+        """
+        Ajusta los límites en caliente. Solo cambian los argumentos pasados
+        (None = sin límite; el valor por defecto False deja el límite como está).
+        """
+        with self._lock:
+            if global_bytes is not False:
+                self._global_bytes.set_rate(global_bytes)
+            if global_requests is not False:
+                self._global_requests.set_rate(global_requests)
+            if host_bytes is not False:
+                self._host_bytes_rate = host_bytes
+                for bucket in self._host_bytes.values():
+                    bucket.set_rate(host_bytes)
+            if host_requests is not False:
+                self._host_requests_rate = host_requests
+                for bucket in self._host_requests.values():
+                    bucket.set_rate(host_requests)
+        self.logger.info("Límites de tasa actualizados")
+
+    def acquire_request(self, host, cancel_event=None):
+        """Espera turno para hacer una petición contra 'host' (acepta también una URL)."""
+        host = _host(host)
+        return (self._bucket(self._host_requests, host, self._host_requests_rate).consume(1, cancel_event)
+                and self._global_requests.consume(1, cancel_event))
+
+    def consume_bytes(self, host, amount, cancel_event=None):
+        """Descuenta 'amount' bytes recibidos de 'host', esperando si se pasó del límite."""
+        if amount <= 0:
+            return True
+        host = _host(host)
+        return (self._bucket(self._host_bytes, host, self._host_bytes_rate).consume(amount, cancel_event)
+                and self._global_bytes.consume(amount, cancel_event))
+
+    def _bucket(self, buckets, host, rate):
+        with self._lock:
+            bucket = buckets.get(host)
+            if bucket is None:
+                bucket = buckets[host] = TokenBucket(rate)
+            return bucket
+
+
+def _host(host_or_url):
+    if '://' in host_or_url:
+        return urlparse(host_or_url).netloc.lower()
+    return host_or_url.lower()
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Limitador compartido por todo el proceso (creado desde Config la primera vez)."""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter.from_config()
+        return _default_limiter
@@ -0,0 +1,167 @@
+# retry.py
+import logging
+import random
+import threading
+import time
+
+from config import Config
+from metrics import REGISTRY, failure_reason
+
+# Categorías de fallo
+TRANSIENT = 'transient'    # red, timeouts, 5xx, FFmpeg: reintentar con backoff
+THROTTLED = 'throttled'    # 429 / rate limit: reintentar más tarde y frenar el host
+PERMANENT = 'permanent'    # 404, video privado, URL no soportada, sin espacio: no reintentar
+CANCELLED = 'cancelled'
+
+# Mensajes de yt-dlp (y propios) que ningún reintento va a arreglar
+_PERMANENT_MARKERS = (
+    'unsupported url', 'is not a valid url', 'video unavailable', 'private video', 'has been removed',
+    'no video formats', 'requested format is not available', 'sign in', 'login required',
+    'members-only', 'premieres in', 'not available in your country', 'salida desconocida',
+)
+# Mensajes de los post-procesados (el detalle de FFmpeg queda en el log)
+_FFMPEG_MARKERS = ('fallo al re-empaquetar', 'fallo al convertir', 'fallo al generar')
+
+CIRCUIT_TRIPS = REGISTRY.counter(
+    'anime_downloader_circuit_trips_total', 'Veces que se pausó un host por fallos seguidos', ('host',))
+
+
+def classify(error):
+    """Categoría de un fallo (excepción o mensaje de error del trabajo)."""
+    text = str(error or '').lower()
+    reason = failure_reason(error if isinstance(error, BaseException) else Exception(text))
+    if reason == 'cancelled':
+        return CANCELLED
+    if reason == 'http_429' or 'rate limit' in text or 'rate-limit' in text:
+        return THROTTLED
+    if reason == 'disk' or any(marker in text for marker in _PERMANENT_MARKERS):
+        return PERMANENT
+    if reason == 'http_4xx' and 'http error 408' not in text:
+        return PERMANENT
+    if reason in ('http_5xx', 'timeout', 'connection', 'ffmpeg') or any(marker in text for marker in _FFMPEG_MARKERS):
+        return TRANSIENT
+    # Errores de extracción sin detalle reconocible: suelen ser cambios de la página o cortes
+    # momentáneos, así que se reintentan (acotado por max_attempts)
+    return TRANSIENT
+
+
+class RetryPolicy:
+    """Cuántas veces y cuándo reintentar un trabajo: backoff exponencial con jitter completo."""
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None, throttled_delay=None):
+        self.max_attempts = Config.RETRY_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.base_delay = base_delay or Config.RETRY_BASE_DELAY
+        self.max_delay = max_delay or Config.RETRY_MAX_DELAY
+        self.throttled_delay = throttled_delay or Config.RETRY_THROTTLED_DELAY
+
+    def should_retry(self, category, attempts):
+        """'attempts' = reintentos ya hechos."""
+        return category in (TRANSIENT, THROTTLED) and attempts < self.max_attempts
+
+    def delay(self, category, attempts):
+        """Segundos de espera antes del reintento número attempts + 1."""
+        base = self.throttled_delay if category == THROTTLED else self.base_delay
+        ceiling = min(self.max_delay, base * 2 ** attempts)
+        # Jitter completo: los trabajos que fallaron juntos no vuelven todos a la vez
+        return random.uniform(ceiling / 2, ceiling) if category == THROTTLED else random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Cortacircuitos de un host. Tras 'failure_threshold' fallos transitorios seguidos
+    (o un 429) se abre y el host queda en pausa 'reset_timeout' segundos; después deja
+    pasar un trabajo de prueba (semiabierto): si sale bien se cierra, si falla se
+    vuelve a abrir con el doble de pausa.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, host, failure_threshold=None, reset_timeout=None, max_reset_timeout=None):
+        self.host = host
+        self.failure_threshold = failure_threshold or Config.BREAKER_FAILURE_THRESHOLD
+        self.base_reset_timeout = reset_timeout or Config.BREAKER_RESET_TIMEOUT
+        self.max_reset_timeout = max_reset_timeout or Config.BREAKER_MAX_RESET_TIMEOUT
+        self.reset_timeout = self.base_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True si se puede empezar un trabajo contra el host ahora."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.opened_until:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Segundos hasta que el host vuelva a aceptar trabajos (0 si ya acepta)."""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.opened_until - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.getLogger(__name__).info(f"Host {self.host} recuperado: se reanudan sus trabajos")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            self._trial_running = False
+
+    def record_failure(self, category=TRANSIENT):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            elif self.state == self.OPEN or (category != THROTTLED and self.failures < self.failure_threshold):
+                return
+            self.state = self.OPEN
+            self.opened_until = time.monotonic() + self.reset_timeout
+            self._trial_running = False
+            timeout = self.reset_timeout
+        CIRCUIT_TRIPS.inc(host=self.host)
+        logging.getLogger(__name__).warning(f"Host {self.host} en pausa {timeout:.0f} s tras {self.failures} fallos seguidos")
+
+    def release_trial(self):
+        """El trabajo de prueba terminó sin veredicto (cancelado o fallo permanente)."""
+        with self._lock:
+            self._trial_running = False
+
+
+class CircuitBreakers:
+    """Un CircuitBreaker por host, creado la primera vez que se pide."""
+    def __init__(self, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host, **self.breaker_kwargs)
+            return breaker
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.host: {'state': b.state, 'failures': b.failures, 'retry_in': b.retry_in()} for b in breakers}
+
+
+_default_breakers = None
+_default_lock = threading.Lock()
+
+
+def get_circuit_breakers():
+    """Cortacircuitos compartidos por todo el proceso (todos los planificadores ven el mismo estado del host)."""
+    global _default_breakers
+    with _default_lock:
+        if _default_breakers is None:
+            _default_breakers = CircuitBreakers()
+        return _default_breakers
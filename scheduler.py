@@ -0,0 +1,427 @@
+# scheduler.py
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from config import Config
+from metrics import JOBS, RETRIES
+from retry import PERMANENT, THROTTLED, TRANSIENT, RetryPolicy, classify, get_circuit_breakers
+from utils import log_context
+
+
+class DownloadJob:
+    """Un trabajo de descarga con su propio evento de cancelación y flujo de progreso."""
+    _ids = itertools.count(1)
+
+    def __init__(self, url, convert_format='none', progress_callback=None, max_events=256,
+                 journal=None, journal_id=None, aggregator=None):
+        self.id = next(self._ids)
+        self.url = url
+        self.host = urlparse(url).netloc.lower()
+        self.convert_format = convert_format
+        self.progress_callback = progress_callback
+        self.cancel_event = threading.Event()
+        # Cola acotada: si nadie la consume, se descartan los eventos más viejos
+        self.events = queue.Queue(maxsize=max_events)
+        self.status = 'queued'
+        self.error_message = None
+        self.filename = None
+        self.timings = {}  # fase -> segundos (lo llena metrics.time_phase vía el contexto de log)
+        self.started_at = None
+        self.attempts = 0         # reintentos hechos (ver retry.RetryPolicy)
+        self.not_before = 0.0     # monotonic: no arrancar antes (backoff del reintento)
+        self._requeue = False
+        self._done = threading.Event()
+        self._done_callbacks = []
+        self._callbacks_lock = threading.Lock()
+        # Ranura en el ProgressAggregator (progreso agregado con velocidad suavizada)
+        self.progress_slot = aggregator.register(self.id, url) if aggregator else None
+        # Diario write-ahead opcional (ver journal.py) para poder reanudar tras un corte
+        self.journal = journal
+        self.journal_id = journal_id
+        self._journal_last_state = None
+        if journal and not journal_id:
+            self.journal_id = journal.new_job(url, convert_format)
+            self._journal_last_state = 'queued'
+
+    def cancel(self):
+        """Pide la cancelación del trabajo (en cola o en curso)."""
+        self.cancel_event.set()
+
+    def wait(self, timeout=None):
+        """Bloquea hasta que el trabajo termine. Devuelve False si vence el timeout."""
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def add_done_callback(self, callback):
+        """callback(job) se llama al terminar el trabajo (en el acto si ya terminó)."""
+        with self._callbacks_lock:
+            if not self.done:
+                self._done_callbacks.append(callback)
+                return
+        callback(self)
+
+    def iter_events(self, poll_interval=0.5):
+        """Itera los eventos de progreso hasta que el trabajo termina."""
+        while True:
+            try:
+                yield self.events.get(timeout=poll_interval)
+            except queue.Empty:
+                if self.done and self.events.empty():
+                    return
+
+    def _emit(self, data):
+        data = dict(data, job_id=self.id, url=self.url)
+        status = data.get('status')
+        if status == 'error':
+            # El planificador puede reintentar: el 'error' se publica recién al terminar (ver _finish)
+            self.error_message = data.get('error_message')
+            return
+        if status == 'finished' and data.get('filename'):
+            self.filename = str(data['filename'])
+        if self.progress_slot is not None:
+            if status == 'downloading':
+                self.progress_slot.update(data.get('downloaded_bytes', 0), data.get('total_bytes'), data.get('filename'))
+            elif status and status != 'finished':
+                # 'finished' llega también al terminar cada pista; el estado final lo pone _finish
+                self.progress_slot.set_status(status, data.get('percentage'), data.get('filename'), data.get('error_message'))
+        if self.journal:
+            if status == 'downloading':
+                self._journal_state('downloading')
+                if data.get('tmpfilename'):
+                    self.journal.progress(self.journal_id, data['tmpfilename'], data.get('downloaded_bytes', 0))
+            elif status == 'converting':
+                self._journal_state('postprocessing')
+        self._publish(data)
+
+    def _publish(self, data):
+        while True:
+            try:
+                self.events.put_nowait(data)
+                break
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    pass
+        if self.progress_callback:
+            try:
+                self.progress_callback(data)
+            except Exception as e:
+                logging.debug(f"Error en callback de progreso del trabajo {self.id} (ignorado): {e}")
+
+    def _finish(self, status):
+        self.status = status
+        JOBS.inc(status=status)
+        if self.progress_slot is not None:
+            self.progress_slot.set_status(status, error_message=self.error_message if status == 'error' else None)
+        if status == 'finished':
+            self._journal_state('done', filename=self.filename)
+        elif status == 'error':
+            self._journal_state('failed', error=self.error_message)
+            self._publish({'status': 'error', 'error_message': self.error_message or 'Desconocido',
+                           'job_id': self.id, 'url': self.url})
+        # Un trabajo cancelado conserva su último estado en el diario: se puede reanudar
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logging.debug(f"Error en callback de fin del trabajo {self.id} (ignorado): {e}")
+
+    def _journal_state(self, state, **fields):
+        if not self.journal or state == self._journal_last_state:
+            return
+        self._journal_last_state = state
+        try:
+            self.journal.update(self.journal_id, state, **fields)
+        except Exception as e:
+            logging.warning(f"No se pudo escribir en el diario de trabajos: {e}")
+
+    def __repr__(self):
+        return f"<DownloadJob {self.id} {self.status} {self.url}>"
+
+
+class DownloadScheduler:
+    """
+    Pool acotado de workers que ejecuta muchos DownloadJob en paralelo,
+    respetando un límite global y otro por host.
+
+    El post-procesado (conversión MP3/MP4) es una etapa aparte con su propio pool:
+    cuando termina la transferencia de un trabajo, su worker de red pasa a la
+    siguiente URL mientras FFmpeg convierte en paralelo. Con postprocess_workers=0
+    cada trabajo se descarga y convierte en el mismo worker.
+    """
+    def __init__(self, downloader, max_workers=None, per_host_limit=None, max_pending=None, keep_jobs=True,
+                 postprocess_workers=None, journal=None, aggregator=None, retry_policy=None, breakers=None):
+        self.downloader = downloader
+        self.max_workers = max(1, max_workers or Config.MAX_CONCURRENT_DOWNLOADS)
+        self.per_host_limit = max(1, per_host_limit or Config.MAX_DOWNLOADS_PER_HOST)
+        if postprocess_workers is None:
+            postprocess_workers = Config.MAX_CONCURRENT_POSTPROCESS
+        self.postprocess_workers = max(0, postprocess_workers)
+        # Con max_pending, submit() bloquea mientras la cola esté llena (memoria acotada)
+        self.max_pending = max_pending
+        # Con keep_jobs=False no se retienen los trabajos terminados (lotes muy largos)
+        self.keep_jobs = keep_jobs
+        self.journal = journal
+        self.aggregator = aggregator
+        # Los fallos transitorios se reintentan con backoff; un host que falla seguido
+        # queda en pausa (cortacircuitos) mientras siguen los trabajos de otros hosts
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or get_circuit_breakers()
+        self.logger = logging.getLogger(__name__)
+
+        self._pending = deque()
+        self._running = set()
+        self._postprocessing = set()
+        self._pp_executor = None
+        if self.postprocess_workers:
+            self._pp_executor = ThreadPoolExecutor(max_workers=self.postprocess_workers, thread_name_prefix='postprocess-worker')
+        self._jobs = []
+        self._active_per_host = Counter()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._closed = False
+
+    # --- API pública ---
+
+    def submit(self, url, convert_format='none', progress_callback=None, journal_id=None):
+        """Encola una URL y devuelve su DownloadJob. 'journal_id' reanuda un trabajo del diario."""
+        job = DownloadJob(url, convert_format, progress_callback, journal=self.journal, journal_id=journal_id,
+                          aggregator=self.aggregator)
+        with self._cond:
+            while self.max_pending and len(self._pending) >= self.max_pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("El planificador ya fue cerrado.")
+            self._pending.append(job)
+            if self.keep_jobs:
+                self._jobs.append(job)
+            self._ensure_workers()
+            self._cond.notify()
+        return job
+
+    def submit_many(self, urls, convert_format='none', progress_callback=None):
+        return [self.submit(url, convert_format, progress_callback) for url in urls]
+
+    @property
+    def jobs(self):
+        """Trabajos enviados (solo si keep_jobs=True)."""
+        with self._cond:
+            return list(self._jobs)
+
+    @property
+    def active_jobs(self):
+        """Trabajos en cola, descargando o post-procesando."""
+        with self._cond:
+            return list(self._pending) + list(self._running) + list(self._postprocessing)
+
+    def cancel_all(self):
+        for job in self.active_jobs:
+            job.cancel()
+        with self._cond:
+            self._cond.notify_all()
+
+    def join(self, timeout=None):
+        """Espera a que terminen todos los trabajos encolados hasta ahora."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._running or self._postprocessing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, wait=True, cancel=False):
+        """Cierra el planificador. Con cancel=True también cancela lo pendiente."""
+        if cancel:
+            self.cancel_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        if self._pp_executor:
+            self._pp_executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True, cancel=exc_type is not None)
+
+    # --- Internos ---
+
+    def _ensure_workers(self):
+        # Los workers se crean bajo demanda hasta el límite global
+        alive = [w for w in self._workers if w.is_alive()]
+        self._workers = alive
+        busy = sum(self._active_per_host.values())
+        if len(alive) < min(self.max_workers, busy + len(self._pending)):
+            worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{len(alive) + 1}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_job(self):
+        """
+        Saca el primer trabajo listo (sin backoff pendiente) cuyo host tenga un hueco
+        libre y no esté en pausa por su cortacircuitos (bloqueante).
+        """
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wake = None  # segundos hasta que un trabajo en espera pueda estar listo
+                for job in list(self._pending):
+                    if job.cancel_event.is_set():
+                        self._pending.remove(job)
+                        job._emit({'status': 'cancelled'})
+                        job._finish('cancelled')
+                        self._cond.notify_all()
+                        continue
+                    if job.not_before > now:
+                        wake = min(wake or float('inf'), job.not_before - now)
+                        continue
+                    if self._active_per_host[job.host] >= self.per_host_limit:
+                        continue
+                    breaker = self.breakers.get(job.host)
+                    if not breaker.allow():
+                        wake = min(wake or float('inf'), breaker.retry_in() or 1.0)
+                        continue
+                    self._pending.remove(job)
+                    self._running.add(job)
+                    self._active_per_host[job.host] += 1
+                    self._cond.notify_all()
+                    job.status = 'running'
+                    return job
+                if self._closed and not self._pending:
+                    return None
+                # Con trabajos en espera se revisa al menos cada segundo (también para ver cancelaciones)
+                self._cond.wait(None if wake is None else min(wake, 1.0))
+
+    def _release(self, job):
+        with self._cond:
+            self._running.discard(job)
+            self._active_per_host[job.host] -= 1
+            if self._active_per_host[job.host] <= 0:
+                del self._active_per_host[job.host]
+            self._requeue_if_retrying(job)
+            self._cond.notify_all()
+
+    def _requeue_if_retrying(self, job):
+        # Se vuelve a encolar recién cuando el trabajo dejó su etapa (con el lock tomado)
+        if job._requeue:
+            job._requeue = False
+            job.status = 'queued'
+            self._pending.append(job)
+            self._ensure_workers()
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                with log_context(job_id=job.id, url=job.url, timings=job.timings):
+                    self._run(job)
+            finally:
+                self._release(job)
+
+    def _run(self, job):
+        job.started_at = time.monotonic()
+        self.logger.info(f"[job {job.id}] Iniciando: {job.url}")
+        job._journal_state('extracting')
+        try:
+            if self.downloader.check_archive(job.url, job._emit, job.convert_format):
+                self._complete(job, True)
+                return
+            if not self._pp_executor:
+                ok = self.downloader.download_episode_safe(job.url, job._emit, job.convert_format, job.cancel_event,
+                                                           progress_slot=job.progress_slot)
+                self._complete(job, ok)
+                return
+            fetched = self.downloader.fetch_episode(job.url, job._emit, job.convert_format, job.cancel_event,
+                                                    progress_slot=job.progress_slot)
+        except Exception as e:
+            self.logger.error(f"[job {job.id}] Error inesperado: {e}")
+            job._emit({'status': 'error', 'error_message': str(e)})
+            self._complete(job, False)
+            return
+        if not fetched:
+            self._complete(job, False)
+            return
+
+        # Pasamos el archivo a la etapa de post-procesado y liberamos el worker de red
+        source_path, info = fetched
+        with self._cond:
+            job.status = 'postprocessing'
+            self._postprocessing.add(job)
+        job._journal_state('postprocessing')
+        self._pp_executor.submit(self._postprocess, job, source_path, info)
+
+    def _postprocess(self, job, source_path, info):
+        with log_context(job_id=job.id, url=job.url, timings=job.timings):
+            try:
+                ok = self.downloader.postprocess_episode(source_path, job._emit, job.convert_format, job.cancel_event, info) is not None
+            except Exception as e:
+                self.logger.error(f"[job {job.id}] Error inesperado en el post-procesado: {e}")
+                job._emit({'status': 'error', 'error_message': str(e)})
+                ok = False
+            self._complete(job, ok)
+        with self._cond:
+            self._postprocessing.discard(job)
+            self._requeue_if_retrying(job)
+            self._cond.notify_all()
+
+    def _complete(self, job, ok):
+        breaker = self.breakers.get(job.host)
+        if ok:
+            breaker.record_success()
+        elif job.cancel_event.is_set():
+            breaker.release_trial()
+        else:
+            category = classify(job.error_message)
+            if category in (TRANSIENT, THROTTLED):
+                breaker.record_failure(category)
+            else:
+                breaker.release_trial()
+            if self.retry_policy.should_retry(category, job.attempts):
+                self._plan_retry(job, category)
+                return
+            if category == PERMANENT:
+                self.logger.info(f"[job {job.id}] Fallo permanente, no se reintenta: {job.error_message}")
+        if ok:
+            job._finish('finished')
+        elif job.cancel_event.is_set():
+            job._finish('cancelled')
+        else:
+            job._finish('error')
+        if self.aggregator and not self.keep_jobs:
+            self.aggregator.remove(job.id)
+        elapsed = time.monotonic() - job.started_at if job.started_at else None
+        self.logger.info(f"[job {job.id}] Terminado con estado: {job.status}",
+                         extra={'status': job.status, 'elapsed': elapsed, 'timings': dict(job.timings)})
+
+    def _plan_retry(self, job, category):
+        delay = self.retry_policy.delay(category, job.attempts)
+        job.attempts += 1
+        job.not_before = time.monotonic() + delay
+        RETRIES.inc(component='job', host=job.host)
+        self.logger.warning(f"[job {job.id}] Fallo {category}, reintento {job.attempts}/{self.retry_policy.max_attempts} "
+                            f"en {delay:.1f} s: {job.error_message}")
+        job._emit({'status': 'retrying', 'attempt': job.attempts, 'delay': delay, 'error_message': job.error_message})
+        job.error_message = None
+        job._journal_state('queued')
+        job._requeue = True
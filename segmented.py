@@ -0,0 +1,299 @@
+# segmented.py
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from config import Config
+from diskspace import is_allocated, preallocate
+from http_session import get_http_pool
+from metrics import RETRIES
+
+
+class SegmentedNotSupported(Exception):
+    """El servidor no admite rangos o no informa el tamaño: hay que usar la descarga normal."""
+
+
+class SegmentedDownloadError(Exception):
+    """Falló la descarga segmentada (un rango agotó sus reintentos o no pasó la verificación)."""
+
+
+class _Segment:
+    """
+    Rango [start, end) de bytes. 'pos' avanza al tomar cada bloque y 'done' cuando
+    el bloque ya está escrito: el progreso guardado para retomar usa 'done'.
+    """
+    __slots__ = ('start', 'end', 'pos', 'done', 'active')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.pos = start
+        self.done = start
+        self.active = False
+
+    @property
+    def remaining(self):
+        return self.end - self.pos
+
+
+class SegmentedDownloader:
+    """
+    Descarga un archivo HTTP progresivo por rangos de bytes con N conexiones,
+    escribiendo cada rango directamente en su posición de un archivo preasignado.
+
+    Los segmentos se dimensionan de forma adaptativa: cuando una conexión queda
+    libre parte a la mitad el segmento con más bytes pendientes, así las conexiones
+    rápidas se llevan más trabajo y ninguna queda ociosa al final.
+
+    El archivo temporal es '<destino>.segpart' (no el .part de yt-dlp, que lo tomaría
+    por una descarga suya) y a su lado '<destino>.segpart.json' guarda cada segundo los
+    rangos que faltan: una descarga cortada o cancelada se retoma desde ahí.
+    """
+    def __init__(self, connections=None, min_segment_size=None, max_retries=3, chunk_size=256 * 1024, timeout=30, session=None,
+                 rate_limiter=None):
+        self.connections = max(1, connections or Config.SEGMENTED_CONNECTIONS)
+        self.min_segment_size = min_segment_size or Config.SEGMENTED_MIN_SEGMENT_SIZE
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self.session = session or get_http_pool()  # keep-alive compartido con el resto de descargas al mismo host
+        self.rate_limiter = rate_limiter
+
+    def probe(self, url, headers=None):
+        """
+        (tamaño, validador) del recurso si el servidor acepta rangos; si no, SegmentedNotSupported.
+        El validador (ETag o Last-Modified) dice si un .segpart anterior sigue sirviendo.
+        """
+        headers = dict(headers or {}, Range='bytes=0-0')
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 206:
+                raise SegmentedNotSupported(f"El servidor no acepta rangos (HTTP {response.status_code})")
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rpartition('/')[2]
+            if not total.isdigit():
+                raise SegmentedNotSupported("El servidor no informa el tamaño total")
+            return int(total), response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+    def download(self, url, dest_path, headers=None, expected_size=None, progress_callback=None, cancel_event=None,
+                 on_bytes=None, reservation=None):
+        """
+        Descarga 'url' en 'dest_path' (vía un .segpart) y devuelve la ruta final.
+        progress_callback recibe eventos 'downloading' como los de SafeProgressHook;
+        on_bytes(n) se llama por cada bloque recibido (no cuenta lo retomado).
+        'reservation' (SpaceReservation del trabajo) se descuenta con lo que el .segpart
+        ocupa en disco: todo de una vez si quedó preasignado, si no a medida que se escribe.
+        """
+        part_path = f"{dest_path}.segpart"
+        try:
+            size, validator = self.probe(url, headers)
+            if expected_size and expected_size != size:
+                raise SegmentedNotSupported(f"Tamaño inesperado: {size} en lugar de {expected_size}")
+            if size < self.min_segment_size * 2:
+                raise SegmentedNotSupported("Archivo demasiado pequeño para segmentar")
+        except SegmentedNotSupported:
+            discard(dest_path)  # lo que haya quedado de un intento anterior ya no sirve
+            raise
+
+        segments = self._resume_segments(dest_path, size, validator)
+        if segments is None:
+            allocated = preallocate(part_path, size)
+            initial = max(self.min_segment_size, -(-size // self.connections))
+            segments = [_Segment(start, min(start + initial, size)) for start in range(0, size, initial)]
+        else:
+            allocated = is_allocated(part_path, size)
+        already = size - sum(segment.remaining for segment in segments)
+        if reservation is not None:
+            # Con posix_fallocate el espacio libre ya bajó: seguir contándolo como pendiente lo restaría dos veces
+            reservation.written += size if allocated else already
+        state = {'error': None, 'downloaded': already, 'received': 0, 'last_report': 0.0, 'last_save': time.monotonic(),
+                 'started': time.monotonic()}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def save_progress():
+            with lock:
+                pending = [[segment.done, segment.end] for segment in segments if segment.done < segment.end]
+            _write_json(f"{part_path}.json", {'size': size, 'validator': validator, 'pending': pending})
+
+        def next_segment():
+            with lock:
+                for segment in segments:
+                    if not segment.active and segment.remaining > 0:
+                        segment.active = True
+                        return segment
+                # Sin segmentos libres: partimos el más grande que siga en curso
+                largest = max(segments, key=lambda s: s.remaining)
+                if largest.remaining < self.min_segment_size * 2:
+                    return None
+                middle = largest.pos + largest.remaining // 2
+                new = _Segment(middle, largest.end)
+                new.active = True
+                largest.end = middle
+                segments.append(new)
+                return new
+
+        def on_chunk(count):
+            if self.rate_limiter:
+                self.rate_limiter.consume_bytes(url, count, cancel_event)
+            if on_bytes:
+                on_bytes(count)
+            with lock:
+                if reservation is not None and not allocated:
+                    reservation.written += count
+                state['downloaded'] += count
+                state['received'] += count
+                now = time.monotonic()
+                save = now - state['last_save'] >= 1.0
+                if save:
+                    state['last_save'] = now
+                report = progress_callback and now - state['last_report'] >= 1.0
+                if report:
+                    state['last_report'] = now
+                downloaded, received = state['downloaded'], state['received']
+            if save:
+                save_progress()
+            if not report:
+                return
+            elapsed = max(now - state['started'], 1e-6)
+            progress_callback({
+                'status': 'downloading', 'percentage': downloaded / size * 100,
+                'downloaded_bytes': downloaded, 'total_bytes': size,
+                'speed': int(received / elapsed), 'filename': str(dest_path), 'tmpfilename': part_path,
+            })
+
+        def worker():
+            # Sin búfer: lo que 'done' da por escrito ya está en el sistema operativo
+            with open(part_path, 'r+b', buffering=0) as f:
+                while not stop.is_set():
+                    segment = next_segment()
+                    if segment is None:
+                        return
+                    try:
+                        self._fetch_segment(url, headers, segment, f, on_chunk, cancel_event, lock, stop)
+                    except Exception as e:
+                        if state['error'] is None:
+                            state['error'] = e
+                        stop.set()
+                        return
+                    finally:
+                        segment.active = False
+
+        if already:
+            self.logger.info(f"Retomando descarga segmentada: {already} de {size} bytes ya estaban")
+        threads = [threading.Thread(target=worker, name=f"segment-{i + 1}", daemon=True) for i in range(self.connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if state['error'] is not None:
+            if not (cancel_event and cancel_event.is_set()):
+                self.logger.error(f"Descarga segmentada fallida: {state['error']}")
+            # El .segpart y su progreso quedan: el reintento del trabajo sigue desde ahí
+            save_progress()
+            raise state['error']
+
+        # Verificación final: todos los rangos completos y el tamaño en disco coincide
+        missing = sum(segment.remaining for segment in segments)
+        if missing or state['downloaded'] != size or os.path.getsize(part_path) != size:
+            discard(dest_path)
+            raise SegmentedDownloadError(f"Verificación fallida: faltan {missing} bytes de {size}")
+
+        os.replace(part_path, dest_path)
+        _remove(f"{part_path}.json")
+        if progress_callback:
+            progress_callback({'status': 'finished', 'filename': str(dest_path)})
+        return str(dest_path)
+
+    def _resume_segments(self, dest_path, size, validator):
+        """Segmentos pendientes de un intento anterior, o None si hay que empezar de cero."""
+        part_path = f"{dest_path}.segpart"
+        try:
+            with open(f"{part_path}.json", encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved['size'] != size or saved['validator'] != validator or os.path.getsize(part_path) != size:
+                raise ValueError("el archivo del servidor cambió")
+            segments = []
+            for start, end in saved['pending']:
+                if not 0 <= start < end <= size:
+                    raise ValueError(f"rango inválido {start}-{end}")
+                segments.append(_Segment(start, end))
+            return segments
+        except FileNotFoundError:
+            pass  # sin progreso guardado el contenido del .segpart no es confiable
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.info(f"No se retoma la descarga segmentada ({e}): se empieza de cero")
+        discard(dest_path)
+        return None
+
+    def _fetch_segment(self, url, headers, segment, f, on_bytes, cancel_event, lock, stop):
+        """Descarga un segmento, reintentando desde el último byte escrito."""
+        attempt = 0
+        while True:
+            with lock:
+                start, end = segment.pos, segment.end
+            if start >= end:
+                return
+            try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire_request(url, cancel_event)
+                request_headers = dict(headers or {}, Range=f"bytes={start}-{end - 1}")
+                with self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code != 206 or not response.headers.get('Content-Range', '').startswith(f"bytes {start}-"):
+                        raise SegmentedDownloadError(f"Respuesta de rango inválida (HTTP {response.status_code})")
+                    for chunk in response.iter_content(self.chunk_size):
+                        if cancel_event and cancel_event.is_set():
+                            raise Exception("Descarga cancelada por el usuario.")
+                        if stop.is_set():
+                            return  # otro segmento falló: se aborta todo
+                        with lock:
+                            # El segmento pudo haberse partido mientras tanto: no escribir de más
+                            allowed = segment.end - segment.pos
+                            chunk = chunk[:allowed]
+                            offset = segment.pos
+                            segment.pos += len(chunk)
+                        if chunk:
+                            f.seek(offset)
+                            f.write(chunk)
+                            with lock:
+                                segment.done = offset + len(chunk)
+                            on_bytes(len(chunk))
+                        if segment.remaining <= 0:
+                            break
+                if segment.remaining > 0:
+                    raise SegmentedDownloadError("Conexión cerrada antes de completar el rango")
+                return
+            except (requests.RequestException, SegmentedDownloadError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise SegmentedDownloadError(f"Rango {segment.pos}-{segment.end - 1} agotó los reintentos: {e}")
+                self.logger.debug(f"Reintentando rango {segment.pos}-{segment.end - 1} ({attempt}/{self.max_retries}): {e}")
+                RETRIES.inc(component='segmented', host=urlparse(url).netloc)
+                time.sleep(min(2 ** attempt, 10))
+
+
+def discard(dest_path):
+    """Borra el .segpart de 'dest_path' y su progreso guardado."""
+    part_path = f"{dest_path}.segpart"
+    _remove(part_path)
+    _remove(f"{part_path}.json")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,113 @@
+# session_pool.py
+import logging
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+from config import Config
+
+
+class _HookDispatcher:
+    """Hook fijo de la sesión: reenvía cada evento al hook del trabajo actual."""
+    def __init__(self):
+        self.hook = None
+
+    def __call__(self, data):
+        hook = self.hook
+        if hook:
+            hook(data)
+
+
+class YDLSession:
+    """Un YoutubeDL de larga vida al que se le enganchan hooks por trabajo."""
+    def __init__(self, params, extractors=()):
+        self._dispatcher = _HookDispatcher()
+        self._pp_dispatcher = _HookDispatcher()
+        params = dict(params)
+        params['progress_hooks'] = [self._dispatcher]
+        params['postprocessor_hooks'] = [self._pp_dispatcher]
+        # Los extractores extra van antes que los de yt-dlp: el genérico acepta cualquier URL
+        self.ydl = yt_dlp.YoutubeDL(params, auto_init=not extractors)
+        if extractors:
+            for extractor in extractors:
+                self.ydl.add_info_extractor(extractor())
+            self.ydl.add_default_info_extractors()
+        self.uses = 0
+
+    def attach(self, progress_hook=None, postprocessor_hook=None):
+        self._dispatcher.hook = progress_hook
+        self._pp_dispatcher.hook = postprocessor_hook
+        self.uses += 1
+
+    def detach(self):
+        self._dispatcher.hook = None
+        self._pp_dispatcher.hook = None
+
+    def close(self):
+        try:
+            self.ydl.close()
+        except Exception as e:
+            logging.debug(f"Error cerrando sesión de yt-dlp (ignorado): {e}")
+
+
+class YDLSessionPool:
+    """
+    Pool de sesiones de yt-dlp agrupadas por perfil de opciones.
+    Mantiene vivos los extractores inicializados, las cookies y las conexiones
+    keep-alive entre descargas. Cada sesión la usa un solo hilo a la vez.
+    'extractors' son clases InfoExtractor adicionales (p.ej. el extractor de prueba de benchmark.py).
+    """
+    def __init__(self, max_idle_per_profile=None, extractors=()):
+        self.max_idle_per_profile = max_idle_per_profile or Config.SESSION_POOL_MAX_IDLE
+        self.extractors = tuple(extractors)
+        self.logger = logging.getLogger(__name__)
+        self._idle = {}  # perfil -> [YDLSession]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, profile, params, progress_hook=None, postprocessor_hook=None):
+        """
+        Presta una sesión del perfil dado (la crea con 'params' si no hay libres)
+        y le engancha los hooks del trabajo mientras dure el bloque 'with'.
+        """
+        session = self._acquire(profile, params)
+        session.attach(progress_hook, postprocessor_hook)
+        try:
+            yield session.ydl
+        finally:
+            session.detach()
+            self._release(profile, session)
+
+    def warm(self, profile, params, count=1):
+        """Precalienta 'count' sesiones libres para un perfil."""
+        with self._lock:
+            missing = min(count, self.max_idle_per_profile) - len(self._idle.get(profile, []))
+        for _ in range(max(0, missing)):
+            self._release(profile, YDLSession(params, self.extractors))
+
+    def clear(self):
+        """Cierra todas las sesiones libres (p.ej. al cambiar la ruta de descarga)."""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    close = clear
+
+    def _acquire(self, profile, params):
+        with self._lock:
+            idle = self._idle.get(profile)
+            if idle:
+                return idle.pop()
+        self.logger.debug(f"Creando sesión de yt-dlp para el perfil {profile}")
+        return YDLSession(params, self.extractors)
+
+    def _release(self, profile, session):
+        with self._lock:
+            idle = self._idle.setdefault(profile, [])
+            if len(idle) < self.max_idle_per_profile:
+                idle.append(session)
+                return
+        session.close()
@@ -0,0 +1,82 @@
+# sites.py
+import importlib.util
+import json
+import logging
+import os
+from importlib import metadata
+from pathlib import Path
+
+from config import Config
+
+# Sitios que yt-dlp soporta de serie y que mostramos en modo estándar
+STANDARD_SITES = [
+    'youtube.com', 'youtu.be', 'vimeo.com',
+    'dailymotion.com', 'twitch.tv', 'facebook.com',
+    'twitter.com', 'instagram.com', 'tiktok.com'
+]
+
+
+def _table_key():
+    """
+    Identifica la versión de lo que genera la tabla (yt-dlp y los extractores propios)
+    sin importarlos: si algo cambia, la tabla cacheada deja de valer.
+    """
+    parts = []
+    try:
+        parts.append(metadata.version('yt-dlp'))
+    except metadata.PackageNotFoundError:
+        parts.append('sin-yt-dlp')
+    for name in ('downloader_extended', 'extractors'):
+        spec = importlib.util.find_spec(name)
+        if not spec:
+            continue
+        files = [Path(spec.origin)] if spec.origin and os.path.exists(spec.origin) else []
+        for location in spec.submodule_search_locations or []:
+            files.extend(Path(location).glob('*.py'))  # paquete: cualquier extractor modificado cuenta
+        if files:
+            parts.append(f"{name}:{max(f.stat().st_mtime for f in files)}")
+    return '|'.join(parts)
+
+
+def _build_table():
+    """Arma la tabla instanciando el descargador extendido una sola vez."""
+    from downloader_extended import ExtendedAnimeDownloader
+
+    downloader = ExtendedAnimeDownloader()
+    supported = downloader.list_supported_sites()
+    return {
+        'custom_extractors': list(supported.get('custom_extractors') or []),
+        'standard': list(supported.get('standard') or []),
+        'custom_count': len(getattr(downloader, 'custom_extractors', {})),
+    }
+
+
+def get_site_table(extended, refresh=False):
+    """
+    Tabla de sitios soportados. En modo estándar es fija; en modo extendido se
+    genera una vez y se guarda en Config.SITES_CACHE_FILE hasta que cambie la clave.
+    """
+    if not extended:
+        return {'custom_extractors': [], 'standard': list(STANDARD_SITES), 'custom_count': 0}
+
+    path = Path(Config.SITES_CACHE_FILE)
+    key = _table_key()
+    if not refresh:
+        try:
+            with open(path, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('key') == key:
+                return cached['table']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    table = _build_table()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'table': table}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.getLogger(__name__).debug(f"No se pudo guardar la tabla de sitios: {e}")
+    return table
@@ -0,0 +1,443 @@
+# streaming.py
+import logging
+import os
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from config import Config
+from ffmpeg_runner import run_ffmpeg
+from http_session import get_http_pool
+from metrics import RETRIES
+from retry import PERMANENT, classify
+
+# Contenedores que FFmpeg puede leer de una tubería (sin saltar al final del archivo).
+# Un MP4 progresivo tiene el índice (moov) al final: no se puede remuxar en streaming.
+STREAMABLE_EXTS = ('webm', 'mkv', 'ts', 'flv')
+
+
+class StreamingNotSupported(Exception):
+    """Los formatos elegidos no se pueden remuxar en streaming: hay que usar la descarga normal."""
+
+
+class StreamingDownloadError(Exception):
+    """Se cortó la transferencia de una entrada y no se pudo retomar."""
+
+
+def stream_formats(info):
+    """
+    Formatos a pasar por la tubería (uno, o video + audio) si el resultado es
+    remuxable en streaming; None si conviene la descarga normal.
+    """
+    if not info:
+        return None
+    formats = info.get('requested_formats') or [info]
+    if len(formats) == 1 and formats[0].get('ext') == 'mp4':
+        return None  # ya es MP4: yt-dlp lo escribe una sola vez de todos modos
+    if len(formats) > 2 or (len(formats) == 2 and os.name != 'posix'):
+        return None  # la segunda entrada va por un descriptor heredado (pipe:N)
+    for fmt in formats:
+        if fmt.get('protocol') not in ('http', 'https') or not fmt.get('url'):
+            return None
+        if fmt.get('ext') not in STREAMABLE_EXTS and not (fmt.get('container') or '').endswith('_dash'):
+            return None
+    return formats
+
+
+class StreamingRemuxer:
+    """
+    Descarga las entradas de un video y las pasa por tuberías directamente al muxer
+    de FFmpeg, que escribe un único MP4 fragmentado. No hay archivos intermedios:
+    cada byte se escribe a disco una sola vez (en el .streampart del MP4 final; no el
+    .part de yt-dlp, que lo tomaría por una descarga suya si se vuelve a la normal).
+
+    Un corte de red se retoma con un rango desde el último byte enviado. Si el trabajo
+    se cancela, agota los reintentos de red o el proceso muere, el .streampart se conserva:
+    el siguiente intento lo recorta al último fragmento y sigue desde ahí (ver _resume).
+    """
+    def __init__(self, max_retries=3, chunk_size=256 * 1024, timeout=30, session=None, rate_limiter=None):
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self.session = session or get_http_pool()
+        self.rate_limiter = rate_limiter
+
+    def remux(self, formats, dest_path, progress_callback=None, cancel_event=None, on_bytes=None):
+        """
+        Remuxa 'formats' (ver stream_formats) en 'dest_path' vía un .streampart y devuelve la ruta final.
+        progress_callback recibe eventos 'downloading' como los de SafeProgressHook;
+        on_bytes(n) se llama por cada bloque recibido.
+        """
+        import ffmpeg
+
+        part_path = f"{dest_path}.streampart"
+        if os.path.exists(part_path):
+            point = resume_point(part_path)
+            if point:
+                return self._resume(formats, dest_path, part_path, point, progress_callback, cancel_event, on_bytes)
+            _remove(part_path)  # cortado antes del primer fragmento: no hay nada que conservar
+
+        read_fds, write_fds = [], []
+        inputs = [ffmpeg.input('pipe:0')]
+        for _ in formats[1:]:
+            read_fd, write_fd = os.pipe()
+            read_fds.append(read_fd)
+            write_fds.append(write_fd)
+            inputs.append(ffmpeg.input(f'pipe:{read_fd}'))
+        streams = [stream for source in inputs for stream in (source['v?'], source['a?'])]
+        graph = ffmpeg.output(*streams, part_path, c='copy', f='mp4', movflags=Config.STREAMING_MOVFLAGS)
+
+        state = {'error': None}
+        on_chunk = self._progress_reporter(formats, dest_path, part_path, progress_callback, on_bytes)
+        feeders = []
+
+        def feed(fmt, pipe):
+            try:
+                with pipe:
+                    self._feed(fmt, pipe, on_chunk, cancel_event)
+            except Exception as e:
+                if state['error'] is None:
+                    state['error'] = e
+
+        def start(process):
+            pipes = [process.stdin] + [os.fdopen(fd, 'wb') for fd in write_fds]
+            write_fds.clear()
+            for fmt, pipe in zip(formats, pipes):
+                thread = threading.Thread(target=feed, args=(fmt, pipe), name='stream-feeder', daemon=True)
+                thread.start()
+                feeders.append(thread)
+
+        try:
+            run_ffmpeg(graph, cancel_event=cancel_event, filename=str(dest_path), on_start=start, pass_fds=tuple(read_fds))
+        except Exception as e:
+            if not _resumable(state['error'] or e, cancel_event):
+                _remove(part_path)
+            raise
+        finally:
+            for fd in read_fds + write_fds:
+                _close(fd)
+            for thread in feeders:
+                thread.join(timeout=5)
+
+        # FFmpeg termina bien también si una entrada se cortó (ve fin de archivo): hay que revisarlo
+        if state['error'] is not None:
+            if not _resumable(state['error'], cancel_event):
+                _remove(part_path)
+            raise state['error']
+        return self._finish(dest_path, part_path, progress_callback)
+
+    def _resume(self, formats, dest_path, part_path, point, progress_callback, cancel_event, on_bytes):
+        """
+        Sigue un remux interrumpido: recorta el .streampart al inicio de su último fragmento y
+        FFmpeg lee las entradas desde ese instante (con rangos HTTP, '-ss' antes de la
+        entrada). Los fragmentos nuevos se agregan al .streampart con la numeración que sigue;
+        su moov y su ftyp se descartan (son los mismos que ya tiene el archivo).
+        Requiere 'default_base_moof' en STREAMING_MOVFLAGS: así cada fragmento es
+        autocontenido y se puede copiar tal cual a otra posición del archivo.
+        """
+        import ffmpeg
+
+        offset, start_time, sequence, timescales = point
+        with open(part_path, 'r+b') as f:
+            f.truncate(offset)
+        self.logger.info(f"Retomando remux en streaming desde {start_time:.1f} s: {os.path.basename(part_path)}")
+
+        inputs = []
+        for fmt in formats:
+            if self.rate_limiter and not self.rate_limiter.acquire_request(fmt['url'], cancel_event):
+                raise Exception("Descarga cancelada por el usuario.")
+            headers = ''.join(f"{key}: {value}\r\n" for key, value in (fmt.get('http_headers') or {}).items())
+            inputs.append(ffmpeg.input(fmt['url'], ss=start_time, **({'headers': headers} if headers else {})))
+        read_fd, write_fd = os.pipe()
+        streams = [stream for source in inputs for stream in (source['v?'], source['a?'])]
+        graph = ffmpeg.output(*streams, f'pipe:{write_fd}', c='copy', f='mp4', output_ts_offset=start_time,
+                              movflags=f"{Config.STREAMING_MOVFLAGS}+frag_discont")
+
+        on_chunk = self._progress_reporter(formats, dest_path, part_path, progress_callback, on_bytes, offset)
+        state = {'error': None}
+        host = urlparse(formats[0]['url']).netloc
+        reader = os.fdopen(read_fd, 'rb')
+
+        def append():
+            try:
+                with reader, open(part_path, 'ab') as part:
+                    _append_fragments(reader, part, sequence, timescales, on_chunk, self.rate_limiter, host, cancel_event)
+            except Exception as e:
+                state['error'] = e
+
+        appender = threading.Thread(target=append, name='stream-resume', daemon=True)
+
+        def start(process):
+            process.stdin.close()
+            _close(write_fd)  # solo FFmpeg escribe: al terminar, el lector ve fin de archivo
+            appender.start()
+
+        try:
+            run_ffmpeg(graph, cancel_event=cancel_event, filename=str(dest_path), on_start=start, pass_fds=(write_fd,))
+        except Exception as e:
+            error = state['error'] or e
+            if not _resumable(error, cancel_event):
+                _remove(part_path)
+            raise error
+        finally:
+            _close(write_fd)
+            if appender.ident:
+                appender.join()  # FFmpeg ya terminó: el lector llega al fin de la tubería
+            reader.close()
+        if state['error'] is not None:
+            if not _resumable(state['error'], cancel_event):
+                _remove(part_path)
+            raise state['error']
+        return self._finish(dest_path, part_path, progress_callback)
+
+    def _finish(self, dest_path, part_path, progress_callback):
+        os.replace(part_path, dest_path)
+        if progress_callback:
+            progress_callback({'status': 'finished', 'filename': str(dest_path)})
+        return str(dest_path)
+
+    def _progress_reporter(self, formats, dest_path, part_path, progress_callback, on_bytes, already=0):
+        """on_chunk(n) para los bloques recibidos: cuenta bytes y emite 'downloading' cada segundo."""
+        total = sum(fmt.get('filesize') or fmt.get('filesize_approx') or 0 for fmt in formats) or None
+        state = {'downloaded': already, 'received': 0, 'last_report': 0.0, 'started': time.monotonic()}
+        lock = threading.Lock()
+
+        def on_chunk(count):
+            if on_bytes:
+                on_bytes(count)
+            with lock:
+                state['downloaded'] += count
+                state['received'] += count
+                now = time.monotonic()
+                if not progress_callback or now - state['last_report'] < 1.0:
+                    return
+                state['last_report'] = now
+                downloaded, received = state['downloaded'], state['received']
+            elapsed = max(now - state['started'], 1e-6)
+            progress_callback({
+                'status': 'downloading', 'percentage': min(100.0, downloaded / total * 100) if total else 0,
+                'downloaded_bytes': downloaded, 'total_bytes': total or 0,
+                'speed': int(received / elapsed), 'filename': str(dest_path), 'tmpfilename': part_path,
+            })
+
+        return on_chunk
+
+    def _feed(self, fmt, pipe, on_chunk, cancel_event):
+        """Copia una entrada HTTP a la tubería, retomando con Range si se corta la conexión."""
+        url = fmt['url']
+        sent = 0
+        attempt = 0
+        while True:
+            try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire_request(url, cancel_event)
+                headers = dict(fmt.get('http_headers') or {})
+                if sent:
+                    headers['Range'] = f"bytes={sent}-"
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code >= 400:
+                        # Con el texto de yt-dlp ('HTTP Error 404: ...') para que retry.classify lo reconozca
+                        raise requests.HTTPError(f"HTTP Error {response.status_code}: {response.reason}", response=response)
+                    if sent and response.status_code != 206:
+                        raise StreamingDownloadError(f"No se puede retomar la entrada (HTTP {response.status_code})")
+                    for chunk in response.iter_content(self.chunk_size):
+                        if cancel_event and cancel_event.is_set():
+                            raise Exception("Descarga cancelada por el usuario.")
+                        pipe.write(chunk)
+                        sent += len(chunk)
+                        if self.rate_limiter:
+                            self.rate_limiter.consume_bytes(url, len(chunk), cancel_event)
+                        on_chunk(len(chunk))
+                return
+            except requests.RequestException as e:
+                if classify(e) == PERMANENT:
+                    raise  # 404, 403...: ningún reintento lo arregla
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise StreamingDownloadError(f"La entrada agotó los reintentos: {e}") from e
+                self.logger.debug(f"Reintentando entrada desde el byte {sent} ({attempt}/{self.max_retries}): {e}")
+                RETRIES.inc(component='streaming', host=urlparse(url).netloc)
+                time.sleep(min(2 ** attempt, 10))
+
+
+def _resumable(error, cancel_event=None):
+    """True si el .streampart sirve para retomar: cancelación o corte de red que no es permanente."""
+    if cancel_event is not None and cancel_event.is_set():
+        return True
+    return isinstance(error, (StreamingDownloadError, requests.RequestException)) and classify(error) != PERMANENT
+
+
+# --- MP4 fragmentado (cajas ISO BMFF) ---
+
+def _read_box_header(stream):
+    """(tipo, tamaño total o None si llega al final, cabecera cruda) o None al final del flujo."""
+    header = stream.read(8)
+    if len(header) < 8:
+        return None
+    size, kind = struct.unpack('>I4s', header)
+    if size == 1:
+        large = stream.read(8)
+        if len(large) < 8:
+            return None
+        header += large
+        size = struct.unpack('>Q', large)[0]
+    return kind.decode('latin-1'), (size or None), header
+
+
+def _child_boxes(data):
+    """(tipo, inicio del cuerpo, fin) de las cajas contenidas en 'data'."""
+    offset = 0
+    while offset + 8 <= len(data):
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header or offset + size > len(data):
+            return
+        yield kind.decode('latin-1'), offset + header, offset + size
+        offset += size
+
+
+def _versioned_field(data, start, v0_offset, v1_offset):
+    """Campo de 32 bits de una 'full box' cuya posición depende de la versión."""
+    return struct.unpack_from('>I', data, start + (v1_offset if data[start] == 1 else v0_offset))[0]
+
+
+def _track_timescales(moov):
+    """{track_id: timescale} de las pistas de un moov."""
+    timescales = {}
+    for kind, start, end in _child_boxes(moov):
+        if kind != 'trak':
+            continue
+        trak = moov[start:end]
+        track_id = timescale = None
+        for child, child_start, child_end in _child_boxes(trak):
+            if child == 'tkhd':
+                track_id = _versioned_field(trak, child_start, 12, 20)
+            elif child == 'mdia':
+                mdia = trak[child_start:child_end]
+                for box, box_start, _ in _child_boxes(mdia):
+                    if box == 'mdhd':
+                        timescale = _versioned_field(mdia, box_start, 12, 20)
+        if track_id and timescale:
+            timescales[track_id] = timescale
+    return timescales
+
+
+def _fragment_start(moof):
+    """(número de secuencia, {track_id: baseMediaDecodeTime}) de un moof."""
+    sequence, decode_times = None, {}
+    for kind, start, end in _child_boxes(moof):
+        if kind == 'mfhd':
+            sequence = struct.unpack_from('>I', moof, start + 4)[0]
+        elif kind == 'traf':
+            traf = moof[start:end]
+            track_id = decode_time = None
+            for child, child_start, _ in _child_boxes(traf):
+                if child == 'tfhd':
+                    track_id = struct.unpack_from('>I', traf, child_start + 4)[0]
+                elif child == 'tfdt':
+                    fmt = '>Q' if traf[child_start] == 1 else '>I'
+                    decode_time = struct.unpack_from(fmt, traf, child_start + 4)[0]
+            if track_id is not None and decode_time is not None:
+                decode_times[track_id] = decode_time
+    return sequence, decode_times
+
+
+def resume_point(part_path):
+    """
+    Desde dónde retomar un MP4 fragmentado a medias: (bytes a conservar, segundo de
+    inicio, número de secuencia, {track_id: timescale}) o None si no tiene ni un
+    fragmento. Se descarta el último fragmento (puede estar incompleto); su tfdt es el
+    instante exacto desde el que seguir y, con frag_keyframe, cae en un keyframe.
+    """
+    timescales, last_moof = {}, None
+    file_size = os.path.getsize(part_path)
+    with open(part_path, 'rb') as f:
+        offset = 0
+        while True:
+            header = _read_box_header(f)
+            if header is None:
+                break
+            kind, size, raw = header
+            if size is None or size < len(raw) or offset + size > file_size:
+                break  # caja cortada
+            if kind == 'moov':
+                timescales = _track_timescales(f.read(size - len(raw)))
+            elif kind == 'moof':
+                last_moof = (offset, f.read(size - len(raw)))
+            else:
+                f.seek(size - len(raw), os.SEEK_CUR)
+            offset += size
+    if not last_moof or not timescales:
+        return None
+    offset, moof = last_moof
+    sequence, decode_times = _fragment_start(moof)
+    times = [decode_time / timescales[track] for track, decode_time in decode_times.items() if timescales.get(track)]
+    if sequence is None or not times:
+        return None
+    return offset, min(times), sequence, timescales
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise StreamingDownloadError("FFmpeg terminó a mitad de un fragmento")
+    return data
+
+
+def _append_fragments(stream, part, sequence, timescales, on_chunk, rate_limiter, host, cancel_event, chunk_size=256 * 1024):
+    """Copia los fragmentos (moof + mdat) de un MP4 fragmentado a 'part', renumerados desde 'sequence'."""
+    while True:
+        header = _read_box_header(stream)
+        if header is None:
+            return
+        kind, size, raw = header
+        if size is None:
+            raise StreamingDownloadError(f"Caja '{kind}' sin tamaño en la salida de FFmpeg")
+        remaining = size - len(raw)
+        if kind in ('ftyp', 'moov', 'mfra', 'sidx'):
+            body = _read_exact(stream, remaining)
+            if kind == 'moov' and _track_timescales(body) != timescales:
+                raise StreamingNotSupported("Las pistas del remux retomado no coinciden con las del .streampart")
+            continue
+        if kind == 'moof':
+            moof = bytearray(_read_exact(stream, remaining))
+            for child, start, _ in _child_boxes(moof):
+                if child == 'mfhd':
+                    struct.pack_into('>I', moof, start + 4, sequence)
+            sequence += 1
+            part.write(raw + moof)
+            continue
+        part.write(raw)
+        while remaining:
+            if cancel_event and cancel_event.is_set():
+                raise Exception("Descarga cancelada por el usuario.")
+            chunk = _read_exact(stream, min(chunk_size, remaining))
+            part.write(chunk)
+            remaining -= len(chunk)
+            if rate_limiter:
+                # Con copia de streams lo que sale de FFmpeg es lo que entra: frenar la lectura frena la red
+                rate_limiter.consume_bytes(host, len(chunk), cancel_event)
+            on_chunk(len(chunk))
+
+
+def _close(fd):
+    try:
+        os.close(fd)
+    except OSError:
+        pass
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,110 @@
+# tests/test_http_session.py
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_session import HTTPSessionPool
+
+LAST_MODIFIED = 'Sun, 18 Oct 2026 12:00:00 GMT'
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    """Una página con ETag y Last-Modified que responde 304 a las peticiones condicionales."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        validators = self.path != '/plain'
+        if server.etag:
+            not_modified = self.headers.get('If-None-Match') == server.etag
+        else:
+            not_modified = self.headers.get('If-Modified-Since') == LAST_MODIFIED
+        if validators and not_modified:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        if validators and server.etag:
+            self.send_header('ETag', server.etag)
+        if validators:
+            self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _PageHandler)
+    httpd.daemon_threads = True
+    httpd.requests, httpd.body, httpd.etag = [], b'<html>episodios 1-24</html>', '"v1"'
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_reuses_body_on_304(server):
+    httpd, base_url = server
+    pool = HTTPSessionPool()
+
+    assert pool.fetch(f"{base_url}/serie") == httpd.body
+    assert pool.fetch(f"{base_url}/serie") == httpd.body
+
+    assert 'If-None-Match' not in httpd.requests[0]
+    assert httpd.requests[1]['If-None-Match'] == '"v1"'
+    assert httpd.requests[1]['If-Modified-Since'] == LAST_MODIFIED
+
+
+def test_fetch_returns_new_body_when_page_changes(server):
+    httpd, base_url = server
+    pool = HTTPSessionPool()
+    pool.fetch(f"{base_url}/serie")
+
+    httpd.body, httpd.etag = b'<html>episodios 1-25</html>', '"v2"'
+
+    assert pool.fetch(f"{base_url}/serie") == b'<html>episodios 1-25</html>'
+    assert pool.fetch(f"{base_url}/serie") == b'<html>episodios 1-25</html>'
+    assert httpd.requests[2]['If-None-Match'] == '"v2"'
+
+
+def test_fetch_revalidates_with_last_modified_only(server):
+    httpd, base_url = server
+    httpd.etag = None
+    pool = HTTPSessionPool()
+
+    pool.fetch(f"{base_url}/serie")
+
+    assert pool.fetch(f"{base_url}/serie") == httpd.body
+    assert 'If-None-Match' not in httpd.requests[1]
+    assert httpd.requests[1]['If-Modified-Since'] == LAST_MODIFIED
+
+
+def test_fetch_without_validators_is_a_plain_get(server):
+    httpd, base_url = server
+    pool = HTTPSessionPool()
+
+    pool.fetch(f"{base_url}/plain")
+    pool.fetch(f"{base_url}/plain")
+
+    assert all('If-None-Match' not in headers and 'If-Modified-Since' not in headers for headers in httpd.requests)
+
+
+def test_fetch_raises_http_errors(server):
+    _, base_url = server
+
+    with pytest.raises(requests.HTTPError):
+        HTTPSessionPool().fetch(f"{base_url}/missing")
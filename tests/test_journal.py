@@ -0,0 +1,55 @@
+# tests/test_journal.py
+import os
+
+from journal import JobJournal
+
+
+def _journal(tmp_path):
+    return JobJournal(tmp_path / '.jobs_journal.jsonl')
+
+
+def test_open_compacts_finished_jobs(tmp_path):
+    journal = _journal(tmp_path)
+    done = journal.new_job('http://example.com/a')
+    journal.update(done, 'done', filename='a.mp4')
+    pending = journal.new_job('http://example.com/b')
+    journal.close()
+
+    reopened = _journal(tmp_path)
+    lines = (tmp_path / '.jobs_journal.jsonl').read_text(encoding='utf-8').splitlines()
+    reopened.close()
+
+    assert [job['id'] for job in reopened.unfinished()] == [pending]
+    assert len(lines) == 1
+
+
+def test_open_does_not_compact_a_journal_in_use(tmp_path):
+    path = tmp_path / '.jobs_journal.jsonl'
+    writer = _journal(tmp_path)
+    finished = writer.new_job('http://example.com/a')
+    writer.update(finished, 'done')
+    inode = os.stat(path).st_ino
+
+    reader = _journal(tmp_path)
+    # Lo que el primero agrega después tiene que llegar al mismo archivo
+    late = writer.new_job('http://example.com/late')
+    reader.close()
+    writer.close()
+
+    assert os.stat(path).st_ino == inode
+    assert reader.unfinished() == []
+    reopened = _journal(tmp_path)
+    reopened.close()
+    assert [job['id'] for job in reopened.unfinished()] == [late]
+
+
+def test_compacts_again_once_the_other_writer_closes(tmp_path):
+    path = tmp_path / '.jobs_journal.jsonl'
+    writer = _journal(tmp_path)
+    writer.update(writer.new_job('http://example.com/a'), 'failed', error='404')
+    _journal(tmp_path).close()
+    writer.close()
+
+    _journal(tmp_path).close()
+
+    assert path.read_text(encoding='utf-8') == ''
@@ -0,0 +1,37 @@
+# tests/test_logging.py
+import json
+import logging
+import queue
+
+from utils import JsonFormatter, LogQueueHandler
+
+
+def _enqueue(log_queue, logger_name):
+    logger = logging.getLogger(logger_name)
+    logger.propagate = False
+    handler = LogQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        try:
+            raise ValueError("falló el remux")
+        except ValueError:
+            logger.exception("Error en %s", "job 7")
+    finally:
+        logger.removeHandler(handler)
+    return log_queue.get_nowait()
+
+
+def test_json_log_keeps_exception_through_queue():
+    record = _enqueue(queue.SimpleQueue(), 'tests.logging.json')
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry['message'] == "Error en job 7"
+    assert 'ValueError: falló el remux' in entry['exception']
+
+
+def test_text_log_prints_traceback_once():
+    record = _enqueue(queue.SimpleQueue(), 'tests.logging.text')
+    text = logging.Formatter('%(levelname)s %(message)s').format(record)
+
+    assert text.startswith("ERROR Error en job 7\nTraceback")
+    assert text.count('ValueError: falló el remux') == 1
@@ -0,0 +1,29 @@
+# tests/test_outputs.py
+import pytest
+
+from outputs import build_outputs, plan_outputs
+
+
+def _filters(source_height):
+    targets = plan_outputs('/tmp/video.mkv', '480p,720p')
+    args = build_outputs('/tmp/video.mkv', targets, source_height=source_height).compile()
+    return args[args.index('-filter_complex') + 1] if '-filter_complex' in args else ''
+
+
+def test_renditions_scale_down_known_source():
+    graph = _filters(1080)
+
+    assert 'scale=-2:480' in graph
+    assert 'scale=-2:720' in graph
+
+
+def test_renditions_never_upscale_known_source():
+    graph = _filters(480)
+
+    assert 'scale=-2:720' not in graph
+    assert 'scale=-2:480' not in graph
+
+
+@pytest.mark.parametrize('height', [480, 720])
+def test_unknown_source_height_is_capped_by_ffmpeg(height):
+    assert f'scale=-2:min(ih\\,{height})' in _filters(None)
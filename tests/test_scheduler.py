@@ -0,0 +1,46 @@
+# tests/test_scheduler.py
+from retry import CircuitBreakers, RetryPolicy
+from scheduler import DownloadScheduler
+
+
+class _FlakyDownloader:
+    """Falla con un error transitorio las primeras 'failures' veces."""
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def check_archive(self, url, progress_callback, convert_format):
+        return False
+
+    def download_episode_safe(self, url, progress_callback, convert_format, cancel_event, progress_slot=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            progress_callback({'status': 'error', 'error_message': f"HTTP Error 503: intento {self.calls}"})
+            return False
+        progress_callback({'status': 'finished', 'filename': '/tmp/video.mp4'})
+        return True
+
+
+def _run(downloader, max_attempts):
+    events = []
+    with DownloadScheduler(downloader, max_workers=1, postprocess_workers=0,
+                           retry_policy=RetryPolicy(max_attempts=max_attempts, base_delay=0.01),
+                           breakers=CircuitBreakers(failure_threshold=100)) as scheduler:
+        job = scheduler.submit('http://example.com/video', 'none', events.append)
+        scheduler.join()
+    return job, [event['status'] for event in events]
+
+
+def test_error_before_retry_is_not_published():
+    job, statuses = _run(_FlakyDownloader(failures=2), max_attempts=3)
+
+    assert job.status == 'finished'
+    assert statuses == ['retrying', 'retrying', 'finished']
+
+
+def test_error_is_published_once_when_retries_run_out():
+    job, statuses = _run(_FlakyDownloader(failures=5), max_attempts=1)
+
+    assert job.status == 'error'
+    assert statuses == ['retrying', 'error']
+    assert job.error_message == "HTTP Error 503: intento 2"
@@ -0,0 +1,147 @@
+# tests/test_segmented.py
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from diskspace import SpaceManager
+from segmented import SegmentedDownloader, SegmentedNotSupported
+
+SIZE = 3 * 1024 * 1024 + 12345  # no múltiplo del tamaño de segmento
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Sirve 'data' con soporte de Range (o sin él si ranges=False)."""
+    protocol_version = 'HTTP/1.1'
+    data = b''
+    ranges = True
+    etag = '"v1"'
+
+    def do_GET(self):
+        start, end = 0, len(self.data) - 1
+        header = self.headers.get('Range')
+        if self.ranges and header and header.startswith('bytes='):
+            first, _, last = header[6:].partition('-')
+            start = int(first or 0)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(self.data)}")
+        else:
+            self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        try:
+            self.wfile.write(self.data[start:end + 1])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Las cancelaciones cortan conexiones keep-alive a propósito
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@pytest.fixture
+def server():
+    handler = type('Handler', (_RangeHandler,), {'data': os.urandom(SIZE)})
+    httpd = _QuietServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f"http://127.0.0.1:{httpd.server_port}/file.bin"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _downloader(**kwargs):
+    return SegmentedDownloader(connections=4, min_segment_size=256 * 1024, chunk_size=64 * 1024, **kwargs)
+
+
+def test_download_is_byte_identical(server, tmp_path):
+    handler, url = server
+    dest = tmp_path / 'out.bin'
+    received = []
+
+    assert _downloader().download(url, str(dest), on_bytes=received.append) == str(dest)
+
+    assert dest.read_bytes() == handler.data
+    assert sum(received) == SIZE
+    assert not (tmp_path / 'out.bin.segpart').exists()
+    assert not (tmp_path / 'out.bin.segpart.json').exists()
+
+
+def test_interrupted_download_resumes(server, tmp_path):
+    handler, url = server
+    dest = tmp_path / 'out.bin'
+    cancel_event = threading.Event()
+    first = []
+
+    def on_bytes(count):
+        first.append(count)
+        if sum(first) >= SIZE // 3:
+            cancel_event.set()
+
+    with pytest.raises(Exception, match='cancelada'):
+        _downloader().download(url, str(dest), cancel_event=cancel_event, on_bytes=on_bytes)
+    assert (tmp_path / 'out.bin.segpart').exists()
+    assert (tmp_path / 'out.bin.segpart.json').exists()
+
+    second = []
+    _downloader().download(url, str(dest), on_bytes=second.append)
+
+    assert dest.read_bytes() == handler.data
+    assert sum(second) < SIZE  # lo ya escrito no se volvió a pedir
+
+
+def test_changed_file_restarts_from_zero(server, tmp_path):
+    handler, url = server
+    dest = tmp_path / 'out.bin'
+    cancel_event = threading.Event()
+
+    def on_bytes(count):
+        cancel_event.set()
+
+    with pytest.raises(Exception, match='cancelada'):
+        _downloader().download(url, str(dest), cancel_event=cancel_event, on_bytes=on_bytes)
+    handler.etag = '"v2"'
+    handler.data = os.urandom(SIZE)
+
+    received = []
+    _downloader().download(url, str(dest), on_bytes=received.append)
+
+    assert dest.read_bytes() == handler.data
+    assert sum(received) == SIZE
+
+
+def test_server_without_ranges_discards_leftovers(server, tmp_path):
+    handler, url = server
+    handler.ranges = False
+    dest = tmp_path / 'out.bin'
+    (tmp_path / 'out.bin.segpart').write_bytes(b'\0' * SIZE)
+    (tmp_path / 'out.bin.segpart.json').write_text('{}')
+
+    with pytest.raises(SegmentedNotSupported):
+        _downloader().download(url, str(dest))
+
+    assert not (tmp_path / 'out.bin.segpart').exists()
+    assert not (tmp_path / 'out.bin.segpart.json').exists()
+
+
+def test_reservation_counts_the_file_once(server, tmp_path):
+    handler, url = server
+    reservation = SpaceManager(margin=0).reserve(tmp_path, SIZE)
+
+    _downloader().download(url, str(tmp_path / 'out.bin'), reservation=reservation)
+
+    # Preasignado o escrito bloque a bloque, el archivo descuenta su tamaño una sola vez
+    assert reservation.written == SIZE
+    assert reservation.outstanding == 0
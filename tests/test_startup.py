@@ -0,0 +1,54 @@
+# tests/test_startup.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmark import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Presupuesto de 'import main' (hoy ronda los 35 ms): el CLI se llama miles de veces por día
+IMPORT_BUDGET_MS = 150
+
+
+def _python(*args, cwd=ROOT):
+    return subprocess.run([sys.executable, *args], cwd=cwd, check=True, capture_output=True, text=True)
+
+
+def test_import_main_does_not_load_heavy_modules():
+    result = _python('-c', f"import sys, main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+
+    assert result.stdout.strip() == ''
+
+
+def test_import_main_within_budget():
+    timings = []
+    for _ in range(3):
+        result = _python('-X', 'importtime', '-c', 'import main')
+        # Formato: 'import time: <propio> | <acumulado> | <módulo>' (microsegundos)
+        line = next(line for line in result.stderr.splitlines() if line.rstrip().endswith('| main'))
+        timings.append(int(line.split('|')[1]) / 1000)
+
+    # El mejor de tres: descarta el ruido de la máquina, no una regresión real
+    assert min(timings) <= IMPORT_BUDGET_MS, f"import main tardó {min(timings):.0f} ms (presupuesto: {IMPORT_BUDGET_MS} ms)"
+
+
+@pytest.mark.parametrize('args', [['--help'], ['--version'], ['--list-sites']])
+def test_fast_commands_succeed(args, tmp_path):
+    result = _python(os.path.join(ROOT, 'main.py'), *args, cwd=tmp_path)  # el log queda en tmp_path
+
+    assert result.returncode == 0
+
+
+def test_list_sites_reports_table_errors(monkeypatch, capsys):
+    import main
+    import sites
+
+    def broken(extended):
+        raise RuntimeError("sin tabla")
+
+    monkeypatch.setattr(sites, 'get_site_table', broken)
+    main.list_supported_sites()
+
+    assert "Error listando sitios: sin tabla" in capsys.readouterr().out
@@ -0,0 +1,147 @@
+# tests/test_streaming.py
+import io
+import shutil
+import struct
+
+import pytest
+
+from benchmark import MediaLibrary, MediaServer
+from streaming import (StreamingDownloadError, StreamingNotSupported, StreamingRemuxer, _append_fragments,
+                       resume_point)
+
+FFMPEG = shutil.which('ffmpeg')
+TIMESCALES = {1: 15360, 2: 48000}
+
+
+# --- MP4 fragmentado sintético ---
+
+def _box(kind, *payload):
+    body = b''.join(payload)
+    return struct.pack('>I4s', 8 + len(body), kind.encode('latin-1')) + body
+
+
+def _full_box(kind, version, *payload):
+    return _box(kind, struct.pack('>B3x', version), *payload)
+
+
+def _moov(timescales):
+    traks = [
+        _box('trak',
+             _full_box('tkhd', 0, struct.pack('>III', 0, 0, track_id), bytes(68)),
+             _box('mdia', _full_box('mdhd', 0, struct.pack('>IIII', 0, 0, timescale, 0), bytes(4))))
+        for track_id, timescale in timescales.items()
+    ]
+    return _box('moov', _full_box('mvhd', 0, bytes(96)), *traks)
+
+
+def _fragment(sequence, seconds, payload):
+    trafs = [
+        _box('traf', _full_box('tfhd', 0, struct.pack('>I', track_id)),
+             _full_box('tfdt', 1, struct.pack('>Q', int(seconds * timescale))))
+        for track_id, timescale in TIMESCALES.items()
+    ]
+    return _box('moof', _full_box('mfhd', 0, struct.pack('>I', sequence)), *trafs) + _box('mdat', payload)
+
+
+def _header(timescales=TIMESCALES):
+    return _box('ftyp', b'isom', bytes(4), b'isomiso6') + _moov(timescales)
+
+
+def _sequences(data):
+    """Números de secuencia de los moof (con su mdat) en el orden del archivo."""
+    found, offset = [], 0
+    while offset < len(data):
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        if kind == b'moof':
+            found.append(struct.unpack_from('>I', data, offset + 8 + 8 + 4)[0])
+        offset += size
+    return found
+
+
+def test_resume_point_drops_the_cut_fragment(tmp_path):
+    complete = _header() + _fragment(1, 0, b'a' * 1000) + _fragment(2, 2.0, b'b' * 1000)
+    part = tmp_path / 'out.mp4.streampart'
+    part.write_bytes(complete + _fragment(3, 4.0, b'c' * 1000)[:-300])
+
+    offset, start_time, sequence, timescales = resume_point(str(part))
+
+    assert offset == len(complete)
+    assert start_time == pytest.approx(4.0)
+    assert sequence == 3
+    assert timescales == TIMESCALES
+
+
+def test_resume_point_starts_from_earliest_track(tmp_path):
+    fragment = _fragment(5, 6.0, b'x' * 10)
+    # La pista de audio arranca un poco antes que la de video
+    fragment = fragment.replace(struct.pack('>Q', 6 * 48000), struct.pack('>Q', int(5.9 * 48000)))
+    part = tmp_path / 'out.mp4.streampart'
+    part.write_bytes(_header() + fragment)
+
+    assert resume_point(str(part))[1] == pytest.approx(5.9)
+
+
+@pytest.mark.parametrize('content', [b'', _header(), _header()[:-10]])
+def test_resume_point_without_fragments(tmp_path, content):
+    part = tmp_path / 'out.mp4.streampart'
+    part.write_bytes(content)
+
+    assert resume_point(str(part)) is None
+
+
+def test_append_fragments_renumbers_and_skips_headers():
+    stream = io.BytesIO(_header() + _fragment(1, 4.0, b'c' * 5000) + _fragment(2, 6.0, b'd' * 3000))
+    part = io.BytesIO()
+    received = []
+
+    _append_fragments(stream, part, 3, TIMESCALES, received.append, None, 'host', None, chunk_size=1024)
+
+    data = part.getvalue()
+    assert data == _fragment(3, 4.0, b'c' * 5000) + _fragment(4, 6.0, b'd' * 3000)
+    assert _sequences(data) == [3, 4]
+    assert sum(received) == 8000
+
+
+def test_append_fragments_rejects_other_tracks():
+    stream = io.BytesIO(_header({1: 90000}) + _fragment(1, 4.0, b'c' * 10))
+
+    with pytest.raises(StreamingNotSupported):
+        _append_fragments(stream, io.BytesIO(), 3, TIMESCALES, lambda count: None, None, 'host', None)
+
+
+def test_append_fragments_detects_cut_output():
+    stream = io.BytesIO(_header() + _fragment(1, 4.0, b'c' * 5000)[:-100])
+
+    with pytest.raises(StreamingDownloadError):
+        _append_fragments(stream, io.BytesIO(), 3, TIMESCALES, lambda count: None, None, 'host', None)
+
+
+# --- Con FFmpeg real ---
+
+@pytest.mark.skipif(FFMPEG is None, reason="requiere el binario de FFmpeg")
+def test_interrupted_remux_resumes_to_full_duration(tmp_path):
+    import ffmpeg
+
+    root = tmp_path / 'www'
+    # 30 s con el GOP por defecto de x264 (~8 s): varios fragmentos para cortar a mitad
+    MediaLibrary(root, ffmpeg=FFMPEG).container('clip.mkv', seconds=30)
+    remuxer = StreamingRemuxer(max_retries=0)
+    full, dest = tmp_path / 'full.mp4', tmp_path / 'out.mp4'
+    part = tmp_path / 'out.mp4.streampart'
+
+    with MediaServer(root) as server:
+        formats = [{'url': f"{server.base_url}/media/clip.mkv", 'ext': 'mkv', 'protocol': 'http'}]
+        remuxer.remux(formats, str(full))
+        # Corte simulado: el .streampart termina a mitad de un fragmento
+        data = full.read_bytes()
+        part.write_bytes(data[:len(data) * 2 // 3])
+        point = resume_point(str(part))
+        assert point is not None and point[1] > 0
+
+        assert remuxer.remux(formats, str(dest)) == str(dest)
+
+    assert not part.exists()
+    expected = float(ffmpeg.probe(str(full))['format']['duration'])
+    probe = ffmpeg.probe(str(dest))
+    assert float(probe['format']['duration']) == pytest.approx(expected, abs=0.5)
+    assert {stream['codec_type'] for stream in probe['streams']} == {'video', 'audio'}
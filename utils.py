@@ -3,7 +3,15 @@ import sys
 import re
 import os
 import shutil
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import queue
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from urllib.parse import urlparse
 
 from config import Config # Importamos la configuración para logging
@@ -34,19 +42,112 @@ def format_bytes(byte_count):
         n += 1
     return f"{byte_count:.2f} {power_labels[n]}B"
 
-def setup_logging(verbose=False):
-    """Configura el sistema de logging para la aplicación."""
+def parse_bytes(text):
+    """Convierte '500K', '2M', '1.5G' (o un número) a bytes. Devuelve None si no es válido."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', str(text), re.IGNORECASE)
+    if not match:
+        return None
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' KMGT'.index(unit.upper() or ' '))
+
+# Campos de contexto (job_id, url, phase...) que se agregan a cada registro del hilo/tarea actual
+_LOG_CONTEXT = contextvars.ContextVar('log_context', default={})
+_log_listener = None
+
+
+@contextmanager
+def log_context(**fields):
+    """Agrega 'fields' a todos los logs emitidos dentro del bloque (en este hilo)."""
+    token = _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _LOG_CONTEXT.reset(token)
+
+
+def current_log_context():
+    return _LOG_CONTEXT.get()
+
+
+class LogContextFilter(logging.Filter):
+    """Copia el contexto al registro en el hilo que loguea, antes de pasar por la cola."""
+    def filter(self, record):
+        for key, value in _LOG_CONTEXT.get().items():
+            # 'timings' se sigue llenando durante el trabajo: solo va en el log de cierre
+            if key != 'timings' and not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    QueueHandler que conserva el traceback: el prepare() estándar lo pega al mensaje
+    y borra exc_info, así que el JsonFormatter nunca llenaba 'exception'.
+    """
+    def prepare(self, record):
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        message = record.getMessage()
+        record = copy.copy(record)
+        # Solo datos serializables: el traceback viaja como texto en exc_text
+        record.message = record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos estructurados que haya."""
+    FIELDS = ('job_id', 'url', 'phase', 'status', 'elapsed', 'timings', 'bytes')
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname, 'logger': record.name, 'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(verbose=False, json_format=None):
+    """
+    Configura el sistema de logging para la aplicación.
+    Los hilos solo encolan registros; un hilo de fondo (QueueListener) escribe en
+    el archivo rotativo y en consola, así el I/O del log no frena las descargas.
+    """
+    global _log_listener
     log_level = logging.DEBUG if verbose else Config.LOG_LEVEL
-    
-    # Configurar el logger raíz
-    logging.basicConfig(
-        level=log_level,
-        format=Config.LOG_FORMAT,
-        handlers=[
-            logging.FileHandler(Config.LOG_FILE),
-            logging.StreamHandler(sys.stdout) # También imprime en consola
-        ]
+    root = logging.getLogger()
+    root.setLevel(log_level)
+    if _log_listener is not None:
+        return  # ya configurado (p.ej. main.py y después la GUI)
+
+    use_json = Config.LOG_JSON if json_format is None else json_format
+    file_handler = RotatingFileHandler(
+        Config.LOG_FILE, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8'
     )
+    file_handler.setFormatter(JsonFormatter() if use_json else logging.Formatter(Config.LOG_FORMAT))
+    console_handler = logging.StreamHandler(sys.stdout) # También imprime en consola
+    console_handler.setFormatter(logging.Formatter(Config.LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+    root.addHandler(queue_handler)
+    _log_listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)  # vacía la cola al salir
+
     # Deshabilitar loggers de librerías externas para evitar spam
     logging.getLogger('urllib3').setLevel(logging.WARNING)
     logging.getLogger('yt_dlp').setLevel(logging.WARNING) # yt-dlp tiene su propio logging interno
@@ -0,0 +1,482 @@
+# workers.py
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from pathlib import Path
+
+from config import Config
+from metrics import REGISTRY
+from utils import LogContextFilter, LogQueueHandler, current_log_context, log_context
+
+
+class WorkerDied(Exception):
+    """El proceso de descarga terminó a mitad de un trabajo."""
+
+
+class _WorkerProcess:
+    """Un proceso hijo con su AnimeDownloader y el extremo del padre de su tubería."""
+    def __init__(self, context, settings, index):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, settings),
+                                       name=f"download-process-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.reservations = {}  # id -> SpaceReservation que el padre mantiene para el trabajo en curso
+
+    def send(self, *message):
+        try:
+            self.conn.send(message)
+        except (OSError, ValueError) as e:
+            raise WorkerDied(f"El proceso de descarga terminó inesperadamente: {e}") from e
+
+    def receive(self, timeout=0.25):
+        """Siguiente mensaje (los registros de log se reenvían aquí) o None si no llegó ninguno."""
+        if not self.conn.poll(timeout):
+            if not self.process.is_alive():
+                raise WorkerDied(f"El proceso de descarga terminó inesperadamente (código {self.process.exitcode})")
+            return None
+        try:
+            message = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.process.join(1)
+            raise WorkerDied(f"El proceso de descarga terminó inesperadamente (código {self.process.exitcode})") from e
+        if message[0] == 'log':
+            record = message[1]
+            logging.getLogger(record.name).handle(record)
+            return None
+        return message
+
+    def release_reservations(self):
+        reservations, self.reservations = self.reservations, {}
+        for reservation in reservations.values():
+            reservation.release()
+
+    def stop(self, timeout=5):
+        self.release_reservations()
+        try:
+            self.send('stop')
+        except WorkerDied:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.conn.close()
+
+
+class ProcessPool:
+    """
+    Ejecuta los trabajos en procesos hijos en lugar de hilos, para que la parte en
+    Python de yt-dlp (extracción, fragmentos, selección de formatos) de varias
+    descargas no compita por el GIL de un único intérprete.
+
+    Cada proceso mantiene su propio AnimeDownloader caliente (sesiones de yt-dlp,
+    cachés, conexiones) y atiende un trabajo a la vez, descarga y conversión incluidas.
+    Se usa como 'downloader' de un DownloadScheduler: download_episode_safe manda la
+    URL a un proceso libre por su tubería y reenvía sus eventos de progreso, logs,
+    tiempos por fase y métricas; el cancel_event del trabajo se traduce en un mensaje
+    de control. Reintentos, cortacircuitos, diario y límites por host siguen en el
+    planificador del proceso padre, y también el RateLimiter y el SpaceManager: los
+    hijos les piden turno y reservas por la tubería (ver _ParentChannel), así los
+    límites de tasa (incluidos los cambios en caliente) y las reservas de espacio
+    valen para todos los trabajos a la vez, como con hilos.
+    """
+    def __init__(self, downloader, processes=None):
+        self.downloader = downloader
+        self.size = max(1, processes or downloader.concurrent_downloads)
+        self.logger = logging.getLogger(__name__)
+        # 'spawn' en todos los sistemas: un fork de un proceso con hilos (GUI, planificador) no es seguro
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = []
+        self._idle = []
+        self._cond = threading.Condition()
+        self._task_ids = itertools.count(1)
+        self._ids = itertools.count(1)
+        self._reservation_ids = itertools.count(1)
+        self._closed = False
+        atexit.register(self.close)
+
+    # --- Misma forma que AnimeDownloader (lo que usa DownloadScheduler) ---
+
+    def check_archive(self, url, progress_callback=None, convert_format='none', key=None):
+        return self.downloader.check_archive(url, progress_callback, convert_format, key)
+
+    def download_episode_safe(self, url, progress_callback=None, convert_format='none', cancel_event=None, progress_slot=None):
+        """Descarga y post-procesa la URL en un proceso libre. Devuelve True si terminó bien."""
+        worker = self._acquire(cancel_event)
+        if worker is None:
+            if progress_callback: progress_callback({'status': 'cancelled'})
+            return False
+        try:
+            ok = self._run(worker, url, convert_format, progress_callback, cancel_event)
+        except WorkerDied as e:
+            self.logger.error(f"{e}: {url}")
+            self._discard(worker)
+            if progress_callback: progress_callback({'status': 'error', 'error_message': str(e)})
+            return False
+        finally:
+            worker.release_reservations()  # lo que el hijo no liberó (p. ej. si murió)
+        self._release(worker)
+        if ok and self.downloader.archive:
+            self.downloader.archive.refresh()  # lo que el hijo registró en el archivo de descargas
+        return ok
+
+    def warm(self, convert_format='none', count=None):
+        """Arranca 'count' procesos (por defecto, todos) y precalienta en cada uno una sesión del perfil."""
+        with self._cond:
+            while len(self._workers) < min(count or self.size, self.size):
+                self._spawn()
+            workers, self._idle = self._idle, []
+        ready = []
+        for worker in workers:
+            try:
+                worker.send('warm', convert_format)
+                ready.append(worker)
+            except WorkerDied as e:
+                self.logger.warning(f"No se pudo precalentar un proceso de descarga: {e}")
+                self._discard(worker)
+        for worker in list(ready):
+            try:
+                self._next_message(worker)
+            except WorkerDied as e:
+                self.logger.warning(f"No se pudo precalentar un proceso de descarga: {e}")
+                self._discard(worker)
+                ready.remove(worker)
+        with self._cond:
+            self._idle.extend(ready)
+            self._cond.notify_all()
+
+    def close(self):
+        """Detiene los procesos (los trabajos en curso terminan antes: se cancelan en el planificador)."""
+        with self._cond:
+            self._closed = True
+            workers, self._workers, self._idle = self._workers, [], []
+            self._cond.notify_all()
+        for worker in workers:
+            worker.stop()
+
+    # --- Internos ---
+
+    def _run(self, worker, url, convert_format, progress_callback, cancel_event):
+        task_id = next(self._task_ids)
+        # El hijo loguea con el mismo job_id/url que el hilo del planificador
+        context = {key: value for key, value in current_log_context().items() if key != 'timings'}
+        worker.send('run', task_id, url, convert_format, context)
+        cancelled = False
+        while True:
+            if cancel_event is not None and cancel_event.is_set() and not cancelled:
+                worker.send('cancel', task_id)
+                cancelled = True
+            message = self._next_message(worker, cancel_event, timeout=0.25)
+            if message is None:
+                continue
+            kind = message[0]
+            if kind == 'event' and progress_callback:
+                progress_callback(message[2])
+            elif kind == 'done':
+                _, _, ok, timings, metrics = message
+                REGISTRY.merge(metrics)
+                job_timings = current_log_context().get('timings')
+                if job_timings is not None:
+                    for phase, elapsed in timings.items():
+                        job_timings[phase] = round(job_timings.get(phase, 0) + elapsed, 3)
+                return ok
+
+    def _next_message(self, worker, cancel_event=None, timeout=None):
+        """
+        Siguiente mensaje del hijo, atendiendo en el camino sus pedidos al limitador y al
+        gestor de espacio. Sin timeout espera hasta que llegue uno; con timeout devuelve None.
+        """
+        while True:
+            message = worker.receive()
+            if message is None:
+                if timeout is not None:
+                    return None
+                continue
+            if message[0] != 'call':
+                return message
+            _, request_id, kind, args = message
+            try:
+                result, ok = self._serve(worker, kind, args, cancel_event), True
+            except Exception as e:
+                result, ok = e, False
+            if request_id is not None:
+                worker.send('reply', request_id, ok, result)
+
+    def _serve(self, worker, kind, args, cancel_event):
+        """Un pedido de _ParentChannel, resuelto con el RateLimiter y el SpaceManager del padre."""
+        downloader = self.downloader
+        if kind == 'acquire_request':
+            return downloader.rate_limiter.acquire_request(*args, cancel_event)
+        if kind == 'consume_bytes':
+            return downloader.rate_limiter.consume_bytes(*args, cancel_event)
+        if kind == 'reserve':
+            reservation = downloader.space.reserve(*args)
+            reservation_id = next(self._reservation_ids)
+            worker.reservations[reservation_id] = reservation
+            return reservation_id
+        if kind == 'space_written':
+            reservation_id, written = args
+            if reservation_id in worker.reservations:
+                worker.reservations[reservation_id].written = written
+            return None
+        if kind == 'space_release':
+            reservation = worker.reservations.pop(args[0], None)
+            if reservation:
+                reservation.release()
+            return None
+        raise ValueError(f"Pedido desconocido del proceso de descarga: {kind}")
+
+    def _acquire(self, cancel_event):
+        """Un proceso libre (lo arranca si todavía hay hueco) o None si el trabajo se canceló esperando."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("El pool de procesos ya fue cerrado.")
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._workers) < self.size:
+                    return self._spawn(idle=False)
+                self._cond.wait(0.25)
+
+    def _release(self, worker):
+        with self._cond:
+            if self._closed:
+                worker.stop()
+                return
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _discard(self, worker):
+        with self._cond:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self._cond.notify()
+        worker.stop(timeout=0)
+
+    def _spawn(self, idle=True):
+        worker = _WorkerProcess(self._context, self._settings(), next(self._ids))
+        self._workers.append(worker)
+        if idle:
+            self._idle.append(worker)
+        self.logger.debug(f"Proceso de descarga iniciado (pid {worker.process.pid})")
+        return worker
+
+    def _settings(self):
+        downloader = self.downloader
+        return {
+            # Config puede haberse cambiado en caliente (CLI, config.ini): el hijo la recibe tal cual
+            'config': {name: value for name, value in vars(Config).items() if name.isupper()},
+            'log_level': logging.getLogger().level,
+            'downloader_class': type(downloader),
+            'downloader': {
+                'output_path': str(downloader.output_path), 'quality': downloader.quality,
+                'max_retries': downloader.max_retries, 'concurrent_downloads': 1, 'postprocess_workers': 0,
+                'segmented_connections': downloader.segmented.connections if downloader.segmented else 1,
+                'backend': 'thread',
+            },
+            'extractors': downloader.sessions.extractors,
+        }
+
+
+class _ParentChannel:
+    """Pedidos del proceso hijo al padre por la tubería: call() espera la respuesta, notify() no."""
+    def __init__(self, send):
+        self._send = send
+        self._ids = itertools.count(1)
+        self._waiting = {}  # request_id -> [evento, ok, resultado]
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def call(self, kind, *args):
+        request_id = next(self._ids)
+        waiter = [threading.Event(), False, WorkerDied("El proceso padre cerró la tubería")]
+        with self._lock:
+            if self._closed:
+                raise waiter[2]
+            self._waiting[request_id] = waiter
+        self._send('call', request_id, kind, args)
+        waiter[0].wait()
+        if not waiter[1]:
+            raise waiter[2]
+        return waiter[2]
+
+    def notify(self, kind, *args):
+        self._send('call', None, kind, args)
+
+    def resolve(self, request_id, ok, result):
+        with self._lock:
+            waiter = self._waiting.pop(request_id, None)
+        if waiter:
+            waiter[1:] = [ok, result]
+            waiter[0].set()
+
+    def close(self):
+        """El padre se fue: nadie va a responder lo pendiente."""
+        with self._lock:
+            self._closed = True
+            waiting, self._waiting = list(self._waiting.values()), {}
+        for waiter in waiting:
+            waiter[0].set()
+
+
+class _ParentRateLimiter:
+    """
+    RateLimiter del hijo: las esperas las resuelve el limitador del padre, compartido
+    con los demás procesos. Los bytes se acumulan y se piden de a 'batch' para no
+    hacer una ida y vuelta por cada bloque que lee yt-dlp.
+    """
+    def __init__(self, channel, batch=256 * 1024):
+        self.channel = channel
+        self.batch = batch
+        self._pending = {}  # host -> bytes recibidos todavía sin pedir
+        self._lock = threading.Lock()
+
+    def acquire_request(self, host, cancel_event=None):
+        return self.channel.call('acquire_request', host)
+
+    def consume_bytes(self, host, amount, cancel_event=None):
+        if amount <= 0:
+            return True
+        with self._lock:
+            pending = self._pending.get(host, 0) + amount
+            if pending < self.batch:
+                self._pending[host] = pending
+                return True
+            self._pending[host] = 0
+        return self.channel.call('consume_bytes', host, pending)
+
+
+class _ParentReservation:
+    """SpaceReservation del hijo: la reserva real vive en el SpaceManager del padre."""
+    def __init__(self, channel, reservation_id, size, report_every=4 * 1024 * 1024):
+        self.channel = channel
+        self.reservation_id = reservation_id
+        self.size = size
+        self.report_every = report_every
+        self._written = 0
+        self._reported = 0
+
+    @property
+    def written(self):
+        return self._written
+
+    @written.setter
+    def written(self, value):
+        self._written = value
+        if value - self._reported >= self.report_every:
+            self._reported = value
+            self.channel.notify('space_written', self.reservation_id, value)
+
+    @property
+    def outstanding(self):
+        return max(0, self.size - self._written)
+
+    def release(self):
+        self.channel.notify('space_release', self.reservation_id)
+
+
+class _ParentSpaceManager:
+    """SpaceManager del hijo: reserva en el padre, donde se suman las de todos los procesos."""
+    def __init__(self, channel):
+        self.channel = channel
+
+    def reserve(self, path, size):
+        return _ParentReservation(self.channel, self.channel.call('reserve', str(path), size), size)
+
+
+def _worker_main(conn, settings):
+    """Bucle de un proceso hijo: atiende 'run', 'cancel', 'warm' y 'stop' de su tubería."""
+    for name, value in settings['config'].items():
+        setattr(Config, name, value)
+    if Config.PROFILE_DIR:
+        # Cada proceso deja sus reportes en su propia subcarpeta
+        Config.PROFILE_DIR = str(Path(Config.PROFILE_DIR) / f"process-{os.getpid()}")
+
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            conn.send(message)
+
+    class _PipeQueue:
+        def put_nowait(self, record):
+            send('log', record)
+
+    # Los registros viajan al padre, que los escribe con sus propios handlers
+    root = logging.getLogger()
+    root.setLevel(settings['log_level'])
+    handler = LogQueueHandler(_PipeQueue())
+    handler.addFilter(LogContextFilter())
+    root.addHandler(handler)
+    for name in ('urllib3', 'yt_dlp', 'requests'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    from session_pool import YDLSessionPool
+    channel = _ParentChannel(send)
+    downloader = settings['downloader_class'](rate_limiter=_ParentRateLimiter(channel), **settings['downloader'])
+    downloader.space = _ParentSpaceManager(channel)
+    if settings['extractors']:
+        downloader.sessions = YDLSessionPool(extractors=settings['extractors'])
+
+    tasks = queue.SimpleQueue()
+    cancels = {}  # task_id -> cancel_event del trabajo en curso
+
+    def receive():
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = ('stop',)
+                channel.close()
+            if message[0] == 'reply':
+                channel.resolve(*message[1:])
+                continue
+            if message[0] == 'run':
+                # El evento se crea al recibirlo: un 'cancel' que llega justo detrás no se pierde
+                cancels[message[1]] = threading.Event()
+            elif message[0] == 'cancel':
+                cancel_event = cancels.get(message[1])
+                if cancel_event:
+                    cancel_event.set()
+                continue
+            tasks.put(message)
+            if message[0] == 'stop':
+                return
+
+    threading.Thread(target=receive, name='worker-control', daemon=True).start()
+    while True:
+        message = tasks.get()
+        kind = message[0]
+        if kind == 'stop':
+            break
+        if kind == 'warm':
+            downloader.warm_sessions(message[1], 1)
+            send('warmed')
+            continue
+        _, task_id, url, convert_format, context = message
+        timings = {}
+        try:
+            if downloader.archive:
+                downloader.archive.refresh()  # lo que registraron los demás procesos
+            with log_context(**context, timings=timings):
+                ok = downloader.download_episode_safe(
+                    url, lambda data: send('event', task_id, data), convert_format, cancels[task_id]
+                )
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error inesperado en el proceso de descarga: {e}")
+            send('event', task_id, {'status': 'error', 'error_message': str(e)})
+            ok = False
+        finally:
+            cancels.pop(task_id, None)
+        send('done', task_id, ok, timings, REGISTRY.take())
+    downloader.sessions.close()
+    if Config.PROFILE_DIR:
+        import profiling
+        profiling.stop()  # atexit no corre en los hijos de multiprocessing
@@ -0,0 +1,348 @@
+# workqueue.py
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import Config
+from retry import THROTTLED, TRANSIENT, RetryPolicy, classify
+
+# Estados de un trabajo en la cola. 'done' y 'failed' son finales.
+STATES = ('queued', 'leased', 'done', 'failed')
+FINAL_STATES = ('done', 'failed')
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, format TEXT NOT NULL, state TEXT NOT NULL,"
+    " attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, not_before REAL NOT NULL DEFAULT 0,"
+    " lease_owner TEXT, lease_until REAL, filename TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, not_before, id)",
+    # Un registro por intento: quién lo hizo, cuánto tardó y cómo terminó
+    "CREATE TABLE IF NOT EXISTS results ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER NOT NULL, attempt INTEGER NOT NULL, worker TEXT,"
+    " status TEXT NOT NULL, started REAL, finished REAL NOT NULL, filename TEXT, error TEXT, timings TEXT)",
+    "CREATE INDEX IF NOT EXISTS results_job ON results (job_id)",
+)
+
+
+class SQLiteWorkQueue:
+    """
+    Cola de trabajos compartida por workers de varias máquinas, en un archivo SQLite
+    (p.ej. en un volumen compartido). Un worker reclama trabajos con un lease de
+    duración limitada y lo renueva con latidos; si el worker muere, el lease vence y
+    el trabajo vuelve a la cola para otro. Cada intento queda en la tabla 'results'.
+
+    Todas las operaciones son transacciones cortas (BEGIN IMMEDIATE), así que varios
+    procesos pueden usar el mismo archivo. En NFS/SMB hace falta que el sistema de
+    archivos respete los bloqueos de SQLite, y los relojes de las máquinas deben
+    estar sincronizados (los leases usan la hora real).
+    """
+    def __init__(self, path, lease_seconds=None, max_attempts=None):
+        self.path = Path(path).expanduser()
+        self.lease_seconds = lease_seconds or Config.WORK_QUEUE_LEASE
+        self.max_attempts = max_attempts or Config.WORK_QUEUE_MAX_ATTEMPTS
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Sin WAL: el modo por defecto es el que funciona en volúmenes de red
+        self._db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._transaction() as db:
+            for statement in _SCHEMA:
+                db.execute(statement)
+
+    # --- Productores ---
+
+    def enqueue(self, urls, convert_format='none', max_attempts=None):
+        """Agrega URLs a la cola. Devuelve sus IDs."""
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        now = time.time()
+        with self._transaction() as db:
+            return [
+                db.execute(
+                    "INSERT INTO jobs (url, format, state, max_attempts, created, updated) VALUES (?, ?, 'queued', ?, ?, ?)",
+                    (url, convert_format, max_attempts or self.max_attempts, now, now),
+                ).lastrowid
+                for url in urls
+            ]
+
+    # --- Workers ---
+
+    def claim(self, worker_id, limit=1):
+        """
+        Reclama hasta 'limit' trabajos listos (antes devuelve a la cola los leases vencidos).
+        Devuelve una lista de dicts con id, url, format, attempts y max_attempts.
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._transaction() as db:
+            self._reclaim_expired(db, now)
+            rows = db.execute(
+                "SELECT id, url, format, attempts, max_attempts FROM jobs"
+                " WHERE state = 'queued' AND not_before <= ? ORDER BY id LIMIT ?", (now, limit)
+            ).fetchall()
+            for row in rows:
+                db.execute(
+                    "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_until = ?, attempts = attempts + 1,"
+                    " updated = ? WHERE id = ?", (worker_id, now + self.lease_seconds, now, row['id'])
+                )
+        return [dict(row, attempts=row['attempts'] + 1) for row in rows]
+
+    def heartbeat(self, worker_id, job_ids):
+        """Renueva los leases de 'job_ids'. Devuelve el conjunto de los que el worker todavía retiene."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        now = time.time()
+        marks = ','.join('?' * len(job_ids))
+        with self._transaction() as db:
+            db.execute(
+                f"UPDATE jobs SET lease_until = ?, updated = ? WHERE id IN ({marks})"
+                " AND state = 'leased' AND lease_owner = ? AND lease_until >= ?",
+                [now + self.lease_seconds, now, *job_ids, worker_id, now],
+            )
+            rows = db.execute(
+                f"SELECT id FROM jobs WHERE id IN ({marks}) AND state = 'leased' AND lease_owner = ?",
+                [*job_ids, worker_id],
+            ).fetchall()
+        return {row['id'] for row in rows}
+
+    def complete(self, job_id, worker_id, status, filename=None, error=None, started=None, timings=None, retry_in=None):
+        """
+        Registra el resultado de un intento ('finished', 'error' o 'cancelled').
+        Con retry_in (segundos) un error devuelve el trabajo a la cola; sin él queda
+        'failed'. Devuelve False si el worker ya había perdido el lease: el intento
+        se registra igual, pero el estado del trabajo no se toca.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts, state, lease_owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            db.execute(
+                "INSERT INTO results (job_id, attempt, worker, status, started, finished, filename, error, timings)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, row['attempts'], worker_id, status, started, now, filename, error,
+                 json.dumps(timings) if timings else None),
+            )
+            if row['state'] != 'leased' or row['lease_owner'] != worker_id:
+                return False
+            if status == 'finished':
+                db.execute(
+                    "UPDATE jobs SET state = 'done', filename = ?, error = NULL, lease_owner = NULL, lease_until = NULL,"
+                    " updated = ? WHERE id = ?", (filename, now, job_id)
+                )
+            elif status == 'cancelled' or retry_in is not None:
+                # Un trabajo cancelado al parar el worker no gasta el intento
+                attempts = row['attempts'] - 1 if status == 'cancelled' else row['attempts']
+                db.execute(
+                    "UPDATE jobs SET state = 'queued', attempts = ?, not_before = ?, error = ?, lease_owner = NULL,"
+                    " lease_until = NULL, updated = ? WHERE id = ?", (attempts, now + (retry_in or 0), error, now, job_id)
+                )
+            else:
+                db.execute(
+                    "UPDATE jobs SET state = 'failed', error = ?, lease_owner = NULL, lease_until = NULL, updated = ?"
+                    " WHERE id = ?", (error, now, job_id)
+                )
+        return True
+
+    # --- Consultas ---
+
+    def counts(self):
+        """Trabajos por estado (los leases vencidos cuentan como 'queued')."""
+        with self._transaction() as db:
+            self._reclaim_expired(db, time.time())
+            rows = db.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {row['state']: row['n'] for row in rows}
+
+    def pending(self):
+        """Trabajos que todavía no terminaron (en cola o retenidos por algún worker)."""
+        counts = self.counts()
+        return counts.get('queued', 0) + counts.get('leased', 0)
+
+    def jobs(self, state=None, limit=100):
+        query = "SELECT * FROM jobs" + (" WHERE state = ?" if state else "") + " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(query, (state, limit) if state else (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def results(self, job_id):
+        """Intentos de un trabajo, en orden."""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM results WHERE job_id = ? ORDER BY id", (job_id,)).fetchall()
+        return [dict(row, timings=json.loads(row['timings']) if row['timings'] else None) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Internos ---
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al empezar: dos workers no reclaman el mismo trabajo
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _reclaim_expired(self, db, now):
+        """Los leases vencidos (worker caído o colgado) vuelven a la cola, o fallan si agotaron los intentos."""
+        expired = db.execute(
+            "SELECT id, attempts, max_attempts, lease_owner FROM jobs WHERE state = 'leased' AND lease_until < ?", (now,)
+        ).fetchall()
+        for row in expired:
+            error = f"Venció el lease de {row['lease_owner']} (el worker dejó de responder)"
+            state = 'failed' if row['attempts'] >= row['max_attempts'] else 'queued'
+            db.execute(
+                "INSERT INTO results (job_id, attempt, worker, status, finished, error) VALUES (?, ?, ?, 'lost', ?, ?)",
+                (row['id'], row['attempts'], row['lease_owner'], now, error),
+            )
+            db.execute(
+                "UPDATE jobs SET state = ?, error = ?, lease_owner = NULL, lease_until = NULL, updated = ? WHERE id = ?",
+                (state, error, now, row['id']),
+            )
+            self.logger.warning(f"Trabajo {row['id']} recuperado de la cola ({state}): {error}")
+
+
+# Backends de cola por esquema ('sqlite:///ruta'); una ruta sin esquema es SQLite
+BACKENDS = {'sqlite': SQLiteWorkQueue}
+
+
+def open_work_queue(location=None, **kwargs):
+    """Abre la cola de 'location' (por defecto Config.WORK_QUEUE)."""
+    location = str(location or Config.WORK_QUEUE or '')
+    if not location:
+        raise ValueError("No se indicó la cola de trabajos (--queue o Config.WORK_QUEUE)")
+    scheme, separator, path = location.partition('://')
+    if not separator:
+        scheme, path = 'sqlite', location
+    backend = BACKENDS.get(scheme)
+    if backend is None:
+        raise ValueError(f"Backend de cola desconocido: {scheme} (disponibles: {', '.join(BACKENDS)})")
+    return backend(path, **kwargs)
+
+
+class QueueWorker:
+    """
+    Worker de una cola compartida: reclama trabajos mientras tenga huecos, los corre
+    en un DownloadScheduler local (con hilos o procesos, según el downloader) y
+    renueva sus leases con latidos hasta terminar. Si pierde un lease (p.ej. la
+    máquina estuvo colgada y otro worker lo retomó) cancela su copia del trabajo.
+
+    Los reintentos los decide la cola y no el planificador local: un fallo
+    transitorio devuelve el trabajo a la cola con backoff y lo puede tomar otro nodo.
+    """
+    def __init__(self, work_queue, downloader, worker_id=None, slots=None, progress_callback=None):
+        self.queue = work_queue
+        self.downloader = downloader
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.slots = max(1, slots or downloader.concurrent_downloads)
+        self.progress_callback = progress_callback
+        self.retry_policy = RetryPolicy()
+        self.logger = logging.getLogger(__name__)
+        self.summary = Counter()
+        self._held = {}  # id en la cola -> (DownloadJob, momento del reclamo)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+
+    def run(self, exit_when_empty=False):
+        """Atiende la cola hasta stop() (o hasta que se vacíe, con exit_when_empty). Devuelve el conteo por estado."""
+        from scheduler import DownloadScheduler
+
+        self.downloader.warm_sessions()
+        scheduler = DownloadScheduler(
+            self.downloader.executor, self.slots, self.downloader.per_host_limit, keep_jobs=False,
+            postprocess_workers=self.downloader.postprocess_workers, retry_policy=RetryPolicy(max_attempts=0),
+        )
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='queue-heartbeat', daemon=True)
+        heartbeat.start()
+        self.logger.info(f"Worker {self.worker_id} atendiendo la cola {getattr(self.queue, 'path', self.queue)}")
+        try:
+            while not self._stopping.is_set():
+                self._wake.clear()
+                with self._lock:
+                    free = self.slots - len(self._held)
+                try:
+                    claimed = self.queue.claim(self.worker_id, free)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"No se pudo consultar la cola: {e}")
+                    claimed = []
+                for record in claimed:
+                    self._start(scheduler, record)
+                with self._lock:
+                    idle = not self._held
+                if exit_when_empty and idle and not claimed and not self.queue.pending():
+                    break
+                # Un trabajo que termina despierta el bucle para reclamar el siguiente
+                self._wake.wait(Config.WORK_QUEUE_POLL_INTERVAL)
+        finally:
+            self._stopping.set()
+            # Lo que quedó a medias vuelve a la cola sin gastar el intento
+            scheduler.shutdown(wait=True, cancel=True)
+            heartbeat.join(timeout=5)
+        return dict(self.summary)
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def _start(self, scheduler, record):
+        self.logger.info(f"Trabajo {record['id']} (intento {record['attempts']}/{record['max_attempts']}): {record['url']}")
+        job = scheduler.submit(record['url'], record['format'], self.progress_callback)
+        with self._lock:
+            self._held[record['id']] = (job, time.time())
+        job.add_done_callback(lambda job, record=record: self._finished(record, job))
+
+    def _finished(self, record, job):
+        with self._lock:
+            _, started = self._held.pop(record['id'], (None, None))
+        retry_in = None
+        if job.status == 'error':
+            category = classify(job.error_message)
+            if category in (TRANSIENT, THROTTLED) and record['attempts'] < record['max_attempts']:
+                retry_in = self.retry_policy.delay(category, record['attempts'] - 1)
+        try:
+            kept = self.queue.complete(
+                record['id'], self.worker_id, job.status, job.filename, job.error_message,
+                started=started, timings=dict(job.timings), retry_in=retry_in,
+            )
+        except sqlite3.Error as e:
+            # El lease vencerá y otro worker lo retomará
+            self.logger.error(f"No se pudo registrar el resultado del trabajo {record['id']}: {e}")
+            kept = False
+        if not kept:
+            self.logger.warning(f"Trabajo {record['id']}: el lease ya no era de este worker, resultado solo registrado")
+        elif retry_in is not None:
+            self.logger.info(f"Trabajo {record['id']} vuelve a la cola en {retry_in:.0f} s: {job.error_message}")
+        with self._lock:
+            self.summary['retrying' if retry_in is not None else job.status] += 1
+        self._wake.set()
+
+    def _heartbeat_loop(self):
+        interval = min(Config.WORK_QUEUE_HEARTBEAT, self.queue.lease_seconds / 3)
+        while not self._stopping.wait(interval):
+            with self._lock:
+                held = dict(self._held)
+            if not held:
+                continue
+            try:
+                owned = self.queue.heartbeat(self.worker_id, held)
+            except sqlite3.Error as e:
+                self.logger.warning(f"No se pudieron renovar los leases: {e}")
+                continue
+            for queue_id in set(held) - owned:
+                self.logger.warning(f"Trabajo {queue_id}: lease perdido, se cancela la copia local")
+                held[queue_id][0].cancel()